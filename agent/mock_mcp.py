@@ -1,21 +1,121 @@
 # backend/agent/mock_mcp.py
 import re
+from typing import Dict, Iterable, Optional, Tuple
+
+from services.cache import LRUCache
+from services.indexes import DatasetIndex
+from services.query_engine import query_engine
+from services.search import normalize
+
+DATASET = "sedes_mock"
+# Columnas cuyos nombres se reconocen en el texto (la primera gana si un nombre se repite)
+PLACE_COLUMNS = ["DPTO_CNMBR", "MPIO_CNMBR"]
+# Si el dataset no se puede cargar, al menos se reconocen estos departamentos
+DEFAULT_PLACES = {"DPTO_CNMBR": ["ANTIOQUIA", "CUNDINAMARCA", "VALLE DEL CAUCA", "ATLÁNTICO", "BOYACÁ", "NARIÑO"]}
+
+# Patrones fijos (sobre el texto normalizado: minúsculas, sin tildes ni puntuación).
+# Solo anclados al inicio de palabra: "rurales", "urbanas" o "extruir" también cuentan
+ZONA_RE = re.compile(r"\b(rural|urban)")
+YEAR_RE = re.compile(r"\b(202[2-5])\b")  # Busca 2022-2025
+COLUMN_RE = re.compile(r"\b(3d|barra|altura|extru|volumen)")
+HEATMAP_RE = re.compile(r"\b(calor|densidad|heatmap)")
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """
+    Regex equivalente a una alternación de `words`, pero factorizada como
+    trie: cada carácter se prueba una vez en lugar de una vez por nombre.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: dict) -> str:
+        end = node.get("") is True
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Opcional y codicioso: se prefiere el nombre más largo ("valle del cauca" sobre "valle")
+        return f"(?:{body})?" if end else body
+
+    return build(trie)
+
+
+class PlaceMatcher:
+    """Un único regex compilado sobre todos los nombres de lugar del dataset"""
+
+    def __init__(self, places: Dict[str, Iterable[str]]):
+        self.lookup: Dict[str, Tuple[str, str]] = {}
+        for column, labels in places.items():
+            for label in labels:
+                key = normalize(label)
+                if key:
+                    self.lookup.setdefault(key, (column, str(label)))
+        self.regex = re.compile(rf"\b(?:{_trie_pattern(self.lookup)})\b") if self.lookup else None
+
+    @classmethod
+    def from_index(cls, index: DatasetIndex) -> "PlaceMatcher":
+        return cls({col: index.column(col).categories for col in PLACE_COLUMNS if index.has_column(col)})
+
+    def find(self, text: str) -> Dict[str, str]:
+        """{columna: etiqueta original} con la primera coincidencia de cada columna"""
+        found: Dict[str, str] = {}
+        if self.regex is None:
+            return found
+        for match in self.regex.finditer(text):
+            column, label = self.lookup[match.group(0)]
+            found.setdefault(column, label)
+        return found
+
 
 class MockMCPAgent:
     def __init__(self):
-        pass
+        self._index: Optional[DatasetIndex] = None
+        self._places: Optional[PlaceMatcher] = None
+        # El dataset no se pudo cargar: no se reintenta con cada mensaje
+        self._unavailable = False
+        # Intenciones ya interpretadas, por texto normalizado
+        self._intents = LRUCache("agent_intents", maxsize=1024)
+
+    def _load_index(self) -> Optional[DatasetIndex]:
+        if self._unavailable:
+            return None
+        try:
+            return query_engine._get_index(DATASET)
+        except (FileNotFoundError, ValueError):
+            self._unavailable = True
+            return None
+
+    def _get_places(self) -> PlaceMatcher:
+        # Un PlaceMatcher por objeto índice: se reconstruye solo si el dataset se (re)cargó
+        index = self._load_index()
+        if self._places is None or index is not self._index:
+            self._places = PlaceMatcher.from_index(index) if index is not None else PlaceMatcher(DEFAULT_PLACES)
+            self._index = index
+            self._intents.invalidate(DATASET)
+        return self._places
 
     def process_query(self, query: str):
         """
         Simula un LLM procesando una intención.
         Entrada: "Muéstrame las sedes rurales de Antioquia en 3D"
         Salida: JSON con filtros y configuración de capa.
+        El resultado es compartido entre llamadas: no modificarlo.
         """
-        query = query.lower()
-        
+        places = self._get_places()
+        text = normalize(query)
+        key = (DATASET, text)
+        cached = self._intents.get(key)
+        if cached is not None:
+            return cached
+
         # 1. Configuración por defecto
         action = {
-            "dataset": "sedes_mock",
+            "dataset": DATASET,
             "filters": {},
             "layer_type": "scatterplot", # Default
             "visualization_params": {}
@@ -24,44 +124,41 @@ class MockMCPAgent:
         reply_parts = []
 
         # 2. Detectar Filtros: ZONA
-        if "rural" in query:
-            action["filters"]["zona"] = "RURAL"
-            reply_parts.append("filtrando zona Rural")
-        elif "urbana" in query:
-            action["filters"]["zona"] = "URBANA"
-            reply_parts.append("filtrando zona Urbana")
+        zona = ZONA_RE.search(text)
+        if zona:
+            action["filters"]["zona"] = "RURAL" if zona.group(1) == "rural" else "URBANA"
+            reply_parts.append(f"filtrando zona {action['filters']['zona'].capitalize()}")
 
         # 3. Detectar Filtros: AÑO
-        years = re.findall(r"202[2-5]", query) # Busca 2022-2025
-        if years:
-            action["filters"]["year_reporte"] = years[0]
-            reply_parts.append(f"del año {years[0]}")
-
-        # 4. Detectar Filtros: DEPARTAMENTO (Lista básica para el mock)
-        deptos = ["antioquia", "cundinamarca", "valle", "atlantico", "boyaca", "narino"]
-        for d in deptos:
-            if d in query:
-                action["filters"]["DPTO_CNMBR"] = d.upper() # Asumimos que en CSV está en mayúsculas
-                reply_parts.append(f"en {d.capitalize()}")
-                break
+        year = YEAR_RE.search(text)
+        if year:
+            action["filters"]["year_reporte"] = year.group(1)
+            reply_parts.append(f"del año {year.group(1)}")
+
+        # 4. Detectar Filtros: DEPARTAMENTO / MUNICIPIO (nombres tomados del índice)
+        for column, label in places.find(text).items():
+            action["filters"][column] = label
+            reply_parts.append(f"en {label.title()}")
 
         # 5. Detectar Tipo de Visualización
-        if any(x in query for x in ["3d", "barras", "altura", "extruye", "volumen"]):
+        if COLUMN_RE.search(text):
             action["layer_type"] = "column"
             reply_parts.append("vista en 3D")
-        elif any(x in query for x in ["calor", "densidad", "heatmap", "mapa de calor"]):
+        elif HEATMAP_RE.search(text):
             action["layer_type"] = "heatmap"
             reply_parts.append("mapa de calor")
-        
+
         # 6. Construir respuesta verbal
         if not reply_parts:
             reply_text = "Entendido, mostrando datos generales."
         else:
             reply_text = "Claro, " + ", ".join(reply_parts) + "."
 
-        return {
+        result = {
             "reply": reply_text,
             "action": action
         }
+        self._intents.put(key, result)
+        return result
 
-agent = MockMCPAgent()
\ No newline at end of file
+agent = MockMCPAgent()
@@ -0,0 +1,242 @@
+"""
+Benchmarks de QueryEngine y serializadores sobre datasets sintéticos.
+
+Mide carga (_load_df), filtros, bbox, cada formato de salida y /breaks:
+latencia (mediana de N repeticiones), throughput (filas/s) y pico de memoria
+(tracemalloc, en una corrida aparte para no distorsionar la latencia).
+Los resultados se guardan en JSON y se pueden comparar con una corrida previa.
+
+    python bench/bench_query_engine.py --sizes 50k 1m --out bench/results
+    python bench/bench_query_engine.py --sizes 50k --compare bench/results/<anterior>.json
+"""
+import argparse
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from bench.synthetic import generate  # noqa: E402
+from services.query_engine import DATASETS, encode_data, query_engine  # noqa: E402
+
+SIZES = {"50k": 50_000, "1m": 1_000_000, "10m": 10_000_000}
+DATA_DIR = ROOT / "bench" / "data"
+
+# (nombre, filtros simples, bbox, expresión)
+QUERIES = [
+    ("filter_year_zona", {"year_reporte": "2024", "zona": "RURAL"}, None, None),
+    ("filter_expr", {}, None, "DPTO_CNMBR=ANTIOQUIA|NARIÑO;ised_ind_000>=0.5;conect_conectividad_def=SI"),
+    ("bbox_bogota", {}, "-74.5,4.3,-73.8,5.0", None),
+    ("bbox_plus_filter", {"year_reporte": "2025"}, "-77.0,1.0,-72.0,7.0", "zona=URBANA"),
+]
+FORMAT_QUERY = ({"year_reporte": "2024", "DPTO_CNMBR": "ANTIOQUIA"}, None, None)
+FORMATS = ["json", "geojson", "columnar", "fgb"]
+# (nombre, group_by, métricas, filtros simples): con y sin cubo de resumen
+AGGREGATES = [
+    ("zona_by_dpto", ["DPTO_CNMBR", "zona"], "count,mean(ised_ind_000)", {"year_reporte": "2024"}),
+    ("mpio_all", ["MPIO_CNMBR"], "count,sum(ised_ind_001),max(ised_ind_001)", {}),
+]
+BREAKS = [("ised_ind_001", "quantile"), ("ised_ind_001", "jenks"),
+          ("ised_ind_001", "equal_interval"), ("DPTO_CNMBR", "unique")]
+
+
+def register(size: str, n_indicators: int) -> str:
+    """Genera (si no existe) y registra el dataset sintético en DATASETS"""
+    name = f"bench_{size}"
+    path = DATA_DIR / f"sedes_{size}_{n_indicators}.parquet"
+    if not path.exists():
+        print(f"🧪 Generando {path}...")
+        generate(SIZES[size], str(path), n_indicators)
+    DATASETS[name] = {
+        "file": str(path),
+        "lat_col": "latitud",
+        "lon_col": "longitud",
+        "filters": ["year_reporte", "zona", "DPTO_CNMBR", "MPIO_CNMBR"],
+        "cube": {"dimensions": ["year_reporte", "zona", "DPTO_CNMBR", "MPIO_CNMBR"],
+                 "measures": ["ised_ind_00*"]},
+    }
+    return name
+
+
+def measure(fn: Callable, repeat: int, setup: Callable = None) -> Dict:
+    """Mediana de latencia en `repeat` corridas + pico de memoria en una corrida extra"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_ms": statistics.median(times) * 1000,
+        "min_ms": min(times) * 1000,
+        "max_ms": max(times) * 1000,
+        "peak_mb": peak / 1e6,
+        "result": result,
+    }
+
+
+def _row(name: str, stats: Dict, rows: int, **extra) -> Dict:
+    seconds = stats["median_ms"] / 1000
+    row = {
+        "name": name,
+        "median_ms": round(stats["median_ms"], 3),
+        "min_ms": round(stats["min_ms"], 3),
+        "max_ms": round(stats["max_ms"], 3),
+        "peak_mb": round(stats["peak_mb"], 2),
+        "rows": rows,
+        "rows_per_s": round(rows / seconds) if seconds > 0 else None,
+    }
+    row.update(extra)
+    return row
+
+
+def run_size(size: str, n_indicators: int, repeat: int) -> List[Dict]:
+    dataset = register(size, n_indicators)
+    results = []
+    print(f"\n📊 {dataset}")
+
+    # 1. Carga en frío: lo que hace _load_df (lectura + índices + cubo)
+    def reset():
+        query_engine._cache.pop(dataset, None)
+        query_engine._indexes.pop(dataset, None)
+        query_engine._cubes.pop(dataset, None)
+
+    stats = measure(lambda: query_engine._get_index(dataset), max(1, repeat // 2), setup=reset)
+    rows_total = query_engine._get_index(dataset).size
+    results.append(_row("load", stats, rows_total))
+
+    # 2. Filtros / bbox (solo selección de posiciones + proyección)
+    for name, filters, bbox, where in QUERIES:
+        stats = measure(lambda: query_engine.select(dataset, filters, bbox, where), repeat)
+        results.append(_row(name, stats, rows_total, rows_out=len(stats["result"])))
+
+    # 3. Formatos de salida (selección + serialización a bytes)
+    filters, bbox, where = FORMAT_QUERY
+    selected = query_engine.select(dataset, filters, bbox, where)
+    for fmt in FORMATS:
+        stats = measure(lambda: encode_data(selected, dataset, fmt), repeat)
+        results.append(_row(f"encode_{fmt}", stats, len(selected), bytes=len(stats["result"])))
+    # Mismos formatos de texto sin redondear coordenadas (precision=None), como referencia
+    for fmt in ("geojson", "columnar"):
+        stats = measure(lambda: encode_data(selected, dataset, fmt, precision=None), repeat)
+        results.append(_row(f"encode_{fmt}_full_precision", stats, len(selected), bytes=len(stats["result"])))
+
+    # 4. Agregaciones desde el cubo y recorriendo filas (sin cache de resultados)
+    cube = query_engine._cubes.get(dataset)
+    for name, group_by, metrics, filters in AGGREGATES:
+        for source in ("cube", "rows"):
+            if source == "rows":
+                query_engine._cubes.pop(dataset, None)
+            stats = measure(lambda: query_engine.get_aggregate(dataset, group_by, metrics, filters),
+                            repeat, setup=lambda: query_engine._results.invalidate(dataset))
+            results.append(_row(f"aggregate_{source}_{name}", stats, rows_total))
+            if cube is not None:
+                query_engine._cubes[dataset] = cube
+    if cube is not None:
+        stats = measure(lambda: query_engine.reload(dataset), 1)
+        cube = query_engine._cubes[dataset]
+        results.append(_row("reload_cube_unchanged", stats, rows_total, cells=cube.size, reused=cube.reused))
+
+    # 5. Breaks (sin cache de resultados)
+    for field, method in BREAKS:
+        stats = measure(lambda: query_engine.get_classification_breaks(dataset, field, method, 5),
+                        repeat, setup=lambda: query_engine._results.invalidate(dataset))
+        results.append(_row(f"breaks_{method}_{field}", stats, rows_total))
+
+    for r in results:
+        extra = f" rows_out={r['rows_out']}" if "rows_out" in r else ""
+        extra += f" bytes={r['bytes']}" if "bytes" in r else ""
+        print(f"  {r['name']:<32} {r['median_ms']:>10.2f} ms  peak={r['peak_mb']:>8.1f} MB{extra}")
+
+    # Liberar antes del siguiente tamaño
+    query_engine._cache.pop(dataset, None)
+    query_engine._indexes.pop(dataset, None)
+    query_engine._cubes.pop(dataset, None)
+    query_engine._results.invalidate(dataset)
+    return [{"size": size, **r} for r in results]
+
+
+def compare(current: List[Dict], previous_path: str, threshold: float) -> int:
+    previous = {(r["size"], r["name"]): r for r in json.loads(Path(previous_path).read_text())["results"]}
+    regressions = 0
+    print(f"\n🔍 Comparación con {previous_path} (umbral {threshold:.0%})")
+    for r in current:
+        old = previous.get((r["size"], r["name"]))
+        if not old:
+            continue
+        delta = (r["median_ms"] - old["median_ms"]) / old["median_ms"] if old["median_ms"] else 0.0
+        flag = "⚠️ " if delta > threshold else "  "
+        regressions += delta > threshold
+        print(f"{flag}{r['size']:<4} {r['name']:<32} {old['median_ms']:>10.2f} → {r['median_ms']:>10.2f} ms ({delta:+.1%})")
+    return regressions
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de QueryEngine con datasets sintéticos")
+    parser.add_argument("--sizes", nargs="+", default=["50k"], choices=list(SIZES))
+    parser.add_argument("--indicators", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default=str(ROOT / "bench" / "results"))
+    parser.add_argument("--compare", help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Regresión tolerada (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        results += run_size(size, args.indicators, args.repeat)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "indicators": args.indicators,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_file = out_dir / f"query_engine_{time.strftime('%Y%m%d-%H%M%S')}_{report['meta']['commit']}.json"
+    out_file.write_text(json.dumps(report, indent=2))
+    print(f"\n💾 Resultados en {out_file}")
+
+    if args.compare:
+        sys.exit(1 if compare(results, args.compare, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
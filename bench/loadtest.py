@@ -0,0 +1,102 @@
+"""
+Prueba de carga contra un servidor corriendo (uvicorn main:app).
+
+Lanza N peticiones con C clientes concurrentes sobre una o varias rutas y
+reporta latencia p50/p95/p99, throughput y códigos de respuesta (los 503
+son consultas rechazadas por el control de admisión).
+
+    python bench/loadtest.py --url http://localhost:8000 \\
+        --path "/data/sena_ised?format=geojson&year_reporte=2022" \\
+        --path "/data/sena_ised/aggregate?group_by=departamento" \\
+        --concurrency 16 --requests 400 --out bench/results/loadtest.json
+"""
+import argparse
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+def _request(url: str, timeout: float):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            body = resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        status = e.code
+    except (urllib.error.URLError, TimeoutError):
+        body, status = b"", 0
+    return status, (time.perf_counter() - start) * 1000, len(body)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def run(base_url: str, paths, concurrency: int, total: int, timeout: float) -> dict:
+    urls = [base_url.rstrip("/") + paths[i % len(paths)] for i in range(total)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda u: _request(u, timeout), urls))
+    elapsed = time.perf_counter() - start
+
+    ok = [ms for status, ms, _ in results if status == 200]
+    return {
+        "url": base_url,
+        "paths": paths,
+        "concurrency": concurrency,
+        "requests": total,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "status": dict(Counter(str(status) for status, _, _ in results)),
+        "latency_ms": {
+            "p50": percentile(ok, 50),
+            "p95": percentile(ok, 95),
+            "p99": percentile(ok, 99),
+            "mean": statistics.fmean(ok) if ok else None,
+            "max": max(ok) if ok else None,
+        },
+        "bytes_mean": statistics.fmean(b for s, _, b in results if s == 200) if ok else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API (p50/p99 bajo concurrencia)")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", action="append", dest="paths",
+                        help="Ruta a consultar (se puede repetir, se reparte en round-robin)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--out", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    paths = args.paths or ["/data/sena_ised?format=geojson"]
+    report = []
+    for c in args.concurrency:
+        result = run(args.url, paths, c, args.requests, args.timeout)
+        lat = result["latency_ms"]
+        print(f"c={c:<4} rps={result['throughput_rps']:<8} p50={lat['p50'] or 0:8.1f}ms "
+              f"p99={lat['p99'] or 0:8.1f}ms status={result['status']}")
+        report.append(result)
+
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"💾 Resultados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
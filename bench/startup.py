@@ -0,0 +1,116 @@
+"""
+Tiempo de arranque de la API: desde lanzar `uvicorn main:app` hasta la
+primera respuesta 200 de /health.
+
+Cada corrida es un proceso nuevo (imports en frío de Python, no de disco).
+Reporta mediana / mín / máx del tiempo hasta estar sano y, aparte, cuánto
+tarda el import de `main` (python -X importtime) con los módulos más caros.
+
+    python bench/startup.py --runs 5 --out bench/results/startup.json
+"""
+import argparse
+import json
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_healthy(path: str, timeout: float) -> float:
+    """Segundos desde el spawn de uvicorn hasta el primer 200 de `path`"""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}{path}"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn terminó al arrancar:\n{proc.stderr.read().decode()}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.01)
+        raise TimeoutError(f"{url} no respondió 200 en {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def import_profile(top: int) -> dict:
+    """Import de `main` en un proceso nuevo: total y módulos con más tiempo acumulado"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                         cwd=ROOT, capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in out.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        if match:
+            rows.append((int(match.group(1)), len(match.group(2)), match.group(3)))
+    total = next((us for us, _, name in rows if name == "main"), None)
+    # Solo módulos de segundo nivel (importados por main o por sus imports directos)
+    heavy = sorted((r for r in rows if r[1] <= 4 and r[2] != "main"), reverse=True)[:top]
+    return {
+        "main_ms": total / 1000 if total is not None else None,
+        "heaviest_ms": {name: round(us / 1000, 1) for us, _, name in heavy},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo hasta la primera respuesta sana de la API")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--top", type=int, default=8, help="Módulos más caros a listar")
+    parser.add_argument("--out", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    times = []
+    for i in range(args.runs):
+        seconds = time_to_healthy(args.path, args.timeout)
+        times.append(seconds)
+        print(f"run {i + 1}: {seconds * 1000:8.1f}ms")
+
+    profile = import_profile(args.top)
+    report = {
+        "path": args.path,
+        "runs": args.runs,
+        "python": sys.version.split()[0],
+        "time_to_healthy_ms": {
+            "median": round(statistics.median(times) * 1000, 1),
+            "min": round(min(times) * 1000, 1),
+            "max": round(max(times) * 1000, 1),
+        },
+        "import": profile,
+    }
+    ttl = report["time_to_healthy_ms"]
+    print(f"🟢 {args.path}: mediana={ttl['median']}ms mín={ttl['min']}ms máx={ttl['max']}ms "
+          f"(import main: {profile['main_ms']:.0f}ms)")
+    for name, ms in profile["heaviest_ms"].items():
+        print(f"  {name:<32} {ms:8.1f}ms")
+
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"💾 Resultados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Generador de datasets sintéticos con el esquema de sedes (db/sedes_mock.csv):
+identificación, coordenadas dentro de Colombia, zona, DPTO/MPIO, year_reporte
+en formato largo (una fila por sede y año) y 200+ columnas de indicadores.
+
+Se escribe a Parquet por bloques, así 10M filas no necesitan caber en memoria.
+
+    python bench/synthetic.py --rows 1000000 --out bench/data/sedes_1m.parquet
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Código DANE, nombre y centro aproximado (lon, lat) de algunos departamentos
+DEPARTAMENTOS = [
+    ("05", "ANTIOQUIA", -75.5, 6.9),
+    ("08", "ATLÁNTICO", -74.9, 10.7),
+    ("11", "BOGOTÁ, D.C.", -74.1, 4.6),
+    ("13", "BOLÍVAR", -74.5, 8.7),
+    ("15", "BOYACÁ", -73.2, 5.6),
+    ("19", "CAUCA", -76.8, 2.4),
+    ("23", "CÓRDOBA", -75.8, 8.4),
+    ("25", "CUNDINAMARCA", -74.2, 4.9),
+    ("27", "CHOCÓ", -76.8, 5.7),
+    ("41", "HUILA", -75.5, 2.5),
+    ("44", "LA GUAJIRA", -72.6, 11.3),
+    ("50", "META", -73.0, 3.4),
+    ("52", "NARIÑO", -77.6, 1.5),
+    ("54", "NORTE DE SANTANDER", -72.8, 8.0),
+    ("68", "SANTANDER", -73.4, 6.8),
+    ("73", "TOLIMA", -75.1, 4.0),
+    ("76", "VALLE DEL CAUCA", -76.5, 3.8),
+    ("91", "AMAZONAS", -71.5, -1.5),
+]
+MUNICIPIOS_POR_DPTO = 40
+YEARS = [2022, 2023, 2024, 2025]
+COLOMBIA_BBOX = (-79.0, -4.2, -66.8, 12.5)
+TECNOLOGIAS = np.array(["FIBRA", "RADIO ENLACE", "SATELITAL", "COBRE", "SIN SERVICIO"])
+
+
+def _chunk(start_sede: int, n_sedes: int, n_indicators: int, years, rng) -> pd.DataFrame:
+    n_years = len(years)
+    n = n_sedes * n_years
+
+    dpto = rng.integers(0, len(DEPARTAMENTOS), n_sedes)
+    mpio = rng.integers(1, MUNICIPIOS_POR_DPTO + 1, n_sedes)
+    centers = np.array([(d[2], d[3]) for d in DEPARTAMENTOS])
+    lon = np.clip(centers[dpto, 0] + rng.normal(0, 0.6, n_sedes), COLOMBIA_BBOX[0], COLOMBIA_BBOX[2])
+    lat = np.clip(centers[dpto, 1] + rng.normal(0, 0.6, n_sedes), COLOMBIA_BBOX[1], COLOMBIA_BBOX[3])
+    sin_coord = rng.random(n_sedes) < 0.02
+    lon[sin_coord] = np.nan
+    lat[sin_coord] = np.nan
+
+    codes = np.array([d[0] for d in DEPARTAMENTOS])
+    names = np.array([d[1] for d in DEPARTAMENTOS])
+    mpio_cod = np.char.add(codes[dpto], np.char.zfill(mpio.astype(str), 3))
+    sede_ids = np.arange(start_sede, start_sede + n_sedes)
+
+    def rep(values):
+        # Una fila por (sede, año)
+        return np.repeat(values, n_years)
+
+    df = pd.DataFrame({
+        "sede_codigo": rep(np.char.zfill(sede_ids.astype(str), 12)),
+        "nombre_sede": rep(np.char.add("SEDE ", sede_ids.astype(str))),
+        "est_id": rep((sede_ids // 3).astype(str)),
+        "nombre_establecimiento": rep(np.char.add("INSTITUCIÓN EDUCATIVA ", (sede_ids // 3).astype(str))),
+        "year_reporte": np.tile(years, n_sedes),
+        "zona": rep(np.where(rng.random(n_sedes) < 0.6, "RURAL", "URBANA")),
+        "direccion": rep(np.char.add("VEREDA ", mpio.astype(str))),
+        "latitud": rep(lat),
+        "longitud": rep(lon),
+        "MPIO_CDPMP": rep(mpio_cod),
+        "MPIO_CNMBR": rep(np.char.add("MUNICIPIO ", mpio_cod)),
+        "DPTO_CCDGO": rep(codes[dpto]),
+        "DPTO_CNMBR": rep(names[dpto]),
+        "conect_conectividad_def": np.where(rng.random(n) < 0.55, "SI", "NO"),
+        "conect_tecnologia_conec": TECNOLOGIAS[rng.integers(0, len(TECNOLOGIAS), n)],
+        "conect_anchodebanda_mbps": rng.choice([0, 5, 10, 20, 50, 100], n).astype(np.float64),
+        "conect_total_equipos": rng.poisson(25, n).astype(np.float64),
+    })
+
+    # Indicadores ISED: flotantes en [0, 1] con ~5% de nulos
+    indicators = rng.random((n, n_indicators), dtype=np.float32)
+    indicators[rng.random((n, n_indicators)) < 0.05] = np.nan
+    ised = pd.DataFrame(indicators, columns=[f"ised_ind_{i:03d}" for i in range(n_indicators)])
+    return pd.concat([df, ised], axis=1)
+
+
+def generate(rows: int, out: str, n_indicators: int = 200, seed: int = 42,
+             chunk_rows: int = 500_000) -> Path:
+    """Escribe `rows` filas (redondeado a sedes completas) en un Parquet"""
+    rng = np.random.default_rng(seed)
+    out_path = Path(out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    n_years = len(YEARS)
+    total_sedes = max(1, rows // n_years)
+    chunk_sedes = max(1, chunk_rows // n_years)
+
+    writer = None
+    try:
+        for start in range(0, total_sedes, chunk_sedes):
+            df = _chunk(start, min(chunk_sedes, total_sedes - start), n_indicators, YEARS, rng)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out_path, table.schema, compression="snappy")
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un dataset sintético de sedes")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--indicators", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench/data/sedes_synthetic.parquet")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path = generate(args.rows, args.out, args.indicators, args.seed)
+    size_mb = path.stat().st_size / 1e6
+    print(f"✅ {path} ({args.rows} filas, {size_mb:.1f} MB) en {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
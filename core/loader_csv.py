@@ -1,25 +1,89 @@
-import pandas as pd
+import csv
+import logging
 import os
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+
+# Códigos que siempre se leen como texto (los ceros a la izquierda importan)
+TEXT_COLUMNS = (
+    "sede_codigo", "est_id", "MPIO_CDPMP", "DPTO_CCDGO",
+    "cod_dane_municipio", "dpto_ccdgo", "codigo_dane", "codigo_dane_sede",
+)
+
+# Bloques de 16 MB: suficiente paralelismo sin disparar la memoria
+BLOCK_SIZE = 16 << 20
 
-def load_dataset(file_path: str):
+logger = logging.getLogger(__name__)
+
+
+def load_dataset(file_path: str, schema: Optional[Dict[str, pa.DataType]] = None,
+                 quarantine_path: Optional[str] = None) -> pd.DataFrame:
     """
     Lee un archivo (Excel o CSV) y retorna un DataFrame de Pandas.
+
+    Los CSV se leen con el lector multihilo de pyarrow. `schema` fija el tipo
+    de columnas concretas (por defecto los códigos DANE van como texto); el
+    resto se infiere. Las filas mal formadas no se descartan en silencio: se
+    escriben en `quarantine_path` (por defecto `<archivo>.rejected.csv`) y su
+    número queda en `df.attrs["rejected_rows"]`.
+
+    Los nulos se dejan como NaN/None; cada serializador decide cómo emitirlos.
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"El archivo no existe: {file_path}")
-    
+
     # Detectar extensión
-    if file_path.endswith('.csv'):
-        df = pd.read_csv(
-            file_path,
-            dtype={'sede_codigo': str, 'MPIO_CDPMP': str},
-            engine="python",
-            on_bad_lines="skip"  # <<<< FIX IMPORTANTE
-        )
-    else:
+    if not file_path.endswith('.csv'):
         df = pd.read_excel(file_path)
-    
+        df.columns = df.columns.str.strip()  # Cleanup
+        return df
+
+    header = _read_header(file_path)
+    column_types = {c: pa.string() for c in TEXT_COLUMNS}
+    column_types.update(schema or {})
+    # El esquema se aplica sobre los nombres tal cual vienen en el archivo
+    column_types = {raw: column_types[raw.strip()] for raw in header if raw.strip() in column_types}
+
+    rejected: List[str] = []
+
+    def quarantine(row) -> str:
+        rejected.append(row.text)
+        return "skip"
+
+    table = pv.read_csv(
+        file_path,
+        read_options=pv.ReadOptions(block_size=BLOCK_SIZE),
+        parse_options=pv.ParseOptions(newlines_in_values=False, invalid_row_handler=quarantine),
+        convert_options=pv.ConvertOptions(
+            column_types=column_types,
+            strings_can_be_null=True,
+            timestamp_parsers=[],  # igual que pandas: las fechas quedan como texto
+        ),
+    )
+    df = table.to_pandas()
     df.columns = df.columns.str.strip()  # Cleanup
-    df = df.where(pd.notnull(df), None)  # JSON-safe
-    
+
+    if rejected:
+        target = quarantine_path or f"{os.path.splitext(file_path)[0]}.rejected.csv"
+        _write_quarantine(target, header, rejected)
+        logger.warning("%d filas mal formadas en %s → %s", len(rejected), file_path, target)
+    df.attrs["rejected_rows"] = len(rejected)
+
     return df
+
+
+def _read_header(file_path: str) -> List[str]:
+    # utf-8-sig: un BOM (CSV de Excel) no debe quedar pegado al nombre de la primera columna
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f), [])
+
+
+def _write_quarantine(path: str, header: List[str], rows: List[str]) -> None:
+    """Filas rechazadas tal cual venían (con el encabezado para poder reprocesarlas)"""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(",".join(header) + "\n")
+        for text in rows:
+            f.write(text.rstrip("\r\n") + "\n")
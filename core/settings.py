@@ -5,6 +5,20 @@ class Settings(BaseSettings):
     VERSION: str = "0.1.0"
     API_PREFIX: str = "/api/v1"
 
+    # Ejecución de consultas (services/executor.py)
+    QUERY_MAX_CONCURRENCY: int = 4       # consultas ejecutándose a la vez
+    QUERY_QUEUE_SIZE: int = 32           # consultas esperando turno; más allá se rechaza (503)
+    QUERY_QUEUE_TIMEOUT: float = 10.0    # segundos máximos en cola
+    QUERY_PROCESS_WORKERS: int = 0       # >0: serialización en un pool de procesos
+
+    # Perfilado de peticiones lentas (requiere pyinstrument instalado)
+    PROFILE_SLOW_MS: float = 0.0         # >0: guarda el perfil de las muestreadas que superen este umbral
+    PROFILE_SAMPLE_RATE: float = 0.1     # fracción de peticiones que se perfilan
+    PROFILE_DIR: str = "profiles"
+
+    # Modo out-of-core (services/scan.py): /data lee el Parquet por lotes en vez de cargarlo
+    SCAN_THRESHOLD_MB: float = 0.0       # >0: datasets Parquet más grandes que esto (o con "scan": True)
+
     class Config:
         case_sensitive = True
 
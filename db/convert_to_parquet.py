@@ -1,15 +1,400 @@
-import pandas as pd
+"""
+Convierte un CSV grande a Parquet tipado, en el orden físico del motor
+(partición → curva de Hilbert, como services/hilbert.spatial_order):
 
-# Archivos fuente
-CSV = "D:/Proyectos/conectividad_produccion/db/sena_ised_geo.csv"
-PARQUET = "D:/Proyectos/conectividad_produccion/db/sena_ised.parquet"
+  0. Extent de las coordenadas: una lectura del CSV solo con lat/lon.
+  1. El CSV se lee por bloques de 16 MB con el lector de pyarrow. Los tipos
+     se infieren del primer bloque: los códigos DANE son texto, lat/lon
+     números y `--schema` fija otros. Si un bloque posterior no encaja (un
+     indicador entero que luego trae decimales) la columna se ensancha
+     (entero → float64, número → texto) y sigue; lo ya repartido se
+     convierte al tipo final al escribir.
+     Cada bloque se reparte en archivos temporales (Arrow IPC) por cubeta:
+     valores de las columnas de partición (año, departamento) + celda de
+     Hilbert (los bits altos del código, una grilla de 16 celdas sobre el
+     extent).
+  2. Las cubetas van en orden de clave; cada una se ordena en memoria por
+     código de Hilbert (y por sede y año para desempatar) y se escribe en row
+     groups de 50.000 filas. Así el min/max de lat/lon de cada row group es un
+     bbox compacto y el modo por lotes descarta grupos enteros.
 
-print("📥 Leyendo CSV…")
-df = pd.read_csv(CSV, dtype=str, low_memory=False)
+La memoria queda acotada por la cubeta más grande (un año de un departamento
+dentro de una celda), no por el tamaño del archivo; se informa al terminar.
 
-print("💾 Guardando en Parquet...")
-df.to_parquet(PARQUET, compression="snappy")
+Las columnas de pocos valores (categóricas) se guardan con dictionary
+encoding. El tipo de Arrow no cambia y el motor las lee igual que antes.
 
-print("🟢 Listo — Archivo generado:", PARQUET)
-print("Tamaño original:", round(len(open(CSV, 'rb').read())/1024,2), "KB")
-print("Tamaño parquet :", round(len(open(PARQUET, 'rb').read())/1024,2), "KB")
+    python -m db.convert_to_parquet db/sena_ised_geo.csv --dataset sena_ised
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from core.loader_csv import BLOCK_SIZE, TEXT_COLUMNS, _read_header, _write_quarantine
+from services.hilbert import hilbert_codes
+from services.query_engine import DATASETS
+from services.scan import _text_numbers
+
+# Filas por row group: con el orden espacial cada grupo cubre un área compacta
+ROW_GROUP_SIZE = 50_000
+# Bits altos del código de Hilbert (32 bits) que definen la celda de una cubeta: 4 → grilla 4×4
+CELL_BITS = 4
+# Filas sin coordenadas: después de todas las celdas de su partición
+NO_CELL = 1 << CELL_BITS
+# Columna temporal con el código de Hilbert (no llega al Parquet)
+HILBERT = "__hilbert"
+# Columna categórica: a lo sumo esta fracción de valores distintos en el primer bloque
+CATEGORY_RATIO = 0.1
+
+Bucket = Tuple[Tuple[Optional[str], ...], int]
+
+
+def infer_schema(csv_path: str, overrides: Dict[str, pa.DataType]) -> pa.Schema:
+    """Tipos del primer bloque + códigos como texto + `overrides`; columnas vacías → texto"""
+    header = _read_header(csv_path)
+    text = {raw: pa.string() for raw in header if raw.strip() in TEXT_COLUMNS}
+    first = next(_blocks(csv_path), b"")
+    sample = pv.read_csv(pa.BufferReader(first), read_options=pv.ReadOptions(column_names=header),
+                         parse_options=pv.ParseOptions(invalid_row_handler=lambda row: "skip"),
+                         convert_options=_convert_options(text))
+    fields = []
+    for field in sample.schema:
+        kind = overrides.get(field.name.strip(), pa.string() if pa.types.is_null(field.type) else field.type)
+        fields.append(pa.field(field.name, kind))
+    return pa.schema(fields)
+
+
+def _widen(current: pa.DataType, seen: pa.DataType) -> pa.DataType:
+    """Tipo que admite ambos: entero + decimal → float64; cualquier otra mezcla → texto"""
+    if pa.types.is_null(seen) or seen == current:
+        return current
+    numeric = lambda t: pa.types.is_integer(t) or pa.types.is_floating(t)
+    if numeric(current) and numeric(seen):
+        return pa.float64()
+    return pa.string()
+
+
+def _convert_options(column_types: Dict[str, pa.DataType], include: Optional[List[str]] = None) -> pv.ConvertOptions:
+    return pv.ConvertOptions(column_types=column_types, strings_can_be_null=True, timestamp_parsers=[],
+                             include_columns=include or [])
+
+
+def _categoricals(batch: pa.RecordBatch) -> List[str]:
+    """Columnas con pocos valores distintos (van con dictionary encoding en el Parquet)"""
+    limit = max(1, int(batch.num_rows * CATEGORY_RATIO))
+    return [
+        name for name, column in zip(batch.schema.names, batch.columns)
+        if len(pc.unique(column)) <= limit
+    ]
+
+
+def _blocks(csv_path: str, block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+    """
+    El archivo en bloques de ~block_size cortados en fin de línea, sin el encabezado.
+    (pv.open_csv lee por adelantado todo el archivo: así la memoria queda en un bloque).
+    """
+    with open(csv_path, "rb") as f:
+        f.readline()
+        rest = b""
+        while True:
+            chunk = f.read(block_size)
+            if not chunk:
+                break
+            chunk = rest + chunk
+            cut = chunk.rfind(b"\n") + 1
+            if not cut:
+                rest = chunk
+                continue
+            rest = chunk[cut:]
+            yield chunk[:cut]
+        if rest.strip():
+            yield rest
+
+
+def _coordinates(column: pa.Array) -> pa.Array:
+    """lat/lon como float64; lo que no es número queda nulo (como pd.to_numeric(errors="coerce"))"""
+    if pa.types.is_floating(column.type):
+        return column
+    if pa.types.is_integer(column.type):
+        return pc.cast(column, pa.float64())
+    return _text_numbers(column, extract=False)
+
+
+def bounds(csv_path: str, header: List[str], lat: str, lon: str) -> Optional[Tuple[float, float, float, float]]:
+    """Paso 0: extent (min_lon, min_lat, max_lon, max_lat) leyendo solo las coordenadas"""
+    raw = {name.strip(): name for name in header}
+    read_options = pv.ReadOptions(column_names=header)
+    parse_options = pv.ParseOptions(newlines_in_values=False, invalid_row_handler=lambda row: "skip")
+    convert_options = _convert_options({raw[lat]: pa.string(), raw[lon]: pa.string()}, [raw[lon], raw[lat]])
+    box = [np.inf, np.inf, -np.inf, -np.inf]
+    for block in _blocks(csv_path):
+        table = pv.read_csv(pa.BufferReader(block), read_options=read_options,
+                            parse_options=parse_options, convert_options=convert_options)
+        x = _coordinates(table.column(0).combine_chunks())
+        y = _coordinates(table.column(1).combine_chunks())
+        valid = pc.and_(pc.is_valid(x), pc.is_valid(y))
+        if not pc.any(valid).as_py():
+            continue
+        x, y = pc.min_max(x.filter(valid)), pc.min_max(y.filter(valid))
+        box = [min(box[0], x["min"].as_py()), min(box[1], y["min"].as_py()),
+               max(box[2], x["max"].as_py()), max(box[3], y["max"].as_py())]
+    return tuple(box) if np.isfinite(box[0]) else None
+
+
+def _hilbert(batch: pa.RecordBatch, lat: str, lon: str, extent) -> np.ndarray:
+    """Código de Hilbert por fila sobre el extent de todo el archivo (sin coordenadas → 1 << 32)"""
+    x = batch.column(lon).to_numpy(zero_copy_only=False).astype(np.float64)
+    y = batch.column(lat).to_numpy(zero_copy_only=False).astype(np.float64)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    codes = np.full(batch.num_rows, 1 << 32, dtype=np.int64)
+    if extent is not None and valid.any():
+        codes[valid] = hilbert_codes(x[valid], y[valid], extent)
+    return codes
+
+
+def _buckets(batch: pa.RecordBatch, partition_by: List[str]) -> Iterator[Tuple[Bucket, pa.RecordBatch]]:
+    """Las filas del bloque agrupadas por cubeta (valores de partición, celda de Hilbert)"""
+    codes = batch.column(HILBERT).to_numpy()
+    cells = np.where(codes >= 1 << 32, NO_CELL, codes >> (32 - CELL_BITS))
+    keys, labels = [cells], []
+    for col in partition_by:
+        encoded = pc.dictionary_encode(pc.cast(batch.column(col), pa.string()))
+        labels.append(encoded.dictionary.to_pylist() + [None])
+        # nulo → código del final (None en labels)
+        keys.append(encoded.indices.fill_null(len(labels[-1]) - 1).to_numpy(zero_copy_only=False))
+    # lexsort: la última clave es la principal → partición en orden, luego celda
+    order = np.lexsort([cells] + keys[1:][::-1])
+    ordered = [k[order] for k in keys]
+    change = np.zeros(len(order), dtype=bool)
+    if len(order):
+        change[0] = True
+        for k in ordered:
+            change[1:] |= k[1:] != k[:-1]
+    starts = np.flatnonzero(change)
+    sorted_batch = batch.take(pa.array(order))
+    for start, end in zip(starts, np.r_[starts[1:], len(order)]):
+        values = tuple(labels[j][ordered[j + 1][start]] for j in range(len(partition_by)))
+        yield (values, int(ordered[0][start])), sorted_batch.slice(start, end - start)
+
+
+def _read_block(block: bytes, schema: pa.Schema, fixed: Set[str],
+                widened: Dict[str, Tuple[pa.DataType, pa.DataType]]) -> Tuple[pa.Table, pa.Schema, List[str]]:
+    """
+    Un bloque con los tipos de `schema`; si alguna columna no encaja se ensancha
+    (salvo las de `fixed`) y se vuelve a leer. Devuelve (tabla, esquema vigente,
+    filas mal formadas).
+    """
+    rejected: List[str] = []
+
+    def quarantine(row) -> str:
+        rejected.append(row.text)
+        return "skip"
+
+    read_options = pv.ReadOptions(column_names=[f.name for f in schema])
+    parse_options = pv.ParseOptions(newlines_in_values=False, invalid_row_handler=quarantine)
+    try:
+        table = pv.read_csv(pa.BufferReader(block), read_options=read_options, parse_options=parse_options,
+                            convert_options=_convert_options({f.name: f.type for f in schema}))
+        return table, schema, rejected
+    except pa.ArrowInvalid:
+        # Tipos que infiere este bloque para las columnas no fijas (el texto ya admite todo)
+        free = [f.name for f in schema if f.name.strip() not in fixed and not pa.types.is_string(f.type)]
+        if not free:
+            raise
+        sample = pv.read_csv(pa.BufferReader(block), read_options=read_options,
+                             parse_options=pv.ParseOptions(invalid_row_handler=lambda row: "skip"),
+                             convert_options=_convert_options({}, free))
+        fields = []
+        for f in schema:
+            kind = _widen(f.type, sample.schema.field(f.name).type) if f.name in free else f.type
+            if kind != f.type:
+                # (tipo inferido al principio, tipo actual)
+                widened[f.name.strip()] = (widened.get(f.name.strip(), (f.type,))[0], kind)
+            fields.append(pa.field(f.name, kind))
+        wider = pa.schema(fields)
+        if wider == schema:
+            raise
+    return _read_block(block, wider, fixed, widened)
+
+
+def partition(csv_path: str, schema: pa.Schema, partition_by: List[str], lat: str, lon: str,
+              extent, tmp_dir: str, fixed: Set[str] = frozenset()):
+    """
+    Paso 1: bloques del CSV → archivos IPC por cubeta (uno nuevo por cubeta cada
+    vez que se ensancha el esquema). Devuelve (archivos por cubeta en orden,
+    filas, rechazadas, categóricas, esquema final, columnas ensanchadas)
+    """
+    rejected: List[str] = []
+    writers: Dict[Bucket, ipc.RecordBatchStreamWriter] = {}
+    paths: Dict[Bucket, List[str]] = {}
+    widened: Dict[str, Tuple[pa.DataType, pa.DataType]] = {}
+    rows, categoricals, files, clean = 0, None, 0, None
+    try:
+        for block in _blocks(csv_path):
+            table, current, bad = _read_block(block, schema, fixed, widened)
+            rejected += bad
+            if current != schema or clean is None:
+                # Nombres limpios (sin espacios) desde aquí en adelante; lat/lon numéricas
+                schema, clean = current, _clean_schema(current, lat, lon)
+                spill = clean.append(pa.field(HILBERT, pa.int64()))
+                for writer in writers.values():
+                    writer.close()
+                writers = {}
+            columns = [column.combine_chunks() for column in table.columns]
+            names = clean.names
+            for name in (lat, lon):
+                columns[names.index(name)] = _coordinates(columns[names.index(name)])
+            batch = pa.RecordBatch.from_arrays(columns, schema=clean)
+            if categoricals is None:
+                categoricals = _categoricals(batch)
+            rows += batch.num_rows
+            batch = pa.RecordBatch.from_arrays(
+                batch.columns + [pa.array(_hilbert(batch, lat, lon, extent))], schema=spill
+            )
+            for bucket, part in _buckets(batch, partition_by):
+                if bucket not in writers:
+                    path = os.path.join(tmp_dir, f"part_{files}.arrow")
+                    files += 1
+                    paths.setdefault(bucket, []).append(path)
+                    writers[bucket] = ipc.new_stream(path, spill)
+                writers[bucket].write_batch(part)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    # Orden de cubetas = orden final (los nulos de partición, al final)
+    key = lambda b: (tuple((v is None, v or "") for v in b[0]), b[1])
+    ordered = [paths[bucket] for bucket in sorted(paths, key=key)]
+    categoricals = [c for c in categoricals or [] if c not in (lat, lon)]
+    return ordered, rows, rejected, categoricals, clean or _clean_schema(schema, lat, lon), widened
+
+
+def _clean_schema(schema: pa.Schema, lat: str, lon: str) -> pa.Schema:
+    fields = []
+    for f in schema:
+        name = f.name.strip()
+        fields.append(pa.field(name, pa.float64() if name in (lat, lon) else f.type))
+    return pa.schema(fields)
+
+
+def write_sorted(parts: List[List[str]], schema: pa.Schema, tiebreak: List[str], parquet_path: str,
+                 categoricals: List[str], row_group_size: int = ROW_GROUP_SIZE) -> Tuple[int, int]:
+    """Paso 2: cada cubeta (en el esquema final) ordenada por Hilbert (+ desempate) → row groups"""
+    writer = pq.ParquetWriter(parquet_path, schema, compression="zstd", use_dictionary=categoricals)
+    spill = schema.append(pa.field(HILBERT, pa.int64()))
+    sort_keys = [(HILBERT, "ascending")] + [(col, "ascending") for col in tiebreak]
+    pending: List[pa.Table] = []
+    groups = largest = 0
+    try:
+        for paths in parts:
+            tables = []
+            for path in paths:
+                with ipc.open_stream(path) as source:
+                    tables.append(source.read_all().cast(spill))
+                os.remove(path)
+            table = pa.concat_tables(tables)
+            largest = max(largest, table.num_rows)
+            pending.append(table.sort_by(sort_keys).drop_columns([HILBERT]))
+            if sum(t.num_rows for t in pending) < row_group_size:
+                continue
+            table = pa.concat_tables(pending)
+            full = table.num_rows // row_group_size * row_group_size
+            writer.write_table(table.slice(0, full), row_group_size=row_group_size)
+            groups += full // row_group_size
+            pending = [table.slice(full)]
+        tail = pa.concat_tables(pending) if pending else None
+        if tail is not None and tail.num_rows:
+            writer.write_table(tail, row_group_size=row_group_size)
+            groups += 1
+    finally:
+        writer.close()
+    return groups, largest
+
+
+def convert(csv_path: str, parquet_path: str, lat: str, lon: str, partition_by: List[str],
+            tiebreak: List[str], overrides: Optional[Dict[str, pa.DataType]] = None,
+            row_group_size: int = ROW_GROUP_SIZE) -> dict:
+    schema = infer_schema(csv_path, overrides or {})
+    names = [f.name.strip() for f in schema]
+    missing = [col for col in [lat, lon] + partition_by + tiebreak if col not in names]
+    if missing:
+        raise ValueError(f"Columnas inexistentes en el CSV: {missing}")
+
+    extent = bounds(csv_path, [f.name for f in schema], lat, lon)
+    # Los tipos fijados con --schema no se ensanchan
+    fixed = set(overrides or {})
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(parquet_path))) as tmp_dir:
+        parts, rows, rejected, categoricals, clean, widened = partition(
+            csv_path, schema, partition_by, lat, lon, extent, tmp_dir, fixed
+        )
+        groups, largest = write_sorted(parts, clean, tiebreak, parquet_path, categoricals, row_group_size)
+
+    if rejected:
+        target = f"{os.path.splitext(csv_path)[0]}.rejected.csv"
+        _write_quarantine(target, [f.name for f in schema], rejected)
+        print(f"⚠️ {len(rejected)} filas mal formadas → {target}")
+    return {"rows": rows, "row_groups": groups, "buckets": len(parts), "largest_bucket": largest,
+            "rejected": len(rejected), "categoricals": categoricals, "schema": clean, "widened": widened}
+
+
+def _parse_schema(path: Optional[str]) -> Dict[str, pa.DataType]:
+    """JSON {"columna": "int64" | "float64" | "string" | "bool" ...} → tipos de Arrow"""
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {col: pa.type_for_alias(kind) for col, kind in json.load(f).items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convierte un CSV a Parquet tipado en orden espacial (memoria acotada)")
+    parser.add_argument("csv")
+    parser.add_argument("parquet", nargs="?", help="Destino (por defecto el 'file' del dataset)")
+    parser.add_argument("--dataset", default="sena_ised", choices=list(DATASETS))
+    parser.add_argument("--schema", help="JSON con tipos por columna (lo demás se infiere)")
+    parser.add_argument("--partition", nargs="*", help="Columnas de partición (por defecto el 'partition' del dataset)")
+    parser.add_argument("--sort", nargs="+", help="Desempate dentro de la celda (por defecto el 'order' del dataset)")
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE)
+    args = parser.parse_args(argv)
+
+    config = DATASETS[args.dataset]
+    parquet_path = args.parquet or config["file"]
+    partition_by = config.get("partition", []) if args.partition is None else args.partition
+    tiebreak = args.sort or config.get("order") or ["sede_codigo", "year_reporte"]
+
+    print(f"📥 Convirtiendo {args.csv} → {parquet_path} "
+          f"(orden: {', '.join(partition_by + ['hilbert'] + tiebreak)})")
+    start = time.perf_counter()
+    try:
+        result = convert(args.csv, parquet_path, config["lat_col"], config["lon_col"], partition_by,
+                         tiebreak, _parse_schema(args.schema), args.row_group_size)
+    except (FileNotFoundError, ValueError, pa.ArrowInvalid) as e:
+        # ArrowInvalid: un bloque no encaja en un tipo fijado con --schema
+        print(f"❌ {e}")
+        return 1
+
+    for field in result["schema"]:
+        tag = " (diccionario)" if field.name in result["categoricals"] else ""
+        if field.name in result["widened"]:
+            before, after = result["widened"][field.name]
+            tag += f" (ensanchada: {before} → {after})"
+        print(f"  {field.name}: {field.type}{tag}")
+    csv_kb, parquet_kb = os.path.getsize(args.csv) / 1024, os.path.getsize(parquet_path) / 1024
+    print(f"🟢 {result['rows']} filas en {result['row_groups']} row groups, {time.perf_counter() - start:.1f}s")
+    print(f"Cubetas: {result['buckets']} (la más grande, {result['largest_bucket']} filas, fija la memoria)")
+    print(f"Tamaño original: {csv_kb:,.2f} KB")
+    print(f"Tamaño parquet : {parquet_kb:,.2f} KB ({parquet_kb / csv_kb:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
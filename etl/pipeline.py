@@ -1,19 +1,19 @@
+from __future__ import annotations
+
 import pandas as pd
-import geopandas as gpd
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import geopandas as gpd
 
 # ============================================================================
 # SCRIPT PARA GENERAR CSV MOCK COMPLETO
 # Consolida: sedes + geografía + indicadores ISED + conectividad
 # ============================================================================
 
-# Carga de datos
-
-ised = pd.read_excel(r"database/datos/Base_ISED_2022_2023.xlsx", sheet_name="Sheet1")
-rectores = pd.read_excel(r"database/datos/Códigos_CC422701  MD-MINTIC Rectores 2025.xlsx")
-conectividad = pd.read_csv(r"database/datos/Conectividad_2022_2025.txt", sep=",")
-municipios = gpd.read_file(r"database/datos/MGN_MPIO_POLITICO/MGN_MPIO_POLITICO.shp")
-departamentos = gpd.read_file(r"database/datos/MGN_DPTO_POLITICO/MGN_ADM_DPTO_POLITICO.shp")
+# Sin carga de datos al importar: build_df_completo() lee los archivos fuente
+# y geopandas se importa solo en las funciones que lo usan.
 
 def estandarizar_codigos(
     ised: pd.DataFrame,
@@ -159,6 +159,8 @@ def validar_coordenadas_en_municipio(
         return df
 
     # GeoDataFrame de sedes con coords
+    import geopandas as gpd
+
     puntos = gpd.GeoDataFrame(
         df.loc[mask_coord_ok].copy(),
         geometry=gpd.points_from_xy(
@@ -238,6 +240,8 @@ def validar_coordenadas_en_municipio(
         return df
 
     # GeoDataFrame de sedes con coords
+    import geopandas as gpd
+
     puntos = gpd.GeoDataFrame(
         df.loc[mask_coord_ok].copy(),
         geometry=gpd.points_from_xy(
@@ -332,6 +336,8 @@ def normalizar_datos(
     )
 
     # convertimos en gdf
+    import geopandas as gpd
+
     sedes = gpd.GeoDataFrame(
         sedes,
         geometry=gpd.points_from_xy(sedes["longitud"], sedes["latitud"], crs="EPSG:4326")
@@ -618,6 +624,8 @@ def build_df_completo() -> pd.DataFrame:
     rectores = pd.read_excel(base_path / "Códigos_CC422701  MD-MINTIC Rectores 2025.xlsx")
     conectividad = pd.read_csv(base_path / "Conectividad_2022_2025.txt", sep=",")
 
+    import geopandas as gpd
+
     municipios = gpd.read_file(base_path / "MGN_MPIO_POLITICO" / "MGN_MPIO_POLITICO.shp")
     departamentos = gpd.read_file(base_path / "MGN_DPTO_POLITICO" / "MGN_ADM_DPTO_POLITICO.shp")
 
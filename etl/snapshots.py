@@ -0,0 +1,127 @@
+"""
+Exporta las vistas más consultadas de QueryEngine como archivos estáticos
+(etapa posterior al ETL):
+
+  - FlatGeobuf por departamento/año, con índice espacial (lectura por bbox
+    con HTTP range requests desde el navegador)
+  - PMTiles del dataset completo, si `tippecanoe` está en el PATH
+  - manifest.json con ruta, filtros, filas, bytes y bbox de cada archivo
+
+Se sirven tal cual desde el mount `/static` de main.py, sin pasar por Python.
+
+    python -m etl.snapshots --datasets sedes_mock --out static/snapshots
+"""
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from services.aggregations import aggregate
+from services.query_engine import DATASETS, query_engine
+
+# Columnas que definen cada vista: un archivo por combinación de valores
+SNAPSHOT_VIEWS: Dict[str, Tuple[str, ...]] = {
+    "sedes_mock": ("DPTO_CCDGO", "year_reporte"),
+    "sena_ised": ("dpto_ccdgo", "year_reporte"),
+}
+DEFAULT_OUT = "static/snapshots"
+TIPPECANOE_ARGS = ["-zg", "--drop-densest-as-needed", "--force", "--quiet"]
+
+
+def view_groups(dataset_id: str, columns: Tuple[str, ...]) -> List[Dict]:
+    """Combinaciones de valores presentes en el dataset (desde los índices, sin recorrer filas)"""
+    index = query_engine._get_index(dataset_id)
+    positions = np.arange(index.size)
+    rows = aggregate(index, positions, list(columns), [("count", None)])
+    return [{c: row[c] for c in columns} for row in rows if all(row[c] is not None for c in columns)]
+
+
+def _file_name(values: Dict) -> str:
+    return "_".join(str(v).replace("/", "-").replace(" ", "_") for v in values.values()) + ".fgb"
+
+
+def write_fgb(df: pd.DataFrame, path: Path, lat_col: str, lon_col: str) -> Tuple[int, List[float]]:
+    """Escribe puntos a FlatGeobuf con índice espacial; retorna (features escritas, bbox)"""
+    df = df.dropna(subset=[lat_col, lon_col])
+    gdf = gpd.GeoDataFrame(
+        df.drop(columns=[lat_col, lon_col]),
+        geometry=gpd.points_from_xy(df[lon_col], df[lat_col]),
+        crs="EPSG:4326",
+    )
+    gdf.to_file(path, driver="FlatGeobuf", engine="pyogrio", SPATIAL_INDEX="YES")
+    return len(gdf), [float(v) for v in gdf.total_bounds] if len(gdf) else []
+
+
+def write_pmtiles(dataset_id: str, sources: List[Path], out_dir: Path) -> Path:
+    """Teselas vectoriales (un solo archivo PMTiles) a partir de los FlatGeobuf"""
+    target = out_dir / f"{dataset_id}.pmtiles"
+    cmd = ["tippecanoe", *TIPPECANOE_ARGS, "-l", dataset_id, "-o", str(target), *map(str, sources)]
+    subprocess.run(cmd, check=True)
+    return target
+
+
+def export_dataset(dataset_id: str, out_dir: Path, pmtiles: bool = True) -> Dict:
+    config = DATASETS[dataset_id]
+    columns = SNAPSHOT_VIEWS[dataset_id]
+    target_dir = out_dir / dataset_id
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    files = []
+    for values in view_groups(dataset_id, columns):
+        df = query_engine.select(dataset_id, values)
+        path = target_dir / _file_name(values)
+        # Filas = features en el archivo (las sedes sin coordenadas no entran)
+        rows, bbox = write_fgb(df, path, config["lat_col"], config["lon_col"])
+        files.append({
+            "filters": {k: str(v) for k, v in values.items()},
+            "path": path.relative_to(out_dir).as_posix(),
+            "rows": int(rows),
+            "bytes": path.stat().st_size,
+            "bbox": bbox,
+        })
+        skipped = f", {len(df) - rows} sin coordenadas" if rows < len(df) else ""
+        print(f"  📦 {files[-1]['path']} ({rows} filas{skipped})")
+
+    entry = {"views": list(columns), "files": files}
+    if pmtiles and shutil.which("tippecanoe") and files:
+        tiles = write_pmtiles(dataset_id, [out_dir / f["path"] for f in files], out_dir)
+        entry["pmtiles"] = {"path": tiles.relative_to(out_dir).as_posix(), "bytes": tiles.stat().st_size}
+        print(f"  🗺️ {entry['pmtiles']['path']}")
+    elif pmtiles:
+        print("  ⚠️ tippecanoe no está en el PATH: se omite PMTiles")
+    return entry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta vistas precalculadas a /static/snapshots")
+    parser.add_argument("--datasets", nargs="+", default=list(SNAPSHOT_VIEWS), choices=list(SNAPSHOT_VIEWS))
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    parser.add_argument("--no-pmtiles", action="store_true")
+    args = parser.parse_args(argv)
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {"generated": time.strftime("%Y-%m-%dT%H:%M:%S"), "datasets": {}}
+
+    for dataset_id in args.datasets:
+        print(f"🚀 Exportando {dataset_id}...")
+        try:
+            manifest["datasets"][dataset_id] = export_dataset(dataset_id, out_dir, not args.no_pmtiles)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"  ⚠️ {e}")
+
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"✅ Manifest en {out_dir / 'manifest.json'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
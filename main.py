@@ -1,18 +1,81 @@
-from fastapi import FastAPI
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 
+from core.settings import settings
 from routers import data, agent 
+from services.executor import executor, Overloaded
+from services import metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    executor.shutdown()
 
 
 app = FastAPI(
     title="GeoData Backend ISED",
     version="1.3.0",
-    description="API + Visor Web Conectividad Educativa"
+    description="API + Visor Web Conectividad Educativa",
+    lifespan=lifespan
 )
 
 
+# ---------- SOBRECARGA → 503 ----------
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+
+# ---------- TIEMPOS POR ETAPA (Server-Timing + métricas) ----------
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    profile = settings.PROFILE_SLOW_MS > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+    trace = metrics.start_trace(profile)
+
+    response = await call_next(request)
+    # Sin content-length el cuerpo sale en streaming después de los encabezados:
+    # sus etapas van solo a los histogramas, no a Server-Timing
+    streamed = response.headers.get("content-length") is None
+    trace.sealed = True
+
+    total = time.perf_counter() - trace.start
+    # Ruta como plantilla (/data/{dataset_id}) para no disparar la cardinalidad
+    path = "unmatched"
+    if request.scope.get("route") is not None:
+        path = request.url.path
+        for name, value in request.path_params.items():
+            path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+
+    metrics.HTTP_REQUESTS.inc(path, request.method, str(response.status_code))
+    metrics.HTTP_DURATION.observe(path, value=total)
+    size = response.headers.get("content-length")
+    if size is not None:
+        metrics.PAYLOAD_BYTES.observe(path, value=int(size))
+
+    response.headers["Server-Timing"] = trace.server_timing(total, streamed)
+    if trace.rows_out is not None:
+        response.headers["X-Rows"] = f"{trace.rows_in}/{trace.rows_out}"
+
+    if trace.profile_output and total * 1000 >= settings.PROFILE_SLOW_MS:
+        out = Path(settings.PROFILE_DIR)
+        out.mkdir(parents=True, exist_ok=True)
+        name = re.sub(r"[^\w]+", "_", request.url.path).strip("_") or "root"
+        (out / f"{time.strftime('%Y%m%d-%H%M%S')}_{name}_{total * 1000:.0f}ms.txt").write_text(
+            f"{request.method} {request.url}\n\n{trace.profile_output}", encoding="utf-8"
+        )
+
+    return response
+
+
 # ---------- CORS ----------
 app.add_middleware(
     CORSMiddleware,
@@ -27,6 +90,18 @@ app.include_router(data.router, prefix="/data")
 app.include_router(agent.router, prefix="/agent")
 
 
+# ---------- SALUD (no carga datasets ni librerías pesadas) ----------
+@app.get("/health", include_in_schema=False)
+def health():
+    return {"status": "ok", "version": app.version}
+
+
+# ---------- MÉTRICAS (Prometheus) ----------
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
 # ---------- ARCHIVOS FRONT ----------
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -1,19 +1,55 @@
-from fastapi import APIRouter, HTTPException
+from functools import partial
+from typing import Literal, Optional
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, HTTPException, Response
 from pydantic import BaseModel
 from agent.mock_mcp import agent
+from services.executor import executor, Overloaded
+from services.filters import FilterError
+from services.precision import DEFAULT_PRECISION
+from services.query_engine import query_engine, data_key, encode_data
+from services.serialization import dumps
 
 router = APIRouter()
 
 class ChatRequest(BaseModel):
     message: str
+    # "url": agrega la URL de /data equivalente; "data": incluye el resultado (sin segundo viaje)
+    include: Optional[Literal["url", "data"]] = None
 
 @router.post("/chat")
-def chat_with_data(request: ChatRequest):
+async def chat_with_data(request: ChatRequest):
     """
     Endpoint que recibe texto y devuelve instrucciones para el mapa.
     """
+    # La primera consulta puede cargar sedes_mock: corre en el executor, no en el event loop
     try:
-        response = agent.process_query(request.message)
-        return response
+        response = await executor.submit(("chat", request.message), lambda: agent.process_query(request.message))
+    except Overloaded:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    if request.include is None:
+        return response
+
+    action = response["action"]
+    dataset_id, filters = action["dataset"], action["filters"]
+    response = {**response, "data_url": f"/data/{dataset_id}?{urlencode(filters)}".rstrip("?")}
+    if request.include == "url":
+        return response
+
+    # Misma clave que GET /data/{dataset_id}: comparte cómputo con esa ruta
+    try:
+        body = await executor.submit(
+            data_key(dataset_id, "json", None, DEFAULT_PRECISION, (), query_engine.query_key(filters, None, None)),
+            lambda: query_engine.select(dataset_id, filters),
+            partial(encode_data, dataset_id=dataset_id, format="json", elevation_col=None, precision=DEFAULT_PRECISION),
+        )
+    except FilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    # El resultado ya viene serializado: se inserta tal cual en el JSON de respuesta
+    head = dumps(response)
+    return Response(content=head[:-1] + b',"data":' + body + b"}", media_type="application/json")
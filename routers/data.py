@@ -1,10 +1,51 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from typing import Optional
-from services.query_engine import query_engine, DATASETS
-import pandas as pd
+from functools import partial
+import json
+from services.query_engine import query_engine, data_key, encode_data, encode_page, iter_encoded, DATASETS
+from services.executor import executor
+from services.fgb import iter_fgb
+from services.filters import FilterError
+from services.precision import DEFAULT_PRECISION, MAX_PRECISION, attribute_rounding, resolve_precision
+from services.serialization import json_response
+from services.timeseries import STATUSES
 
 router = APIRouter()
 
+
+# =====================================================================
+# 📌 FILTROS COMUNES (mismos parámetros para /data, /aggregate, ...)
+# =====================================================================
+class DataFilters:
+    def __init__(
+        self,
+        # filtros generales
+        year_reporte: Optional[str]=None,
+        zona: Optional[str]=None,
+        DPTO_CNMBR: Optional[str]=None,
+        MPIO_CNMBR: Optional[str]=None,
+
+        # filtros sena_ised
+        departamento: Optional[str]=None,
+        d_conectado: Optional[str]=None,
+        sector_atencion: Optional[str]=None,
+
+        bbox: Optional[str]=None,
+
+        # expresión de filtro (JSON o compacta), sobre cualquier columna
+        filter: Optional[str]=Query(None,description='Ej: year_reporte=2022|2023;ised_x>=0.5;nombre_sede~san'),
+    ):
+        self.filters={k:v for k,v in {
+            "year_reporte":year_reporte,"zona":zona,
+            "DPTO_CNMBR":DPTO_CNMBR,"MPIO_CNMBR":MPIO_CNMBR,
+            "departamento":departamento,"d_conectado":d_conectado,
+            "sector_atencion":sector_atencion
+        }.items() if v}
+        self.bbox=bbox
+        self.where=filter
+
+
 # =====================================================================
 # 📌 LISTA DE DATASETS DISPONIBLES
 # =====================================================================
@@ -17,38 +58,140 @@ def list_datasets():
 # 📌 ENDPOINT PRINCIPAL → /data/{dataset_id}
 # =====================================================================
 @router.get("/{dataset_id}")
-def get_dataset_data(
+async def get_dataset_data(
     dataset_id: str,
-    format: str = Query("json",enum=["json","geojson","columnar"]),
+    format: str = Query("json",enum=["json","geojson","columnar","fgb"]),
     elevation_col: Optional[str] = None,
+    spatial_index: bool = Query(True,description="Solo fgb: incluye R-tree empaquetado para lecturas por bbox"),
+    latest: bool = Query(False,description="Una fila por sede: su reporte más reciente (filtros aplican sobre esas filas)"),
+    limit: Optional[int] = Query(None,ge=1,le=10000,description="Solo json: tamaño de página (orden estable por sede y año)"),
+    cursor: Optional[str] = Query(None,description="Solo json: next_cursor de la página anterior"),
+    precision: Optional[int] = Query(None,ge=0,le=MAX_PRECISION,description=f"Decimales de la geometría (por defecto según zoom, o {DEFAULT_PRECISION}); explícita también redondea lat/lon en json"),
+    zoom: Optional[float] = Query(None,ge=0,le=24,description="Zoom del mapa: elige la precisión por defecto"),
+    round_cols: Optional[str] = Query(None,alias="round",description="Columnas de atributos a redondear a la misma precisión, ej: ised_*"),
+    join: Optional[str] = Query(None,description="Dataset unido por sede (ej: sena_ised); filtros con prefijo 'sena_ised.col'"),
+    join_columns: Optional[str] = Query(None,description="Columnas del dataset unido, separadas por coma (por defecto todas)"),
+    q: DataFilters = Depends(),
+):
+    try:
+        key=query_engine.query_key(q.filters,q.bbox,q.where,latest)
+        config=DATASETS.get(dataset_id,{})
+        rounded=attribute_rounding(round_cols,[config.get("lat_col"),config.get("lon_col")],precision is not None or zoom is not None)
+        precision=resolve_precision(precision,zoom)
+        join_cols=[c.strip() for c in (join_columns or "").split(",") if c.strip()]
+        if join:
+            key=key+(("join",join,tuple(join_cols)),)
+        if query_engine.is_scanned(dataset_id):
+            # Dataset más grande que la memoria: lotes del Parquet directo al encoder
+            if latest or join or limit or cursor:
+                raise FilterError("latest, join y paginación no están disponibles en modo por lotes")
+            # Lectura del primer lote y envío dentro de un cupo del executor
+            body=await executor.stream(lambda: iter_encoded(
+                query_engine.scan(dataset_id,q.filters,q.bbox,q.where),dataset_id,format,elevation_col,precision,rounded))
+            media_type="application/vnd.flatgeobuf" if format=="fgb" else "application/json"
+            return StreamingResponse(body,media_type=media_type)
+        if format=="json" and (limit or cursor):
+            # Paginación por keyset: solo se materializa la página pedida
+            limit=limit or 1000
+            body=await executor.submit(
+                ("page",dataset_id,limit,cursor,precision,rounded,key),
+                lambda: query_engine.select_page(dataset_id,q.filters,q.bbox,q.where,latest,limit,cursor,join,join_cols),
+                partial(encode_page,dataset_id=dataset_id,precision=precision,rounded=rounded),
+            )
+            return Response(content=body,media_type="application/json")
+
+        if format=="fgb":
+            # FlatGeobuf binario: se envía por bloques a medida que se codifica
+            df=await executor.submit(
+                ("select",dataset_id,key),
+                lambda: query_engine.select(dataset_id,q.filters,q.bbox,q.where,latest,join,join_cols),
+            )
+            config=DATASETS[dataset_id]
+            body=await executor.stream(
+                lambda: iter_fgb(df,config["lat_col"],config["lon_col"],dataset_id,spatial_index,precision=precision))
+            return StreamingResponse(
+                body,
+                media_type="application/vnd.flatgeobuf",
+                headers={"Content-Disposition":f'inline; filename="{dataset_id}.fgb"'},
+            )
 
-    # filtros generales
-    year_reporte: Optional[str]=None,
-    zona: Optional[str]=None,
-    DPTO_CNMBR: Optional[str]=None,
-    MPIO_CNMBR: Optional[str]=None,
+        # Selección en el threadpool, serialización (posible pool de procesos) aparte
+        body=await executor.submit(
+            data_key(dataset_id,format,elevation_col,precision,rounded,key),
+            lambda: query_engine.select(dataset_id,q.filters,q.bbox,q.where,latest,join,join_cols),
+            partial(encode_data,dataset_id=dataset_id,format=format,elevation_col=elevation_col,precision=precision,rounded=rounded),
+        )
+        return Response(content=body,media_type="application/json")
+
+    except FilterError as e:
+        raise HTTPException(status_code=400,detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404,detail=str(e))
 
-    # filtros sena_ised
-    departamento: Optional[str]=None,
-    d_conectado: Optional[str]=None,
-    sector_atencion: Optional[str]=None,
 
-    bbox: Optional[str]=None
+# =====================================================================
+# 🔎 BÚSQUEDA POR NOMBRE — /data/{dataset_id}/search
+# =====================================================================
+@router.get("/{dataset_id}/search")
+def search_dataset(
+    dataset_id: str,
+    q: str = Query(...,min_length=1,description="Nombre de sede, establecimiento, municipio o código"),
+    limit: int = Query(10,ge=1,le=100),
 ):
+    # Índice en memoria (milisegundos): no pasa por la cola del executor
     try:
-        filters={k:v for k,v in {
-            "year_reporte":year_reporte,"zona":zona,
-            "DPTO_CNMBR":DPTO_CNMBR,"MPIO_CNMBR":MPIO_CNMBR,
-            "departamento":departamento,"d_conectado":d_conectado,
-            "sector_atencion":sector_atencion
-        }.items() if v}
+        results=query_engine.search(dataset_id,q,limit)
+        return json_response({"dataset":dataset_id,"query":q,"count":len(results),"results":results})
+    except ValueError as e:
+        raise HTTPException(status_code=404,detail=str(e))
+
+
+# =====================================================================
+# 📌 AGREGACIONES — /data/{dataset_id}/aggregate
+# =====================================================================
+@router.get("/{dataset_id}/aggregate")
+async def get_dataset_aggregate(
+    dataset_id: str,
+    group_by: str = Query(...,description="Columnas separadas por coma, ej: DPTO_CNMBR,zona"),
+    metrics: str = Query("count",description="Ej: count,mean(ised_x),sum(total_equipos)"),
+    latest: bool = Query(False,description="Una fila por sede: su reporte más reciente (filtros aplican sobre esas filas)"),
+    q: DataFilters = Depends(),
+):
+    try:
+        columns=[c.strip() for c in group_by.split(",") if c.strip()]
+        result=await executor.submit(
+            ("aggregate",dataset_id,tuple(columns),metrics,query_engine.query_key(q.filters,q.bbox,q.where,latest)),
+            lambda: query_engine.get_aggregate(dataset_id,columns,metrics,q.filters,q.bbox,q.where,latest),
+        )
+        return json_response({"dataset":dataset_id,**result})
+
+    except FilterError as e:
+        raise HTTPException(status_code=400,detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404,detail=str(e))
 
-        data=query_engine.get_data(dataset_id,format,filters,bbox,elevation_col)
 
-        return data if format=="geojson" else {
-            "dataset":dataset_id,"count":len(data),"data":data
-        }
+# =====================================================================
+# 📌 COROPLETAS — /data/{dataset_id}/choropleth
+# =====================================================================
+@router.get("/{dataset_id}/choropleth")
+async def get_dataset_choropleth(
+    dataset_id: str,
+    level: str = Query("departamento",enum=["departamento","municipio"]),
+    zoom: float = 5,
+    metrics: str = Query("count",description="Ej: count,mean(ised_x)"),
+    latest: bool = Query(False,description="Una fila por sede: su reporte más reciente (filtros aplican sobre esas filas)"),
+    q: DataFilters = Depends(),
+):
+    try:
+        body=await executor.submit(
+            ("choropleth",dataset_id,level,zoom,metrics,query_engine.query_key(q.filters,q.bbox,q.where,latest)),
+            lambda: query_engine.get_choropleth(dataset_id,level,zoom,metrics,q.filters,q.bbox,q.where,latest),
+        )
+        return Response(content=body,media_type="application/geo+json")
 
+    except FilterError as e:
+        raise HTTPException(status_code=400,detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404,detail=str(e))
 
@@ -57,18 +200,124 @@ def get_dataset_data(
 # 📌 RANGOS / CLASIFICACIÓN — /data/{dataset_id}/breaks
 # =====================================================================
 @router.get("/{dataset_id}/breaks")
-def get_dataset_breaks(
+async def get_dataset_breaks(
     dataset_id:str, field:str,
-    method:str=Query("quantile",enum=["quantile","equal_interval","unique"]),
-    bins:int=5):
-    return query_engine.get_classification_breaks(dataset_id,field,method,bins)
+    method:str=Query("quantile",enum=["quantile","equal_interval","jenks","unique"]),
+    bins:int=Query(5,ge=1,le=50),
+    latest:bool=Query(False,description="Una fila por sede: su reporte más reciente"),
+    q: DataFilters = Depends()):
+    try:
+        result=await executor.submit(
+            ("breaks",dataset_id,field,method,bins,query_engine.query_key(q.filters,q.bbox,q.where,latest)),
+            lambda: query_engine.get_classification_breaks(dataset_id,field,method,bins,q.filters,q.bbox,q.where,latest),
+        )
+        return json_response(result)
+
+    except FilterError as e:
+        raise HTTPException(status_code=400,detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404,detail=str(e))
+
+
+# =====================================================================
+# 📈 CAMBIOS ENTRE AÑOS — /data/{dataset_id}/changes
+# =====================================================================
+@router.get("/{dataset_id}/changes")
+async def get_dataset_changes(
+    dataset_id: str,
+    from_year: int = Query(...,description="Año base, ej: 2022"),
+    to_year: int = Query(...,description="Año de comparación, ej: 2025"),
+    group_by: Optional[str] = Query(None,description="Agregar por área, ej: DPTO_CNMBR"),
+    change: Optional[str] = Query(None,enum=STATUSES,description="Solo sedes con este cambio (sin group_by)"),
+    q: DataFilters = Depends(),
+):
+    try:
+        columns=[c.strip() for c in (group_by or "").split(",") if c.strip()]
+        result=await executor.submit(
+            ("changes",dataset_id,from_year,to_year,tuple(columns),change,query_engine.query_key(q.filters,q.bbox,q.where)),
+            lambda: query_engine.get_changes(dataset_id,from_year,to_year,columns,change,q.filters,q.bbox,q.where),
+        )
+        return json_response({"dataset":dataset_id,**result})
+
+    except FilterError as e:
+        raise HTTPException(status_code=400,detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404,detail=str(e))
+
+
+# =====================================================================
+# 📍 BÚSQUEDA ESPACIAL — /data/{dataset_id}/nearest y /within
+# =====================================================================
+SPATIAL_MEDIA={"json":"application/json","geojson":"application/geo+json","fgb":"application/vnd.flatgeobuf"}
+
+
+def _rounding(dataset_id:str,round_cols:Optional[str],precision:Optional[int]):
+    """(columnas de atributos a redondear, precisión de la geometría)"""
+    config=DATASETS.get(dataset_id,{})
+    rounded=attribute_rounding(round_cols,[config.get("lat_col"),config.get("lon_col")],precision is not None)
+    return rounded,resolve_precision(precision,None)
+
+
+@router.get("/{dataset_id}/nearest")
+async def get_dataset_nearest(
+    dataset_id: str,
+    lat: float = Query(...,ge=-90,le=90),
+    lon: float = Query(...,ge=-180,le=180),
+    k: int = Query(10,ge=1,le=1000),
+    format: str = Query("json",enum=list(SPATIAL_MEDIA)),
+    precision: Optional[int] = Query(None,ge=0,le=MAX_PRECISION,description=f"Decimales de la geometría (por defecto {DEFAULT_PRECISION}); explícita también redondea lat/lon en json"),
+    round_cols: Optional[str] = Query(None,alias="round",description="Columnas de atributos a redondear, ej: ised_*"),
+    latest: bool = Query(False,description="Una fila por sede (su reporte más reciente), no una por año"),
+    q: DataFilters = Depends(),
+):
+    try:
+        rounded,precision=_rounding(dataset_id,round_cols,precision)
+        body=await executor.submit(
+            ("nearest",dataset_id,lat,lon,k,format,precision,rounded,query_engine.query_key(q.filters,q.bbox,q.where,latest)),
+            lambda: query_engine.get_nearest(dataset_id,lat,lon,k,q.filters,q.bbox,q.where,latest),
+            partial(encode_data,dataset_id=dataset_id,format=format,precision=precision,rounded=rounded),
+        )
+        return Response(content=body,media_type=SPATIAL_MEDIA[format])
+
+    except FilterError as e:
+        raise HTTPException(status_code=400,detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404,detail=str(e))
+
+
+@router.get("/{dataset_id}/within")
+async def get_dataset_within(
+    dataset_id: str,
+    lat: float = Query(...,ge=-90,le=90),
+    lon: float = Query(...,ge=-180,le=180),
+    radius_km: float = Query(...,gt=0,le=2000),
+    limit: Optional[int] = Query(None,ge=1),
+    format: str = Query("json",enum=list(SPATIAL_MEDIA)),
+    precision: Optional[int] = Query(None,ge=0,le=MAX_PRECISION,description=f"Decimales de la geometría (por defecto {DEFAULT_PRECISION}); explícita también redondea lat/lon en json"),
+    round_cols: Optional[str] = Query(None,alias="round",description="Columnas de atributos a redondear, ej: ised_*"),
+    latest: bool = Query(False,description="Una fila por sede (su reporte más reciente), no una por año"),
+    q: DataFilters = Depends(),
+):
+    try:
+        rounded,precision=_rounding(dataset_id,round_cols,precision)
+        body=await executor.submit(
+            ("within",dataset_id,lat,lon,radius_km,limit,format,precision,rounded,query_engine.query_key(q.filters,q.bbox,q.where,latest)),
+            lambda: query_engine.get_within(dataset_id,lat,lon,radius_km,q.filters,q.bbox,q.where,limit,latest),
+            partial(encode_data,dataset_id=dataset_id,format=format,precision=precision,rounded=rounded),
+        )
+        return Response(content=body,media_type=SPATIAL_MEDIA[format])
+
+    except FilterError as e:
+        raise HTTPException(status_code=400,detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404,detail=str(e))
 
 
 # =====================================================================
 # 📌 CONSULTA AVANZADA CON FILTROS (GeoJSON directo)
 # =====================================================================
 @router.get("/sedes/connectividad")
-def sedes_conectividad(
+async def sedes_conectividad(
     conectado: str | None = None,
     tecnologia: str | None = None,
     min_mbps: float | None = None,
@@ -78,15 +327,24 @@ def sedes_conectividad(
     mpio: str | None = None,
     año: int | None = None
 ):
-    df = pd.DataFrame(query_engine.get_data("sena_ised", "json", filters={}, bbox=None))
-
-    if conectado:  df = df[df["conectividad_def"] == conectado]
-    if tecnologia: df = df[df["tecnologia_conec"].str.contains(tecnologia, case=False, na=False)]
-    if min_mbps: df = df[pd.to_numeric(df["anchodebandaconsolidadombps"].str.extract(r'(\d+)', expand=False),errors="coerce")>=min_mbps]
-    if min_equipos: df = df[pd.to_numeric(df["total_equipos"],errors="coerce")>=min_equipos]
-    if min_ratio_terminales: df = df[pd.to_numeric(df["estudiantes_terminales"],errors="coerce")>=min_ratio_terminales]
-    if dpto: df = df[df["dpto_ccdgo"].astype(str)==str(dpto)]
-    if mpio: df = df[df["mpio_cnmbr"].str.contains(mpio,case=False,na=False)]
-    if año: df = df[df["anno_inf"].astype(str)==str(año)]
-
-    return query_engine._df_to_geojson_optimized(df,"latitud","longitud")
+    # Se traduce a la misma expresión de filtros que /data/{dataset_id}
+    where={}
+    if conectado: where["conectividad_def"]=conectado
+    if tecnologia: where["tecnologia_conec"]={"contains":tecnologia}
+    if min_mbps: where["anchodebandaconsolidadombps"]={"gte":min_mbps}
+    if min_equipos: where["total_equipos"]={"gte":min_equipos}
+    if min_ratio_terminales: where["estudiantes_terminales"]={"gte":min_ratio_terminales}
+    if dpto: where["dpto_ccdgo"]=str(dpto)
+    if mpio: where["mpio_cnmbr"]={"contains":mpio}
+    if año: where["anno_inf"]=str(año)
+
+    where=json.dumps(where,sort_keys=True)
+    try:
+        body=await executor.submit(
+            data_key("sena_ised","geojson",None,DEFAULT_PRECISION,(),query_engine.query_key({},None,where)),
+            lambda: query_engine.select("sena_ised",{},where=where),
+            partial(encode_data,dataset_id="sena_ised",format="geojson",precision=DEFAULT_PRECISION),
+        )
+        return Response(content=body,media_type="application/json")
+    except FilterError as e:
+        raise HTTPException(status_code=400,detail=str(e))
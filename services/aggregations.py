@@ -0,0 +1,128 @@
+import re
+import numpy as np
+from typing import Any, Dict, List, Tuple
+
+from services.filters import FilterError
+from services.indexes import DatasetIndex
+
+# ============================================================================
+# AGREGACIONES POR GRUPO
+# ----------------------------------------------------------------------------
+# metrics=count,count(col),sum(col),mean(col),min(col),max(col)
+# Los grupos se arman con los códigos categóricos de los índices y cada
+# métrica es una reducción vectorizada (bincount / reduceat), sin groupby.
+# ============================================================================
+
+FUNCS = {"count", "sum", "mean", "min", "max"}
+_METRIC_RE = re.compile(r"^\s*(\w+)\s*(?:\(\s*([^()]+?)\s*\))?\s*$")
+
+
+def parse_metrics(spec: str) -> List[Tuple[str, str]]:
+    """'count,mean(ised_x)' -> [('count', None), ('mean', 'ised_x')]"""
+    metrics = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        match = _METRIC_RE.match(part)
+        if not match or match.group(1) not in FUNCS:
+            raise FilterError(f"Métrica inválida: '{part}'")
+        func, column = match.groups()
+        if func != "count" and not column:
+            raise FilterError(f"'{func}' requiere una columna, ej: {func}(ised_x)")
+        metrics.append((func, column))
+    if not metrics:
+        raise FilterError("Se requiere al menos una métrica")
+    return metrics
+
+
+def metric_name(func: str, column: str) -> str:
+    return f"{func}({column})" if column else func
+
+
+def group_codes(index: DatasetIndex, group_by: List[str], positions: np.ndarray):
+    """
+    Combina los códigos de varias columnas en un id de grupo denso.
+    Retorna (ids por fila, códigos por grupo [n_grupos x n_columnas]).
+    Los nulos (-1) forman su propio grupo.
+    """
+    key = np.zeros(len(positions), dtype=np.int64)
+    for col in group_by:
+        col_index = index.column(col)
+        key = key * (len(col_index.categories) + 1) + (col_index.codes[positions] + 1)
+
+    uniq, ids = np.unique(key, return_inverse=True)
+
+    # Decodificar cada clave única a los códigos de cada columna
+    codes = np.empty((len(uniq), len(group_by)), dtype=np.int64)
+    rest = uniq.copy()
+    for j in range(len(group_by) - 1, -1, -1):
+        base = len(index.column(group_by[j]).categories) + 1
+        codes[:, j] = rest % base - 1
+        rest //= base
+    return ids, codes
+
+
+def reduce_groups(values: np.ndarray, ids: np.ndarray, n_groups: int, func: str) -> np.ndarray:
+    """Reducción vectorizada de `values` por grupo, ignorando NaN"""
+    valid = ~np.isnan(values)
+    v, g = values[valid], ids[valid]
+    counts = np.bincount(g, minlength=n_groups)
+
+    if func == "count":
+        return counts.astype(np.float64)
+    if func in ("sum", "mean"):
+        sums = np.bincount(g, weights=v, minlength=n_groups)
+        if func == "sum":
+            return sums
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    # min / max: ordenar por grupo y reducir por tramos
+    out = np.full(n_groups, np.nan)
+    if len(v) == 0:
+        return out
+    order = np.argsort(g, kind="stable")
+    g_sorted, v_sorted = g[order], v[order]
+    starts = np.flatnonzero(np.r_[True, g_sorted[1:] != g_sorted[:-1]])
+    reducer = np.minimum if func == "min" else np.maximum
+    out[g_sorted[starts]] = reducer.reduceat(v_sorted, starts)
+    return out
+
+
+def aggregate(index: DatasetIndex, positions: np.ndarray, group_by: List[str],
+              metrics: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    for col in group_by + [c for _, c in metrics if c]:
+        if not index.has_column(col):
+            raise FilterError(f"Columna '{col}' no existe")
+
+    ids, codes = group_codes(index, group_by, positions)
+    n_groups = len(codes)
+
+    results: Dict[str, np.ndarray] = {}
+    for func, column in metrics:
+        if column is None:
+            results[metric_name(func, column)] = np.bincount(ids, minlength=n_groups).astype(np.float64)
+        else:
+            values = index.column(column).numeric[positions]
+            results[metric_name(func, column)] = reduce_groups(values, ids, n_groups, func)
+
+    return format_groups(index, group_by, codes, results)
+
+
+def format_groups(index: DatasetIndex, group_by: List[str], codes: np.ndarray,
+                  results: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """Filas de respuesta: etiqueta de cada columna de grupo + valor de cada métrica"""
+    n_groups = len(codes)
+    labels = [index.column(col).labels for col in group_by]
+    rows = []
+    for g in range(n_groups):
+        row = {
+            col: (labels[j][codes[g, j]] if codes[g, j] >= 0 else None)
+            for j, col in enumerate(group_by)
+        }
+        for name, values in results.items():
+            value = values[g]
+            if name.startswith("count"):
+                row[name] = int(value)
+            else:
+                row[name] = None if np.isnan(value) else float(value)
+        rows.append(row)
+    return rows
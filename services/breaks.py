@@ -0,0 +1,76 @@
+import numpy as np
+from typing import List, Optional
+
+from services.indexes import ColumnIndex
+
+# Máximo de valores sobre los que corre Jenks (muestra por cuantiles del arreglo ordenado)
+JENKS_SAMPLE = 1000
+
+
+def subset_sorted(col: ColumnIndex, positions: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Valores numéricos ya ordenados de las filas seleccionadas.
+    Se filtra el arreglo presorteado (O(n)) en vez de volver a ordenar.
+    """
+    if positions is None or len(positions) == col.size:
+        return col.sorted_values
+    selected = np.zeros(col.size, dtype=bool)
+    selected[positions] = True
+    return col.sorted_values[selected[col.order]]
+
+
+def quantile_breaks(values: np.ndarray, bins: int) -> List[float]:
+    """Cuantiles sobre un arreglo ordenado: simples lecturas por posición (interpolación lineal)"""
+    idx = np.linspace(0, 1, bins + 1) * (len(values) - 1)
+    lo = np.floor(idx).astype(np.int64)
+    hi = np.ceil(idx).astype(np.int64)
+    return (values[lo] + (values[hi] - values[lo]) * (idx - lo)).tolist()
+
+
+def equal_interval_breaks(values: np.ndarray, bins: int) -> List[float]:
+    return np.linspace(values[0], values[-1], bins + 1).tolist()
+
+
+def jenks_breaks(values: np.ndarray, bins: int, sample: int = JENKS_SAMPLE) -> List[float]:
+    """
+    Cortes naturales de Jenks (Fisher) por programación dinámica.
+    Sobre arreglos grandes se usa una muestra de `sample` cuantiles, que
+    conserva la forma de la distribución. Retorna [min, límite superior de cada clase].
+    """
+    if len(values) > sample:
+        values = values[np.linspace(0, len(values) - 1, sample).astype(np.int64)]
+    uniq = np.unique(values)
+    if len(uniq) <= bins:
+        # Cada valor distinto es un límite; uniq ya empieza en el mínimo
+        return uniq.tolist()
+
+    n = len(values)
+    s1 = np.concatenate([[0.0], np.cumsum(values)])
+    s2 = np.concatenate([[0.0], np.cumsum(values ** 2)])
+
+    # ssd[a, b]: suma de desviaciones cuadradas de values[a..b] (inclusive)
+    a = np.arange(n)[:, None]
+    b = np.arange(n)[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        count = (b - a + 1).astype(np.float64)
+        ssd = (s2[b + 1] - s2[a]) - (s1[b + 1] - s1[a]) ** 2 / count
+    ssd[a > b] = np.inf
+
+    cost = ssd[0].copy()
+    starts = []
+    for _ in range(1, bins):
+        # candidato: la última clase empieza en `a`, el resto termina en a-1
+        prev = np.concatenate([[np.inf], cost[:-1]])
+        total = prev[:, None] + ssd
+        best = np.argmin(total, axis=0)
+        cost = total[best, np.arange(n)]
+        starts.append(best)
+
+    # Reconstruir los límites desde el final
+    upper = [float(values[-1])]
+    end = n - 1
+    for best in reversed(starts):
+        start = int(best[end])
+        upper.append(float(values[start - 1]))
+        end = start - 1
+    return [float(values[0])] + upper[::-1]
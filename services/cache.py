@@ -0,0 +1,43 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from services.metrics import record_cache
+
+
+class LRUCache:
+    """
+    Cache LRU acotada y segura entre hilos para resultados de consultas.
+    Las claves son tuplas cuyo primer elemento es el dataset, así se puede
+    invalidar todo lo de un dataset cuando se recarga.
+    """
+
+    def __init__(self, name: str, maxsize: int = 256):
+        self.name = name
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            hit = key in self._data
+            if hit:
+                self._data.move_to_end(key)
+                value = self._data[key]
+        record_cache(self.name, hit)
+        return value if hit else default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, dataset: str) -> None:
+        with self._lock:
+            for key in [k for k in self._data if k[0] == dataset]:
+                del self._data[key]
+
+    def __len__(self) -> int:
+        return len(self._data)
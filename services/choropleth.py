@@ -0,0 +1,104 @@
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, List
+
+from services.serialization import dumps
+
+# ============================================================================
+# CAPAS ADMINISTRATIVAS (MGN DANE) — mismas fuentes que etl/pipeline.py
+# ============================================================================
+ADMIN_LAYERS = {
+    "departamento": {
+        "file": "database/datos/MGN_DPTO_POLITICO/MGN_ADM_DPTO_POLITICO.shp",
+        "key": "DPTO_CCDGO",
+        "name": "DPTO_CNMBR",
+        "width": 2,
+    },
+    "municipio": {
+        "file": "database/datos/MGN_MPIO_POLITICO/MGN_MPIO_POLITICO.shp",
+        "key": "MPIO_CDPMP",
+        "name": "MPIO_CNMBR",
+        "width": 5,
+    },
+}
+
+# Tolerancia de simplificación (grados) por rango de zoom: (zoom máximo, tolerancia)
+ZOOM_TOLERANCES = [(4, 0.05), (6, 0.02), (8, 0.005), (99, 0.001)]
+
+
+def zoom_bucket(zoom: float) -> int:
+    """Índice del nivel de simplificación que corresponde a un zoom"""
+    for i, (max_zoom, _) in enumerate(ZOOM_TOLERANCES):
+        if zoom <= max_zoom:
+            return i
+    return len(ZOOM_TOLERANCES) - 1
+
+
+def normalize_code(value: Any, width: int):
+    """Código DANE como texto con ceros a la izquierda (5 -> '05', 5001.0 -> '05001')"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        value = int(value)
+    return str(value).strip().zfill(width)
+
+
+class AdminLayer:
+    """
+    Polígonos de una división administrativa con la geometría ya simplificada
+    para cada nivel de zoom y serializada a bytes GeoJSON. Por petición solo
+    se serializan las propiedades (indicadores agregados).
+    """
+
+    def __init__(self, level: str):
+        config = ADMIN_LAYERS[level]
+        self.level = level
+        self.width = config["width"]
+
+        # geopandas solo se importa si alguien pide polígonos
+        import geopandas as gpd
+        import shapely
+
+        file_path = Path(config["file"])
+        if not file_path.exists():
+            raise ValueError(f"No se encontró la capa '{level}': {file_path}")
+
+        gdf = gpd.read_file(file_path)
+        geom_col = gdf.geometry.name
+        gdf.columns = [c.upper() if c != geom_col else c for c in gdf.columns]
+        if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+            gdf = gdf.to_crs(epsg=4326)
+
+        self.codes: List[str] = [normalize_code(c, self.width) for c in gdf[config["key"]]]
+        self.names: List[str] = gdf[config["name"]].astype(str).tolist()
+
+        # Geometría pre-codificada por nivel de zoom
+        self.geometries: List[List[bytes]] = []
+        for _, tolerance in ZOOM_TOLERANCES:
+            simplified = shapely.simplify(gdf.geometry.values, tolerance, preserve_topology=True)
+            self.geometries.append([g.encode() for g in shapely.to_geojson(simplified)])
+
+    def to_geojson(self, zoom: float, attributes: Dict[str, Dict[str, Any]], empty: Dict[str, Any]) -> bytes:
+        geoms = self.geometries[zoom_bucket(zoom)]
+        parts = []
+        for code, name, geom in zip(self.codes, self.names, geoms):
+            props = {"codigo": code, "nombre": name, **attributes.get(code, empty)}
+            parts.append(
+                b'{"type":"Feature","geometry":' + geom +
+                b',"properties":' + dumps(props) + b"}"
+            )
+        return b'{"type":"FeatureCollection","features":[' + b",".join(parts) + b"]}"
+
+
+_layers: Dict[str, AdminLayer] = {}
+_lock = threading.Lock()
+
+
+def get_admin_layer(level: str) -> AdminLayer:
+    if level not in ADMIN_LAYERS:
+        raise ValueError(f"Nivel administrativo desconocido: {level}")
+    with _lock:
+        if level not in _layers:
+            _layers[level] = AdminLayer(level)
+        return _layers[level]
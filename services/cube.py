@@ -0,0 +1,263 @@
+import copy
+import fnmatch
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.aggregations import format_groups, group_codes, metric_name, reduce_groups
+from services.filters import Predicate
+from services.indexes import ColumnIndex, DatasetIndex, numeric_values
+
+# ============================================================================
+# CUBO DE RESUMEN
+# ----------------------------------------------------------------------------
+# Una celda por combinación presente de las dimensiones (año × zona × depto ×
+# municipio...) con el conteo de filas y, por indicador, n / suma / mín / máx.
+# /aggregate y las leyendas categóricas filtran y agrupan celdas (miles) en vez
+# de filas (cientos de miles). Se arma por bloques del valor de la primera
+# dimensión; al recargar solo se recalculan los bloques cuyo contenido cambió.
+# ============================================================================
+
+
+class _Block:
+    """Celdas de un valor de la primera dimensión (etiquetas como texto, estables entre recargas)"""
+
+    def __init__(self, fingerprint: Tuple[int, int], texts: np.ndarray, count: np.ndarray,
+                 stats: Dict[str, Dict[str, np.ndarray]]):
+        self.fingerprint = fingerprint
+        self.texts = texts
+        self.count = count
+        self.stats = stats
+
+
+class _CellColumn:
+    """Una dimensión vista sobre las celdas: la interfaz de ColumnIndex que usa Predicate"""
+
+    def __init__(self, column: ColumnIndex, codes: np.ndarray):
+        self.column = column
+        self.codes = codes
+        self.size = len(codes)
+        self.is_numeric = column.is_numeric
+        self._numeric: Optional[np.ndarray] = None
+
+    def codes_for(self, values: List[str]) -> np.ndarray:
+        return self.column.codes_for(values)
+
+    def codes_containing(self, text: str) -> np.ndarray:
+        return self.column.codes_containing(text)
+
+    @property
+    def numeric(self) -> np.ndarray:
+        if self._numeric is None:
+            # Valor numérico de cada categoría = el de su primera fila
+            valid = np.flatnonzero(self.column.codes >= 0)
+            _, first = np.unique(self.column.codes[valid], return_index=True)
+            per_code = np.append(self.column.numeric[valid[first]], np.nan)
+            self._numeric = per_code[self.codes]  # código -1 → NaN del final
+        return self._numeric
+
+
+class _CellIndex:
+    """Las celdas del cubo con la interfaz de DatasetIndex (para Predicate.refine)"""
+
+    def __init__(self, columns: Dict[str, _CellColumn]):
+        self._columns = columns
+
+    def column(self, name: str) -> _CellColumn:
+        return self._columns[name]
+
+
+class SummaryCube:
+    def __init__(self, dimensions: List[str], measures: List[str]):
+        self.configured = dimensions
+        self.dimensions = list(dimensions)
+        self.patterns = measures     # nombres o comodines ("ised_*")
+        self.measures: List[str] = []
+        self._blocks: Dict[Optional[str], _Block] = {}
+        self.rebuilt = self.reused = 0
+        # Vista combinada (se rearma en cada update)
+        self._index: Optional[DatasetIndex] = None
+        self._codes = np.empty((0, len(dimensions)), dtype=np.int64)
+        self._count = np.zeros(0, dtype=np.int64)
+        self._stats: Dict[str, Dict[str, np.ndarray]] = {}
+        self._view: Optional[_CellIndex] = None
+
+    @property
+    def size(self) -> int:
+        return len(self._count)
+
+    # ------------------------------------------------------------------
+    # Construcción (al cargar / recargar el dataset)
+    # ------------------------------------------------------------------
+    def update(self, index: DatasetIndex) -> None:
+        """Recalcula solo los bloques cuyo contenido cambió respecto a la carga anterior"""
+        df = index.df
+        dimensions = [d for d in self.configured if index.has_column(d)]
+        measures = [c for c in df.columns if any(fnmatch.fnmatchcase(c, p) for p in self.patterns)]
+        if dimensions != self.dimensions or measures != self.measures:
+            # Otras columnas: los bloques anteriores ya no sirven
+            self._blocks = {}
+            self.dimensions, self.measures = dimensions, measures
+        if not dimensions:
+            self._index = None
+            return
+        values = {m: numeric_values(df[m]) for m in self.measures}
+
+        # Huella de cada bloque: filas + suma de hashes de sus valores (independiente del orden)
+        first = index.column(self.dimensions[0])
+        hashes = self._row_hashes(index, values)
+        order = np.argsort(first.codes, kind="stable")
+        codes = first.codes[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.zeros(0, int)
+        sums = np.add.reduceat(hashes[order], starts) if len(codes) else np.zeros(0, np.uint64)
+        bounds = np.r_[starts, len(codes)]
+
+        blocks: Dict[Optional[str], _Block] = {}
+        self.rebuilt = self.reused = 0
+        for i, start in enumerate(starts):
+            code = codes[start]
+            key = first.categories[code] if code >= 0 else None
+            rows = np.sort(order[start:bounds[i + 1]])
+            fingerprint = (len(rows), int(sums[i]))
+            old = self._blocks.get(key)
+            if old is not None and old.fingerprint == fingerprint:
+                blocks[key] = old
+                self.reused += 1
+            else:
+                blocks[key] = self._build_block(index, rows, values, fingerprint)
+                self.rebuilt += 1
+        self._blocks = blocks
+        self._combine(index)
+
+    def updated(self, index: DatasetIndex) -> "SummaryCube":
+        """Copia actualizada con `index`; esta no cambia (update reasigna, no muta sus arrays)"""
+        cube = copy.copy(self)
+        cube.update(index)
+        return cube
+
+    def _row_hashes(self, index: DatasetIndex, values: Dict[str, np.ndarray]) -> np.ndarray:
+        """Hash por fila de dimensiones (hash de cada categoría, no de cada fila) e indicadores"""
+        hashes = np.zeros(index.size, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for dim in self.dimensions:
+                column = index.column(dim)
+                per_code = pd.util.hash_array(np.append(column.categories, None).astype(object))
+                hashes = hashes * np.uint64(1_000_003) + per_code[column.codes]  # -1 → hash de None
+            for m in self.measures:
+                hashes = hashes * np.uint64(1_000_003) + pd.util.hash_array(values[m])
+        return hashes
+
+    def _build_block(self, index: DatasetIndex, rows: np.ndarray, values: Dict[str, np.ndarray],
+                     fingerprint: Tuple[int, int]) -> _Block:
+        ids, codes = group_codes(index, self.dimensions, rows)
+        n_cells = len(codes)
+        texts = np.empty(codes.shape, dtype=object)
+        for j, dim in enumerate(self.dimensions):
+            categories = np.append(index.column(dim).categories, None)
+            texts[:, j] = categories[codes[:, j]]  # código -1 → None del final
+        # Un solo orden por celda para todos los indicadores; fmin/fmax ignoran NaN
+        order = np.argsort(ids, kind="stable")
+        starts = np.flatnonzero(np.r_[True, ids[order][1:] != ids[order][:-1]]) if len(ids) else ids
+        stats = {}
+        for m in self.measures:
+            v = values[m][rows]
+            valid = ~np.isnan(v)
+            stats[m] = {
+                "count": np.bincount(ids[valid], minlength=n_cells).astype(np.float64),
+                "sum": np.bincount(ids[valid], weights=v[valid], minlength=n_cells),
+                "min": np.fmin.reduceat(v[order], starts) if len(ids) else np.zeros(0),
+                "max": np.fmax.reduceat(v[order], starts) if len(ids) else np.zeros(0),
+            }
+        return _Block(fingerprint, texts, np.bincount(ids, minlength=n_cells), stats)
+
+    def _combine(self, index: DatasetIndex) -> None:
+        """Une los bloques y traduce sus etiquetas a los códigos del índice actual"""
+        blocks = list(self._blocks.values())
+        texts = np.concatenate([b.texts for b in blocks]) if blocks else np.empty((0, len(self.dimensions)), object)
+        self._codes = np.empty(texts.shape, dtype=np.int64)
+        for j, dim in enumerate(self.dimensions):
+            lookup = {c: i for i, c in enumerate(index.column(dim).categories)}
+            self._codes[:, j] = [lookup.get(t, -1) if t is not None else -1 for t in texts[:, j]]
+        self._count = np.concatenate([b.count for b in blocks]) if blocks else np.zeros(0, np.int64)
+        self._stats = {
+            m: {func: np.concatenate([b.stats[m][func] for b in blocks]) if blocks else np.zeros(0)
+                for func in ("count", "sum", "min", "max")}
+            for m in self.measures
+        }
+        self._index = index
+        self._view = _CellIndex({
+            dim: _CellColumn(index.column(dim), self._codes[:, j])
+            for j, dim in enumerate(self.dimensions)
+        })
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def answers(self, predicates: List[Predicate], group_by: List[str],
+                metrics: List[Tuple[str, Optional[str]]]) -> bool:
+        """¿La consulta se resuelve solo con dimensiones e indicadores del cubo?"""
+        dims = set(self.dimensions)
+        return (
+            self._index is not None
+            and all(p.column in dims for p in predicates)
+            and all(col in dims for col in group_by)
+            and all(col is None or col in self._stats for _, col in metrics)
+        )
+
+    def _cells(self, predicates: List[Predicate]) -> np.ndarray:
+        cells = np.arange(self.size)
+        for predicate in predicates:
+            if len(cells) == 0:
+                break
+            cells = predicate.refine(self._view, cells)
+        return cells
+
+    def aggregate(self, predicates: List[Predicate], group_by: List[str],
+                  metrics: List[Tuple[str, Optional[str]]]) -> Tuple[int, List[Dict[str, Any]]]:
+        """(filas que cumplen los filtros, grupos) con el mismo formato que aggregations.aggregate"""
+        cells = self._cells(predicates)
+        weights = self._count[cells]
+
+        # Id de grupo sobre las celdas, con la misma codificación que group_codes
+        key = np.zeros(len(cells), dtype=np.int64)
+        bases = [len(self._index.column(col).categories) + 1 for col in group_by]
+        for col, base in zip(group_by, bases):
+            key = key * base + (self._codes[cells, self.dimensions.index(col)] + 1)
+        uniq, ids = np.unique(key, return_inverse=True)
+        codes = np.empty((len(uniq), len(group_by)), dtype=np.int64)
+        rest = uniq.copy()
+        for j in range(len(group_by) - 1, -1, -1):
+            codes[:, j] = rest % bases[j] - 1
+            rest //= bases[j]
+        n_groups = len(uniq)
+
+        def total(values: np.ndarray) -> np.ndarray:
+            return np.bincount(ids, weights=values, minlength=n_groups)
+
+        results: Dict[str, np.ndarray] = {}
+        for func, column in metrics:
+            name = metric_name(func, column)
+            if column is None:
+                results[name] = total(weights)
+                continue
+            stats = {k: v[cells] for k, v in self._stats[column].items()}
+            if func in ("min", "max"):
+                results[name] = reduce_groups(stats[func], ids, n_groups, func)
+            elif func == "count":
+                results[name] = total(stats["count"])
+            else:
+                sums = total(stats["sum"])
+                if func == "mean":
+                    counts = total(stats["count"])
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        sums = np.where(counts > 0, sums / counts, np.nan)
+                results[name] = sums
+        return int(weights.sum()), format_groups(self._index, group_by, codes, results)
+
+    def counts(self, predicates: List[Predicate], column: str) -> np.ndarray:
+        """Filas por categoría de `column` (en códigos del índice) entre las celdas filtradas"""
+        cells = self._cells(predicates)
+        codes = self._codes[cells, self.dimensions.index(column)]
+        valid = codes >= 0
+        size = len(self._index.column(column).categories)
+        return np.bincount(codes[valid], weights=self._count[cells][valid], minlength=size).astype(np.int64)
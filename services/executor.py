@@ -0,0 +1,174 @@
+import asyncio
+import multiprocessing
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from core.settings import settings
+from services.metrics import (EXECUTOR_EVENTS, EXECUTOR_STATE, RequestTrace, call_profiled, current_trace,
+                              span, use_trace)
+
+
+class Overloaded(Exception):
+    """El servidor no admite más consultas en este momento (→ 503)"""
+
+
+class QueryExecutor:
+    """
+    Capa de ejecución alrededor de QueryEngine para los handlers async:
+
+    - Control de admisión: como máximo `max_concurrency` consultas corriendo y
+      `queue_size` esperando; si la cola está llena o la espera supera
+      `queue_timeout` se rechaza con Overloaded.
+    - Coalescencia: peticiones idénticas en vuelo comparten un único cómputo.
+    - El cómputo (filtros/índices) corre en el threadpool; la serialización
+      puede ir a un pool de procesos para no competir por el GIL.
+    """
+
+    def __init__(self, max_concurrency: int, queue_size: int, queue_timeout: float, process_workers: int = 0):
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.process_workers = process_workers
+
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._running = 0
+        # clave → (tarea, traza del cómputo compartido)
+        self._inflight: Dict[Hashable, Tuple[asyncio.Task, RequestTrace]] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> Optional[ProcessPoolExecutor]:
+        if self._pool is None and self.process_workers > 0:
+            # spawn: no se hace fork de un proceso con hilos (threadpool de Starlette)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    async def submit(self, key: Hashable, compute: Callable[[], Any],
+                     encode: Optional[Callable[[Any], Any]] = None) -> Any:
+        """
+        Ejecuta `compute()` (y luego `encode(resultado)`) respetando la
+        admisión. `encode` debe ser picklable si hay pool de procesos.
+        """
+        trace = current_trace()
+        entry = self._inflight.get(key)
+        leader = entry is None
+        if leader:
+            # El cómputo mide en su propia traza; cada petición que lo espera la suma a la suya
+            shared = RequestTrace(profile=trace is not None and trace.profile)
+            task = asyncio.ensure_future(self._run(compute, encode, shared))
+            self._inflight[key] = (task, shared)
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            task, shared = entry
+            EXECUTOR_EVENTS.inc("coalesced")
+        try:
+            # shield: si un cliente se desconecta no se cancela el cómputo compartido
+            return await asyncio.shield(task)
+        finally:
+            if trace is not None and task.done():
+                trace.merge(shared, profile=leader)
+
+    async def _run(self, compute: Callable[[], Any], encode: Optional[Callable[[Any], Any]],
+                   trace: RequestTrace) -> Any:
+        use_trace(trace)
+        with span("queue"):
+            await self._admit()
+        self._running += 1
+        self._report_state()
+        try:
+            result = await run_in_threadpool(call_profiled, compute)
+            if encode is None:
+                return result
+            with span("encode"):
+                if self.pool is not None:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(self.pool, encode, result)
+                return await run_in_threadpool(call_profiled, encode, result)
+        finally:
+            self._release()
+
+    async def stream(self, compute: Callable[[], Iterator[bytes]]) -> AsyncIterator[bytes]:
+        """
+        Para respuestas en streaming (fgb, modo por lotes): misma admisión que
+        submit, `compute()` prepara el iterador en el threadpool y el cupo se
+        mantiene hasta terminar de enviar el cuerpo (sin coalescencia).
+        """
+        with span("queue"):
+            await self._admit()
+        self._running += 1
+        self._report_state()
+        try:
+            chunks = await run_in_threadpool(call_profiled, compute)
+        except BaseException:
+            self._release()
+            raise
+        # El finalizador puede correr en otro hilo (GC): la liberación vuelve al event loop
+        loop = asyncio.get_running_loop()
+        release = _Once(lambda: loop.call_soon_threadsafe(self._release))
+        body = self._drain(chunks, release)
+        # Si la respuesta nunca llega a iterarse (cliente desconectado), el cupo se libera igual
+        weakref.finalize(body, release)
+        return body
+
+    async def _drain(self, chunks: Iterator[bytes], release: "_Once") -> AsyncIterator[bytes]:
+        try:
+            async for chunk in iterate_in_threadpool(chunks):
+                yield chunk
+        finally:
+            release()
+
+    def _release(self) -> None:
+        self._slots.release()
+        self._running -= 1
+        self._report_state()
+
+    async def _admit(self) -> None:
+        if self._slots.locked() and self._waiting >= self.queue_size:
+            EXECUTOR_EVENTS.inc("shed")
+            raise Overloaded("Demasiadas consultas en cola")
+        self._waiting += 1
+        self._report_state()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            EXECUTOR_EVENTS.inc("timeout")
+            raise Overloaded(f"Consulta en cola más de {self.queue_timeout:.0f}s")
+        finally:
+            self._waiting -= 1
+
+    def _report_state(self) -> None:
+        EXECUTOR_STATE.set("running", value=self._running)
+        EXECUTOR_STATE.set("waiting", value=self._waiting)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+class _Once:
+    """Callback que solo corre la primera vez (el cupo de un stream se libera una sola vez)"""
+
+    def __init__(self, fn: Callable[[], None]):
+        self._fn = fn
+
+    def __call__(self) -> None:
+        fn, self._fn = self._fn, None
+        if fn is not None:
+            fn()
+
+
+# Singleton
+executor = QueryExecutor(
+    max_concurrency=settings.QUERY_MAX_CONCURRENCY,
+    queue_size=settings.QUERY_QUEUE_SIZE,
+    queue_timeout=settings.QUERY_QUEUE_TIMEOUT,
+    process_workers=settings.QUERY_PROCESS_WORKERS,
+)
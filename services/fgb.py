@@ -0,0 +1,363 @@
+"""
+Escritor de FlatGeobuf (https://flatgeobuf.org) para capas de puntos.
+
+Se arma directamente desde los arreglos de coordenadas y columnas, sin
+geopandas/GDAL: el header es un flatbuffer pequeño construido a mano y cada
+feature sigue una plantilla fija (geometría Point + vector de propiedades)
+en la que solo cambian x/y y los bytes de propiedades. Las propiedades se
+escriben columna por columna con operaciones vectorizadas de numpy.
+
+Con `spatial_index=True` las features se ordenan por curva de Hilbert y se
+antepone un R-tree empaquetado (nodos de 16) para lecturas por bbox.
+`iter_fgb_batches` escribe lotes sucesivos sin índice (modo out-of-core).
+"""
+import struct
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from services.hilbert import hilbert_codes
+
+MAGIC = b"fgb\x03fgb\x01"
+NODE_SIZE = 16
+CHUNK_ROWS = 16384
+
+# GeometryType / ColumnType del esquema de FlatGeobuf
+POINT = 1
+COL_BOOL, COL_INT, COL_LONG, COL_FLOAT, COL_DOUBLE, COL_STRING = 2, 5, 7, 9, 10, 11
+
+NODE_DTYPE = np.dtype([("min_x", "<f8"), ("min_y", "<f8"), ("max_x", "<f8"), ("max_y", "<f8"), ("offset", "<u8")])
+
+# ----------------------------------------------------------------------------
+# Plantilla de una feature (posiciones desde el prefijo de tamaño):
+#   0  tamaño (uint32)           4  raíz → tabla Feature
+#   8  vtable Feature           16  tabla Feature (geometry, properties)
+#  28  vtable Geometry          36  tabla Geometry (xy)
+#  44  largo de xy (=2)         48  x, y (float64, alineados a 8)
+#  64  largo de properties      68  bytes de propiedades
+# ----------------------------------------------------------------------------
+FEATURE_FIXED = 68
+# Bytes 4..48: offsets, vtables y tablas, iguales en todas las features
+_FEATURE_HEAD = struct.pack(
+    "<I HHHH iII HHHH iI I",
+    12,
+    8, 12, 4, 8,
+    8, 16, 40,
+    8, 8, 0, 4,
+    8, 4,
+    2,
+)
+_FEATURE_DTYPE = np.dtype([("size", "<u4"), ("head", "V44"), ("x", "<f8"), ("y", "<f8"), ("n", "<u4")])
+
+
+# ============================================================================
+# FLATBUFFERS MÍNIMO (solo para el header)
+# ============================================================================
+class _Table:
+    """Campos: lista de (slot, formato struct | 'str' | 'table' | 'vec:<fmt>' | 'tables', valor)"""
+
+    def __init__(self, *fields):
+        self.fields = [f for f in fields if f[2] is not None]
+
+
+class _Builder:
+    """Escribe de adelante hacia atrás: tabla primero, hijos después (offsets positivos)"""
+
+    def __init__(self):
+        self.buf = bytearray(8)  # prefijo de tamaño + offset a la raíz
+
+    def _align(self, n: int, extra: int = 0):
+        while (len(self.buf) + extra) % n:
+            self.buf.append(0)
+
+    def finish(self, root: _Table) -> bytes:
+        pos = self.table(root)
+        struct.pack_into("<I", self.buf, 4, pos - 4)
+        self._align(8)
+        struct.pack_into("<I", self.buf, 0, len(self.buf) - 4)
+        return bytes(self.buf)
+
+    def table(self, table: _Table) -> int:
+        # Campos escalares ordenados por tamaño (de mayor a menor) para alinearlos
+        inline = []
+        for slot, kind, value in table.fields:
+            fmt = kind if kind in ("B", "?", "H", "i", "Q") else "I"
+            inline.append((struct.calcsize("<" + fmt), slot, fmt, kind, value))
+        inline.sort(key=lambda f: -f[0])
+
+        n_slots = max((f[1] for f in inline), default=-1) + 1
+        layout, size = {}, 4
+        for width, slot, *_ in inline:
+            layout[slot] = size
+            size += width
+
+        self._align(2)
+        vtable_pos = len(self.buf)
+        vtable = [4 + 2 * n_slots, size] + [layout.get(s, 0) for s in range(n_slots)]
+        self.buf += struct.pack(f"<{len(vtable)}H", *vtable)
+        self._align(max([4] + [f[0] for f in inline]))
+        table_pos = len(self.buf)
+        self.buf += struct.pack("<i", table_pos - vtable_pos) + bytes(size - 4)
+
+        pending = []
+        for width, slot, fmt, kind, value in inline:
+            at = table_pos + layout[slot]
+            if fmt == "I":
+                pending.append((at, kind, value))
+            else:
+                struct.pack_into("<" + fmt, self.buf, at, value)
+        for at, kind, value in pending:
+            struct.pack_into("<I", self.buf, at, self._child(kind, value) - at)
+        return table_pos
+
+    def _child(self, kind: str, value) -> int:
+        if kind == "str":
+            data = value.encode("utf-8")
+            self._align(4)
+            pos = len(self.buf)
+            self.buf += struct.pack("<I", len(data)) + data + b"\0"
+            return pos
+        if kind == "table":
+            return self.table(value)
+        if kind.startswith("vec:"):
+            fmt = kind[4:]
+            self._align(max(4, struct.calcsize(fmt)), 4)
+            pos = len(self.buf)
+            self.buf += struct.pack(f"<I{len(value)}{fmt}", len(value), *value)
+            return pos
+        # Vector de tablas: offsets primero, tablas después
+        self._align(4)
+        pos = len(self.buf)
+        self.buf += struct.pack("<I", len(value)) + bytes(4 * len(value))
+        for i, item in enumerate(value):
+            at = pos + 4 + 4 * i
+            struct.pack_into("<I", self.buf, at, self.table(item) - at)
+        return pos
+
+
+def _header(name: str, columns: List[Tuple[str, int]], count: int,
+            envelope: Optional[List[float]], node_size: int) -> bytes:
+    return _Builder().finish(_Table(
+        (0, "str", name),
+        (1, "vec:d", envelope),
+        (2, "B", POINT),
+        (7, "tables", [_Table((0, "str", col), (1, "B", kind)) for col, kind in columns]),
+        (8, "Q", count),
+        (9, "H", node_size),
+        (10, "table", _Table((0, "str", "EPSG"), (1, "i", 4326))),
+    ))
+
+
+# ============================================================================
+# COLUMNAS → BYTES DE PROPIEDADES
+# ============================================================================
+class _Column:
+    """Una columna ya convertida: tipo FlatGeobuf, nulos y valores (o UTF-8 + offsets)"""
+
+    def __init__(self, series: pd.Series):
+        dtype = series.dtype
+        self.valid = series.notna().to_numpy()
+        if pd.api.types.is_bool_dtype(dtype):
+            self.kind, self.values = COL_BOOL, series.fillna(False).to_numpy(dtype="<u1")
+        elif pd.api.types.is_integer_dtype(dtype):
+            self.kind, self.values = COL_LONG, series.fillna(0).to_numpy(dtype="<i8")
+        elif pd.api.types.is_float_dtype(dtype):
+            wide = dtype == np.float64 or str(dtype) == "Float64"
+            self.kind = COL_DOUBLE if wide else COL_FLOAT
+            self.values = series.to_numpy(dtype="<f8" if wide else "<f4", na_value=0)
+        else:
+            self.kind = COL_STRING
+            text = _utf8(series, self.valid)
+            buffers = text.buffers()
+            self.offsets = np.frombuffer(buffers[1], dtype=np.int64)[text.offset:text.offset + len(text) + 1]
+            self.data = np.frombuffer(buffers[2], dtype=np.uint8) if buffers[2] is not None else np.zeros(0, np.uint8)
+
+        # Bytes que ocupa cada valor dentro de properties (0 si es nulo)
+        if self.kind == COL_STRING:
+            size = 6 + np.diff(self.offsets)
+        else:
+            size = np.full(len(self.valid), 2 + self.values.itemsize, dtype=np.int64)
+        self.lengths = np.where(self.valid, size, 0)
+
+    def write(self, out: np.ndarray, index: int, rows: np.ndarray, at: np.ndarray) -> None:
+        """Escribe los valores de `rows` en `out` a partir de las posiciones `at`"""
+        keep = self.valid[rows]
+        rows, at = rows[keep], at[keep]
+        if not len(rows):
+            return
+        if self.kind != COL_STRING:
+            record = np.empty(len(rows), dtype=[("i", "<u2"), ("v", self.values.dtype)])
+            record["i"], record["v"] = index, self.values[rows]
+            _scatter(out, at, record)
+            return
+
+        start, stop = self.offsets[rows], self.offsets[rows + 1]
+        size = stop - start
+        record = np.empty(len(rows), dtype=[("i", "<u2"), ("n", "<u4")])
+        record["i"], record["n"] = index, size
+        _scatter(out, at, record)
+        # Copia de los bytes UTF-8: un solo gather/scatter para todas las filas
+        total = int(size.sum())
+        if total:
+            first = np.repeat(np.cumsum(size) - size, size)
+            step = np.arange(total) - first
+            out[np.repeat(at + 6, size) + step] = self.data[np.repeat(start, size) + step]
+
+
+def _utf8(series: pd.Series, valid: np.ndarray) -> pa.Array:
+    try:
+        text = pa.array(series, type=pa.large_string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columnas mixtas (números y texto en object): se serializan con str()
+        mixed = series.astype(object).where(valid, None).map(str, na_action="ignore")
+        text = pa.array(mixed, type=pa.large_string(), from_pandas=True)
+    # Columnas str respaldadas por Arrow (p. ej. leídas de Parquet) llegan en chunks
+    return text.combine_chunks() if isinstance(text, pa.ChunkedArray) else text
+
+
+def _scatter(out: np.ndarray, at: np.ndarray, record: np.ndarray) -> None:
+    raw = record.view(np.uint8).reshape(len(record), -1)
+    out[at[:, None] + np.arange(raw.shape[1])] = raw
+
+
+# ============================================================================
+# R-TREE EMPAQUETADO
+# ============================================================================
+def _level_bounds(count: int, node_size: int) -> List[Tuple[int, int]]:
+    """Rango de nodos de cada nivel (hojas primero) dentro del arreglo del árbol"""
+    sizes, n = [count], count
+    while True:
+        n = -(-n // node_size)
+        sizes.append(n)
+        if n == 1:
+            break
+    total, bounds = sum(sizes), []
+    for size in sizes:
+        total -= size
+        bounds.append((total, total + size))
+    return bounds
+
+
+def _packed_rtree(x: np.ndarray, y: np.ndarray, offsets: np.ndarray, node_size: int) -> bytes:
+    bounds = _level_bounds(len(x), node_size)
+    nodes = np.empty(bounds[0][1], dtype=NODE_DTYPE)
+    leaf = nodes[bounds[0][0]:bounds[0][1]]
+    leaf["min_x"], leaf["min_y"], leaf["max_x"], leaf["max_y"] = x, y, x, y
+    leaf["offset"] = offsets
+
+    for (start, stop), (parent, _) in zip(bounds, bounds[1:]):
+        children = nodes[start:stop]
+        groups = np.arange(0, stop - start, node_size)
+        parents = nodes[parent:parent + len(groups)]
+        parents["min_x"] = np.minimum.reduceat(children["min_x"], groups)
+        parents["min_y"] = np.minimum.reduceat(children["min_y"], groups)
+        parents["max_x"] = np.maximum.reduceat(children["max_x"], groups)
+        parents["max_y"] = np.maximum.reduceat(children["max_y"], groups)
+        parents["offset"] = start + groups
+    return nodes.tobytes()
+
+
+# ============================================================================
+# ESCRITURA
+# ============================================================================
+def iter_fgb(df: pd.DataFrame, lat_col: str, lon_col: str, name: str = "data",
+             spatial_index: bool = True, chunk_rows: int = CHUNK_ROWS,
+             precision: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Genera el archivo por partes (header + índice, luego bloques de features)
+    para poder enviarlo como respuesta en streaming. Con `precision` las
+    coordenadas se ajustan a esa grilla decimal (FlatGeobuf exige float64).
+    """
+    lon = pd.to_numeric(df[lon_col], errors="coerce").to_numpy(dtype=np.float64)
+    lat = pd.to_numeric(df[lat_col], errors="coerce").to_numpy(dtype=np.float64)
+    has_coords = ~(np.isnan(lon) | np.isnan(lat))
+    rows = np.flatnonzero(has_coords)
+    props = df.drop(columns=[lat_col, lon_col])
+    columns = [_Column(props.iloc[:, i]) for i in range(props.shape[1])]
+    header_columns = [(str(c), col.kind) for c, col in zip(props.columns, columns)]
+
+    if not len(rows):
+        yield MAGIC + _header(name, header_columns, 0, None, 0)
+        return
+
+    x, y = lon[rows], lat[rows]
+    if precision is not None:
+        x, y = np.round(x, precision), np.round(y, precision)
+    envelope = [float(x.min()), float(y.min()), float(x.max()), float(y.max())]
+    if spatial_index:
+        order = np.argsort(hilbert_codes(x, y, envelope), kind="stable")
+        rows, x, y = rows[order], x[order], y[order]
+
+    props_len, sizes, offsets = _layout(columns, rows, len(df))
+    yield MAGIC + _header(name, header_columns, len(rows), envelope, NODE_SIZE if spatial_index else 0)
+    if spatial_index:
+        yield _packed_rtree(x, y, offsets, NODE_SIZE)
+    yield from _features(columns, rows, x, y, props_len, sizes, offsets, chunk_rows)
+
+
+def iter_fgb_batches(batches: Iterator[pd.DataFrame], lat_col: str, lon_col: str, name: str = "data",
+                     chunk_rows: int = CHUNK_ROWS, precision: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Variante para lotes (modo out-of-core): sin R-tree ni envelope y con
+    features_count = 0 (desconocido), que el formato permite cuando no hay
+    índice. El esquema de propiedades sale del primer lote.
+    """
+    header = False
+    for df in batches:
+        lon = pd.to_numeric(df[lon_col], errors="coerce").to_numpy(dtype=np.float64)
+        lat = pd.to_numeric(df[lat_col], errors="coerce").to_numpy(dtype=np.float64)
+        rows = np.flatnonzero(~(np.isnan(lon) | np.isnan(lat)))
+        props = df.drop(columns=[lat_col, lon_col])
+        columns = [_Column(props.iloc[:, i]) for i in range(props.shape[1])]
+        if not header:
+            header_columns = [(str(c), col.kind) for c, col in zip(props.columns, columns)]
+            yield MAGIC + _header(name, header_columns, 0, None, 0)
+            header = True
+        if not len(rows):
+            continue
+
+        x, y = lon[rows], lat[rows]
+        if precision is not None:
+            x, y = np.round(x, precision), np.round(y, precision)
+        props_len, sizes, offsets = _layout(columns, rows, len(df))
+        yield from _features(columns, rows, x, y, props_len, sizes, offsets, chunk_rows)
+
+
+def _layout(columns: List[_Column], rows: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Tamaño de propiedades y de cada feature (alineado a 8) → offsets de cada una en el archivo"""
+    props_len = np.zeros(n, dtype=np.int64)
+    for col in columns:
+        props_len += col.lengths
+    props_len = props_len[rows]
+    sizes = (FEATURE_FIXED + props_len + 7) // 8 * 8
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    return props_len, sizes, offsets
+
+
+def _features(columns: List[_Column], rows: np.ndarray, x: np.ndarray, y: np.ndarray,
+              props_len: np.ndarray, sizes: np.ndarray, offsets: np.ndarray,
+              chunk_rows: int) -> Iterator[bytes]:
+    for lo in range(0, len(rows), chunk_rows):
+        hi = min(lo + chunk_rows, len(rows))
+        base = offsets[lo:hi] - offsets[lo]
+        out = np.zeros(int(base[-1] + sizes[hi - 1]), dtype=np.uint8)
+
+        head = np.empty(hi - lo, dtype=_FEATURE_DTYPE)
+        head["size"] = sizes[lo:hi] - 4
+        head["head"] = np.void(_FEATURE_HEAD)
+        head["x"], head["y"], head["n"] = x[lo:hi], y[lo:hi], props_len[lo:hi]
+        _scatter(out, base, head)
+
+        at = base + FEATURE_FIXED
+        chunk = rows[lo:hi]
+        for i, col in enumerate(columns):
+            col.write(out, i, chunk, at)
+            at = at + col.lengths[chunk]
+        yield out.tobytes()
+
+
+def encode_fgb(df: pd.DataFrame, lat_col: str, lon_col: str, name: str = "data",
+               spatial_index: bool = True, precision: Optional[int] = None) -> bytes:
+    return b"".join(iter_fgb(df, lat_col, lon_col, name, spatial_index, precision=precision))
@@ -0,0 +1,257 @@
+import json
+import re
+import numpy as np
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from services.indexes import DatasetIndex
+from services.metrics import span
+
+# ============================================================================
+# LENGUAJE DE FILTROS
+# ----------------------------------------------------------------------------
+# JSON:     {"zona": "RURAL",
+#            "year_reporte": {"in": [2022, 2023]},
+#            "ised_x": {"gte": 0.5, "lt": 0.9},
+#            "nombre_sede": {"contains": "san"},
+#            "direccion": {"null": true}}
+#
+# Compacto: zona=RURAL;year_reporte=2022|2023;ised_x>=0.5;ised_x<0.9;
+#           ised_x=0.2..0.8;nombre_sede~san;direccion=null;latitud!=null
+# ============================================================================
+
+RANGE_OPS = {"gt", "gte", "lt", "lte"}
+OPS = {"eq", "in", "contains", "null", "between"} | RANGE_OPS
+
+_COMPACT_RE = re.compile(r"^\s*([^=<>!~\s]+)\s*(>=|<=|!=|=|>|<|~)\s*(.*?)\s*$")
+_COMPACT_OPS = {">=": "gte", "<=": "lte", ">": "gt", "<": "lt", "~": "contains"}
+
+
+class FilterError(ValueError):
+    """Expresión de filtro mal formada o sobre una columna inexistente"""
+
+
+@dataclass
+class Predicate:
+    column: str
+    op: str
+    value: Any
+    stage: str = "filter"   # etapa a la que se atribuye su tiempo (filter / bbox)
+
+    # ------------------------------------------------------------------
+    # Estimación de selectividad (fracción de filas que sobreviven)
+    # ------------------------------------------------------------------
+    def estimate(self, index: DatasetIndex) -> float:
+        col = index.column(self.column)
+        if col.size == 0:
+            return 0.0
+
+        if self.op in ("eq", "in") and not col.is_numeric:
+            return col.counts[col.codes_for(self._texts())].sum() / col.size
+        if self.op == "contains":
+            return col.counts[col.codes_containing(str(self.value))].sum() / col.size
+        if self.op == "null":
+            nulls = col.null_count / col.size
+            return nulls if self.value else 1.0 - nulls
+
+        start, stop = self._bounds(col)
+        return (stop - start) / col.size
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+    def select(self, index: DatasetIndex) -> np.ndarray:
+        """Posiciones (ordenadas) que cumplen el predicado sobre todo el dataset"""
+        col = index.column(self.column)
+        if self._uses_range(col) and self.op != "in":
+            start, stop = self._bounds(col)
+            return np.sort(col.order[start:stop])
+        return np.flatnonzero(self._mask(col, None))
+
+    def refine(self, index: DatasetIndex, positions: np.ndarray) -> np.ndarray:
+        """Subconjunto de `positions` que cumple el predicado"""
+        return positions[self._mask(index.column(self.column), positions)]
+
+    def _mask(self, col, positions: Optional[np.ndarray]) -> np.ndarray:
+        take = (lambda a: a) if positions is None else (lambda a: a[positions])
+
+        if self.op == "null":
+            is_null = take(col.codes) < 0
+            return is_null if self.value else ~is_null
+
+        if self.op == "contains":
+            return np.isin(take(col.codes), col.codes_containing(str(self.value)))
+
+        if not self._uses_range(col):
+            return np.isin(take(col.codes), col.codes_for(self._texts()))
+
+        values = take(col.numeric)
+        mask = ~np.isnan(values)
+        if self.op in ("eq", "in"):
+            return mask & np.isin(values, self._numbers())
+        low, high, low_inc, high_inc = self._limits()
+        with np.errstate(invalid="ignore"):
+            if low is not None:
+                mask &= (values >= low) if low_inc else (values > low)
+            if high is not None:
+                mask &= (values <= high) if high_inc else (values < high)
+        return mask
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+    def _uses_range(self, col) -> bool:
+        if self.op in RANGE_OPS or self.op == "between":
+            return True
+        # Igualdad sobre columnas numéricas: comparación numérica (2022 == 2022.0)
+        return self.op in ("eq", "in") and col.is_numeric
+
+    def _bounds(self, col):
+        if self.op in ("eq", "in"):
+            numbers = self._numbers()
+            if len(numbers) == 1:
+                return col.range_bounds(numbers[0], numbers[0])
+            # Varios valores: solo sirve como conteo para la estimación
+            hits = 0
+            for n in numbers:
+                start, stop = col.range_bounds(n, n)
+                hits += stop - start
+            return 0, hits
+        return col.range_bounds(*self._limits())
+
+    def _limits(self):
+        if self.op == "between":
+            low, high = self.value
+            return _number(low), _number(high), True, True
+        value = _number(self.value)
+        return {
+            "gt": (value, None, False, True),
+            "gte": (value, None, True, True),
+            "lt": (None, value, True, False),
+            "lte": (None, value, True, True),
+        }[self.op]
+
+    def _values(self) -> List[Any]:
+        return list(self.value) if self.op == "in" else [self.value]
+
+    def _texts(self) -> List[str]:
+        return [str(v) for v in self._values()]
+
+    def _numbers(self) -> np.ndarray:
+        numbers = []
+        for v in self._values():
+            try:
+                numbers.append(float(v))
+            except (TypeError, ValueError):
+                continue
+        return np.array(numbers, dtype=np.float64)
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise FilterError(f"Valor numérico inválido: {value!r}")
+
+
+# ============================================================================
+# PARSER
+# ============================================================================
+def parse_filter(expr: Optional[str]) -> List[Predicate]:
+    """Convierte una expresión (JSON o compacta) en una lista de predicados"""
+    if not expr or not expr.strip():
+        return []
+    expr = expr.strip()
+    if expr[0] in "{[":
+        try:
+            return _parse_json(json.loads(expr))
+        except json.JSONDecodeError as e:
+            raise FilterError(f"Filtro JSON inválido: {e}")
+    return _parse_compact(expr)
+
+
+def _parse_json(spec: Any) -> List[Predicate]:
+    # Se admite también una lista de objetos (varias condiciones por columna)
+    if isinstance(spec, list):
+        return [p for item in spec for p in _parse_json(item)]
+    if not isinstance(spec, dict):
+        raise FilterError("El filtro JSON debe ser un objeto {columna: condición}")
+
+    predicates = []
+    for column, cond in spec.items():
+        if not isinstance(cond, dict):
+            op = "in" if isinstance(cond, list) else "eq"
+            predicates.append(Predicate(column, op, cond))
+            continue
+        for op, value in cond.items():
+            if op not in OPS:
+                raise FilterError(f"Operador no soportado: '{op}'")
+            if op in ("in", "between") and not isinstance(value, list):
+                raise FilterError(f"'{op}' requiere una lista")
+            if op == "between" and len(value) != 2:
+                raise FilterError("'between' requiere exactamente [min, max]")
+            predicates.append(Predicate(column, op, value))
+    return predicates
+
+
+def _parse_compact(expr: str) -> List[Predicate]:
+    predicates = []
+    for part in filter(None, (p.strip() for p in expr.split(";"))):
+        match = _COMPACT_RE.match(part)
+        if not match:
+            raise FilterError(f"Condición inválida: '{part}'")
+        column, sym, value = match.groups()
+
+        if value.lower() == "null" and sym in ("=", "!="):
+            predicates.append(Predicate(column, "null", sym == "="))
+        elif sym == "!=":
+            raise FilterError("'!=' solo se admite con null")
+        elif sym in _COMPACT_OPS:
+            predicates.append(Predicate(column, _COMPACT_OPS[sym], value))
+        elif ".." in value:
+            low, high = value.split("..", 1)
+            predicates.append(Predicate(column, "between", [low, high]))
+        elif "|" in value:
+            predicates.append(Predicate(column, "in", value.split("|")))
+        else:
+            predicates.append(Predicate(column, "eq", value))
+    return predicates
+
+
+# ============================================================================
+# PLAN DE EJECUCIÓN
+# ============================================================================
+class QueryPlan:
+    """
+    Predicados ordenados de más a menos selectivo según las estadísticas de
+    los índices. El primero se resuelve contra el índice completo y los demás
+    solo sobre las posiciones que van sobreviviendo.
+    """
+
+    def __init__(self, steps: List[Predicate], estimates: List[float]):
+        self.steps = steps
+        self.estimates = estimates
+
+    def execute(self, index: DatasetIndex) -> np.ndarray:
+        if not self.steps:
+            return np.arange(index.size)
+
+        first = self.steps[0]
+        with span(first.stage):
+            positions = first.select(index)
+        for predicate in self.steps[1:]:
+            if len(positions) == 0:
+                break
+            with span(predicate.stage):
+                positions = predicate.refine(index, positions)
+        return positions
+
+
+def compile_plan(predicates: List[Predicate], index: DatasetIndex) -> QueryPlan:
+    for p in predicates:
+        if not index.has_column(p.column):
+            raise FilterError(f"Columna '{p.column}' no existe")
+
+    estimates = [p.estimate(index) for p in predicates]
+    ranked = sorted(zip(estimates, range(len(predicates))))
+    return QueryPlan([predicates[i] for _, i in ranked], [e for e, _ in ranked])
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Tuple
+
+# Resolución de la curva: 16 bits por eje (la misma que usa FlatGeobuf)
+HILBERT_MAX = (1 << 16) - 1
+
+
+def hilbert_codes(x: np.ndarray, y: np.ndarray,
+                  bounds: Optional[Tuple[float, float, float, float]] = None) -> np.ndarray:
+    """
+    Posición sobre la curva de Hilbert de cada punto (uint32), vectorizado.
+    Puntos cercanos en el plano quedan cercanos en el orden resultante.
+    `bounds` = (min_x, min_y, max_x, max_y); por defecto el extent de los datos.
+    """
+    if bounds is None:
+        bounds = (np.min(x), np.min(y), np.max(x), np.max(y))
+    min_x, min_y, max_x, max_y = bounds
+    width = (max_x - min_x) or 1.0
+    height = (max_y - min_y) or 1.0
+    hx = np.floor(HILBERT_MAX * (np.asarray(x, dtype=np.float64) - min_x) / width).astype(np.uint32)
+    hy = np.floor(HILBERT_MAX * (np.asarray(y, dtype=np.float64) - min_y) / height).astype(np.uint32)
+    return _hilbert(hx, hy)
+
+
+def spatial_order(df: pd.DataFrame, lat_col: str, lon_col: str,
+                  partition_by: List[str] = ()) -> np.ndarray:
+    """
+    Permutación de filas por particiones (ej: año, departamento) y, dentro de
+    cada una, por la curva de Hilbert sobre el extent de todo el dataset.
+    Las filas sin coordenadas quedan al final de su partición.
+    """
+    lon = pd.to_numeric(df[lon_col], errors="coerce").to_numpy(dtype=np.float64)
+    lat = pd.to_numeric(df[lat_col], errors="coerce").to_numpy(dtype=np.float64)
+    valid = ~(np.isnan(lon) | np.isnan(lat))
+    codes = np.full(len(df), 1 << 32, dtype=np.int64)
+    if valid.any():
+        codes[valid] = hilbert_codes(lon[valid], lat[valid])
+
+    # lexsort: la última clave es la principal
+    keys = [codes]
+    for col in reversed([c for c in partition_by if c in df.columns]):
+        keys.append(pd.factorize(df[col].astype(str), sort=True)[0])
+    return np.lexsort(keys)
+
+
+def _hilbert(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    # Algoritmo sin ramas de http://threadlocalmutex.com/?p=126 (coordenadas de 16 bits)
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    for shift in (2, 4):
+        a, b, c, d = A, B, C, D
+        A = (a & (a >> shift)) ^ (b & (b >> shift))
+        B = (a & (b >> shift)) ^ (b & ((a ^ b) >> shift))
+        C = C ^ ((a & (c >> shift)) ^ (b & (d >> shift)))
+        D = D ^ ((b & (c >> shift)) ^ ((a ^ b) & (d >> shift)))
+
+    a, b, c, d = A, B, C, D
+    C = C ^ ((a & (c >> 8)) ^ (b & (d >> 8)))
+    D = D ^ ((b & (c >> 8)) ^ ((a ^ b) & (d >> 8)))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+    return (_interleave(i1) << 1) | _interleave(i0)
+
+
+def _interleave(v: np.ndarray) -> np.ndarray:
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    return (v | (v << 1)) & 0x55555555
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+# Primer número dentro de un texto (ej: "20 Mbps" -> 20)
+_NUMBER_RE = r"(-?\d+(?:[.,]\d+)?)"
+
+
+class ColumnIndex:
+    """
+    Índice en memoria de una columna, construido una sola vez por dataset.
+
+    - codes / categories: codificación categórica sobre el texto de cada valor
+      (mismo criterio tolerante str vs int que usaba el filtro original).
+    - counts / null_count: estadísticas para estimar la selectividad.
+    - numeric / order / sorted_values: vista numérica presorteada, los rangos
+      se resuelven con búsqueda binaria.
+    """
+
+    def __init__(self, series: pd.Series):
+        self.name = series.name
+        self.size = len(series)
+        self.is_numeric = pd.api.types.is_numeric_dtype(series.dtype)
+
+        valid = series.notna().to_numpy()
+        text = series.astype(str).to_numpy(dtype=object)
+        text[~valid] = None
+        codes, categories = pd.factorize(text)
+
+        self.codes = codes.astype(np.int32)
+        self.categories = np.asarray(categories, dtype=object)
+        self.counts = np.bincount(self.codes[self.codes >= 0], minlength=len(self.categories))
+        self.null_count = int(self.size - valid.sum())
+
+        self._series = series
+        self._lookup: Optional[Dict[str, int]] = None
+        self._labels: Optional[np.ndarray] = None
+        self._numeric: Optional[np.ndarray] = None
+        self._order: Optional[np.ndarray] = None
+        self._sorted: Optional[np.ndarray] = None
+
+    # ------------------------------------------------------------------
+    # Vista categórica
+    # ------------------------------------------------------------------
+    def codes_for(self, values: List[str]) -> np.ndarray:
+        """Códigos de las categorías pedidas (las inexistentes se ignoran)"""
+        if self._lookup is None:
+            self._lookup = {c: i for i, c in enumerate(self.categories)}
+        found = [self._lookup[v] for v in values if v in self._lookup]
+        return np.array(found, dtype=np.int32)
+
+    def codes_containing(self, text: str) -> np.ndarray:
+        """Códigos cuyas categorías contienen el texto (sin distinguir mayúsculas)"""
+        cats = pd.Series(self.categories, dtype=object)
+        hits = cats.str.contains(text, case=False, regex=False, na=False).to_numpy()
+        return np.flatnonzero(hits).astype(np.int32)
+
+    @property
+    def labels(self) -> np.ndarray:
+        """Valor original (con su tipo) de cada categoría, para devolver en respuestas"""
+        if self._labels is None:
+            valid = np.flatnonzero(self.codes >= 0)
+            _, first = np.unique(self.codes[valid], return_index=True)
+            self._labels = self._series.iloc[valid[first]].to_numpy(dtype=object)
+        return self._labels
+
+    # ------------------------------------------------------------------
+    # Vista numérica (presorteada)
+    # ------------------------------------------------------------------
+    @property
+    def numeric(self) -> np.ndarray:
+        if self._numeric is None:
+            self._numeric = numeric_values(self._series)
+        return self._numeric
+
+    @property
+    def order(self) -> np.ndarray:
+        """Posiciones de las filas numéricas válidas, ordenadas por valor"""
+        if self._order is None:
+            values = self.numeric
+            valid = np.flatnonzero(~np.isnan(values))
+            self._order = valid[np.argsort(values[valid], kind="stable")]
+        return self._order
+
+    @property
+    def sorted_values(self) -> np.ndarray:
+        """Valores de `order` (se arma una vez: rangos y selectividad lo consultan en cada predicado)"""
+        if self._sorted is None:
+            self._sorted = self.numeric[self.order]
+        return self._sorted
+
+    def range_bounds(self, low: Optional[float], high: Optional[float],
+                     low_inclusive: bool = True, high_inclusive: bool = True):
+        """Tramo [start, stop) de `order` que cumple el rango"""
+        values = self.sorted_values
+        start, stop = 0, len(values)
+        if low is not None:
+            start = np.searchsorted(values, low, side="left" if low_inclusive else "right")
+        if high is not None:
+            stop = np.searchsorted(values, high, side="right" if high_inclusive else "left")
+        return int(start), int(max(start, stop))
+
+
+def numeric_values(series: pd.Series) -> np.ndarray:
+    """Valores como float64 (NaN si no hay número); texto tipo "20 Mbps" → 20"""
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    values = pd.to_numeric(series, errors="coerce")
+    # Columnas tipo "20 Mbps": si casi nada parsea directo, extraemos el primer número
+    present = int(series.notna().sum())
+    if present and values.notna().sum() < present / 2:
+        extracted = series.astype(str).str.extract(_NUMBER_RE, expand=False)
+        values = pd.to_numeric(extracted.str.replace(",", ".", regex=False), errors="coerce")
+    return values.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+class DatasetIndex:
+    """
+    Conjunto de índices de un dataset cargado en memoria.
+    Los índices de las columnas declaradas se construyen al cargar; el resto
+    bajo demanda la primera vez que se consultan.
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: List[str] = (), source_rows: Optional[np.ndarray] = None):
+        self.df = df
+        self.size = len(df)
+        # Número de fila en el archivo de cada fila (el orden en memoria es el espacial)
+        self.source_rows = np.arange(len(df)) if source_rows is None else source_rows
+        self._columns: Dict[str, ColumnIndex] = {}
+        for col in columns:
+            if col in df.columns:
+                self.column(col)
+
+    def has_column(self, name: str) -> bool:
+        return name in self.df.columns
+
+    def column(self, name: str) -> ColumnIndex:
+        if name not in self._columns:
+            if name not in self.df.columns:
+                raise KeyError(name)
+            self._columns[name] = ColumnIndex(self.df[name])
+        return self._columns[name]
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+from services.filters import FilterError
+from services.indexes import ColumnIndex, DatasetIndex
+
+
+def _key_labels(column: ColumnIndex) -> np.ndarray:
+    """Texto de cada categoría comparable entre datasets (2022, 2022.0 y "2022" → "2022")"""
+    labels = column.categories.astype(str)
+    if column.is_numeric:
+        numbers = pd.to_numeric(pd.Series(labels), errors="coerce").to_numpy()
+        whole = ~np.isnan(numbers) & (numbers == np.round(numbers))
+        labels = labels.astype(object)
+        labels[whole] = [str(int(v)) for v in numbers[whole]]
+    return labels
+
+
+class JoinIndex:
+    """
+    Join declarado entre dos datasets ya cargados: para cada fila del dataset
+    izquierdo, la posición de su fila en el derecho (-1 si no tiene). Se arma
+    una sola vez con una tabla hash sobre la clave; las consultas solo hacen
+    fancy-indexing, sin construir el DataFrame combinado. `duplicates` cuenta
+    las filas del derecho descartadas por repetir clave.
+    """
+
+    def __init__(self, left: DatasetIndex, right: DatasetIndex, on: List[str]):
+        for col in on:
+            if not left.has_column(col) or not right.has_column(col):
+                raise FilterError(f"Columna de join '{col}' no existe en ambos datasets")
+        self.on = on
+
+        # Códigos de la clave en el espacio del dataset izquierdo (por categoría, no por fila)
+        left_key = np.zeros(left.size, dtype=np.int64)
+        right_key = np.zeros(right.size, dtype=np.int64)
+        valid_left = np.ones(left.size, dtype=bool)
+        valid_right = np.ones(right.size, dtype=bool)
+        for col in on:
+            lcol, rcol = left.column(col), right.column(col)
+            lookup = {label: code for code, label in enumerate(_key_labels(lcol))}
+            remap = np.array([lookup.get(label, -1) for label in _key_labels(rcol)] + [-1], dtype=np.int64)
+            rcodes = remap[rcol.codes]  # código -1 (nulo) apunta al -1 del final
+            valid_left &= lcol.codes >= 0
+            valid_right &= rcodes >= 0
+            width = len(lcol.categories) + 1
+            left_key = left_key * width + lcol.codes + 1
+            right_key = right_key * width + rcodes + 1
+
+        # Clave → fila del derecho; si una clave se repite gana la última fila del archivo
+        # (no la del orden espacial en memoria, como en YearMatrix)
+        rows = np.flatnonzero(valid_right)
+        rows = rows[np.lexsort((right.source_rows[rows], right_key[rows]))]
+        keys = right_key[rows]
+        last = np.ones(len(rows), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        self.duplicates = int(len(rows) - last.sum())
+        table = pd.Series(rows[last], index=keys[last])
+        found = table.index.get_indexer(left_key)
+        found[~valid_left] = -1
+        self.right_rows = np.where(found >= 0, table.to_numpy()[np.maximum(found, 0)], -1)
+        self.matched = int((self.right_rows >= 0).sum())
+
+    def left_mask(self, right_positions: np.ndarray, right_size: int) -> np.ndarray:
+        """Filas del izquierdo cuya fila asociada está entre `right_positions`"""
+        allowed = np.zeros(right_size + 1, dtype=bool)
+        allowed[right_positions] = True
+        return allowed[self.right_rows]  # -1 → posición extra, siempre False
+
+    def project(self, right_df: pd.DataFrame, positions: np.ndarray, columns: List[str],
+                prefix: str) -> Dict[str, np.ndarray]:
+        """Columnas `prefix.col` del derecho para las filas `positions` del izquierdo (NaN/None sin match)"""
+        rows = self.right_rows[positions]
+        missing = rows < 0
+        out = {}
+        for col in columns:
+            values = right_df[col].take(np.maximum(rows, 0)).to_numpy()
+            if missing.any():
+                values = values.astype(object) if values.dtype.kind not in "fc" else values.copy()
+                values[missing] = None if values.dtype == object else np.nan
+            out[f"{prefix}.{col}"] = values
+        return out
@@ -0,0 +1,236 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# ============================================================================
+# MÉTRICAS (formato de exposición de Prometheus, sin dependencias)
+# ============================================================================
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+ROWS_BUCKETS = (0, 10, 100, 1e3, 1e4, 1e5, 1e6, 1e7)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{str(v).replace(chr(34), chr(39))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = ()):
+        self.name, self.doc, self.labels = name, doc, labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {value:g}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, *labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.doc, self.labels = name, doc, labels
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *labels, value: float) -> None:
+        with self._lock:
+            entry = self._values.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0])
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = [(labels, (list(counts), total)) for labels, (counts, total) in sorted(self._values.items())]
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for m in self._metrics for line in m.render()) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "Peticiones HTTP atendidas", ("route", "method", "status")))
+HTTP_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "Duración total de la petición", ("route",)))
+PAYLOAD_BYTES = registry.register(Histogram(
+    "http_response_bytes", "Tamaño del cuerpo de la respuesta", ("route",), BYTES_BUCKETS))
+STAGE_DURATION = registry.register(Histogram(
+    "query_stage_duration_seconds", "Duración de cada etapa de una consulta", ("stage",)))
+ROWS_IN = registry.register(Histogram(
+    "query_rows_in", "Filas del dataset antes de filtrar", ("dataset",), ROWS_BUCKETS))
+ROWS_OUT = registry.register(Histogram(
+    "query_rows_out", "Filas resultantes después de filtrar", ("dataset",), ROWS_BUCKETS))
+CACHE_REQUESTS = registry.register(Counter(
+    "query_cache_requests_total", "Consultas a caches internas", ("cache", "result")))
+EXECUTOR_EVENTS = registry.register(Counter(
+    "query_executor_events_total", "Eventos del executor (coalesced, shed, timeout)", ("event",)))
+EXECUTOR_STATE = registry.register(Gauge(
+    "query_executor_state", "Consultas corriendo / en cola", ("state",)))
+
+
+# ============================================================================
+# TRAZA POR PETICIÓN (spans por etapa → Server-Timing)
+# ----------------------------------------------------------------------------
+# Un span dentro de otro se nombra con su ruta ("load.cube"): en Server-Timing
+# solo los spans sin punto suman (aprox.) el total.
+# ============================================================================
+class RequestTrace:
+    def __init__(self, profile: bool = False):
+        self.start = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        self.caches: Dict[str, str] = {}
+        self.rows_in: Optional[int] = None
+        self.rows_out: Optional[int] = None
+        self.profile = profile
+        self.profile_output: Optional[str] = None
+        # Encabezados ya enviados: lo que se mida después (cuerpo en streaming) no entra
+        self.sealed = False
+
+    def add(self, stage: str, seconds: float) -> None:
+        if not self.sealed:
+            self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def merge(self, other: "RequestTrace", profile: bool = False) -> None:
+        """Suma la traza de un cómputo compartido (executor) a la de esta petición"""
+        for stage, seconds in other.spans.items():
+            self.add(stage, seconds)
+        for name, result in other.caches.items():
+            if self.caches.get(name) != "miss":
+                self.caches[name] = result
+        if other.rows_out is not None:
+            self.rows_in, self.rows_out = other.rows_in, other.rows_out
+        if profile and other.profile_output:
+            self.profile_output = (self.profile_output or "") + other.profile_output
+
+    def server_timing(self, total: float, streamed: bool = False) -> str:
+        parts = [f"{stage};dur={sec * 1000:.1f}" for stage, sec in self.spans.items()]
+        parts += [f'{name}-cache;desc="{result}"' for name, result in self.caches.items()]
+        if streamed:
+            parts.append('stream;desc="cuerpo en streaming: su encode no se incluye"')
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("trace", default=None)
+# Ruta del span en curso (para nombrar los anidados)
+_stage: contextvars.ContextVar[str] = contextvars.ContextVar("stage", default="")
+
+
+def start_trace(profile: bool = False) -> RequestTrace:
+    trace = RequestTrace(profile)
+    _trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _trace.get()
+
+
+def use_trace(trace: Optional[RequestTrace]) -> None:
+    """Traza activa en el contexto actual (ej: la de un cómputo compartido del executor)"""
+    _trace.set(trace)
+    _stage.set("")
+
+
+@contextmanager
+def span(stage: str):
+    """Mide una etapa; se suma a la traza de la petición y al histograma global"""
+    parent = _stage.get()
+    stage = f"{parent}.{stage}" if parent else stage
+    token = _stage.set(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _stage.reset(token)
+        STAGE_DURATION.observe(stage, value=elapsed)
+        trace = _trace.get()
+        if trace is not None:
+            trace.add(stage, elapsed)
+
+
+def record_rows(dataset: str, rows_in: int, rows_out: int) -> None:
+    ROWS_IN.observe(dataset, value=rows_in)
+    ROWS_OUT.observe(dataset, value=rows_out)
+    trace = _trace.get()
+    if trace is not None:
+        trace.rows_in, trace.rows_out = rows_in, rows_out
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+    trace = _trace.get()
+    # Un fallo en cualquier punto de la petición la marca como "miss"
+    if trace is not None and trace.caches.get(cache) != "miss":
+        trace.caches[cache] = "hit" if hit else "miss"
+
+
+# ============================================================================
+# PERFILADO DE PETICIONES LENTAS (opcional, requiere pyinstrument)
+# ============================================================================
+def call_profiled(fn, *args):
+    """
+    Ejecuta `fn` bajo el profiler de muestreo si la petición fue elegida para
+    perfilar. Corre dentro del hilo que hace el trabajo (no en el event loop).
+    """
+    trace = _trace.get()
+    if trace is None or not trace.profile:
+        return fn(*args)
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        return fn(*args)
+
+    profiler = Profiler(async_mode="disabled")
+    profiler.start()
+    try:
+        return fn(*args)
+    finally:
+        profiler.stop()
+        # Se acumulan los perfiles de cada etapa (cómputo + serialización)
+        trace.profile_output = (trace.profile_output or "") + profiler.output_text(unicode=True, show_all=False)
@@ -0,0 +1,112 @@
+import base64
+import binascii
+import json
+import numpy as np
+from typing import Any, List, Optional, Tuple
+
+from services.filters import FilterError
+from services.indexes import DatasetIndex
+
+
+class PageOrder:
+    """
+    Orden total y estable de las filas por `columns` (nulos primero, empates
+    por posición) para paginar por keyset: el cursor guarda los valores de la
+    última fila entregada, no un offset, así que no se salta ni repite filas
+    entre páginas aunque el dataset se recargue entre una y otra.
+    """
+
+    def __init__(self, index: DatasetIndex, columns: List[str]):
+        for col in columns:
+            if not index.has_column(col):
+                raise FilterError(f"Columna '{col}' no existe")
+        self.columns = columns
+
+        # Rango de cada fila por columna (0 = nulo), combinado en una sola clave int64
+        self._keys: List[np.ndarray] = []
+        composite = np.zeros(index.size, dtype=np.int64)
+        for col in columns:
+            column = index.column(col)
+            cat_keys = self._category_keys(column.categories, column.is_numeric)
+            cat_order = np.argsort(cat_keys, kind="stable")
+            cat_rank = np.empty(len(cat_order), dtype=np.int64)
+            cat_rank[cat_order] = np.arange(1, len(cat_order) + 1)
+            ranks = np.where(column.codes >= 0, cat_rank[np.maximum(column.codes, 0)], 0)
+            composite = composite * (len(cat_order) + 1) + ranks
+            self._keys.append(cat_keys[cat_order])
+
+        order = np.argsort(composite, kind="stable")
+        self._composite = composite[order]
+        self.rank = np.empty(index.size, dtype=np.int64)
+        self.rank[order] = np.arange(index.size)
+
+    @staticmethod
+    def _category_keys(categories: np.ndarray, numeric: bool) -> np.ndarray:
+        if numeric:
+            return np.array([float(c) for c in categories], dtype=np.float64)
+        return categories.astype(str)
+
+    # ------------------------------------------------------------------
+    # Cursor opaco: base64 de [valores de la última fila..., desempate]
+    # ------------------------------------------------------------------
+    def encode_cursor(self, rank: int) -> str:
+        composite = int(self._composite[rank])
+        values: List[Any] = []
+        for keys in reversed(self._keys):
+            composite, r = divmod(composite, len(keys) + 1)
+            values.append(None if r == 0 else keys[r - 1].item())
+        values.reverse()
+        # Filas con la misma clave: cuántas van dentro del grupo
+        offset = rank - int(np.searchsorted(self._composite, self._composite[rank], side="left"))
+        raw = json.dumps(values + [offset], separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def start_rank(self, cursor: str) -> int:
+        """Primer rango posterior a la fila descrita por el cursor"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            *values, offset = json.loads(raw)
+            if len(values) != len(self._keys):
+                raise ValueError
+            offset = int(offset)
+        except (binascii.Error, ValueError, TypeError):
+            raise FilterError("Cursor inválido")
+
+        composite, exact = 0, True
+        for keys, value in zip(self._keys, values):
+            if not exact:
+                # Un valor anterior ya no existe: basta con su punto de inserción
+                composite = composite * (len(keys) + 1)
+                continue
+            if value is None:
+                r = 0
+            else:
+                try:
+                    value = keys.dtype.type(value)
+                except (TypeError, ValueError):
+                    raise FilterError("Cursor inválido")
+                r = int(np.searchsorted(keys, value, side="left"))
+                exact = r < len(keys) and keys[r] == value
+                r += 1
+            composite = composite * (len(keys) + 1) + r
+
+        start = int(np.searchsorted(self._composite, composite, side="left"))
+        found = exact and start < len(self._composite) and self._composite[start] == composite
+        return start + offset + 1 if found else start
+
+    def page(self, positions: np.ndarray, limit: int,
+             cursor: Optional[str] = None) -> Tuple[np.ndarray, Optional[str]]:
+        """Hasta `limit` posiciones (en orden) después del cursor y el cursor siguiente"""
+        ranks = self.rank[positions]
+        if cursor:
+            keep = ranks >= self.start_rank(cursor)
+            positions, ranks = positions[keep], ranks[keep]
+        more = len(positions) > limit
+        if more:
+            # Solo se ordena la página, no todo el resultado
+            top = np.argpartition(ranks, limit - 1)[:limit]
+            positions, ranks = positions[top], ranks[top]
+        sort = np.argsort(ranks, kind="stable")
+        positions, ranks = positions[sort], ranks[sort]
+        next_cursor = self.encode_cursor(int(ranks[-1])) if more else None
+        return positions, next_cursor
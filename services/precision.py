@@ -0,0 +1,53 @@
+import fnmatch
+import math
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Sequence, Tuple
+
+# 6 decimales ≈ 11 cm: menos de un píxel hasta zoom ~18.
+# Por defecto solo se redondea la geometría (geojson, fgb, position de columnar);
+# las columnas de atributos (incluidas lat/lon en json) solo si se piden.
+DEFAULT_PRECISION = 6
+MAX_PRECISION = 15
+TILE_SIZE = 256
+
+
+def precision_for_zoom(zoom: float) -> int:
+    """Decimales necesarios para que el redondeo mueva un punto menos de medio píxel en `zoom`"""
+    half_pixel = 360 / (TILE_SIZE * 2 ** max(zoom, 0)) / 2
+    return min(MAX_PRECISION, max(0, math.ceil(-math.log10(half_pixel))))
+
+
+def resolve_precision(precision: Optional[int], zoom: Optional[float]) -> int:
+    """`precision` explícita > la que pide el zoom > DEFAULT_PRECISION"""
+    if precision is not None:
+        return precision
+    if zoom is not None:
+        return precision_for_zoom(zoom)
+    return DEFAULT_PRECISION
+
+
+def round_columns(df: pd.DataFrame, columns: List[str], precision: int) -> pd.DataFrame:
+    """Copia con las columnas numéricas de `columns` redondeadas (las de texto no se tocan)"""
+    rounded = {
+        col: np.round(df[col].to_numpy(dtype=np.float64), precision)
+        for col in columns
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col].dtype)
+    }
+    return df.assign(**rounded) if rounded else df
+
+
+def attribute_rounding(spec: Optional[str], coordinates: Sequence[str], explicit: bool) -> Tuple[str, ...]:
+    """
+    Columnas de atributos a redondear (json y properties): las de `spec`
+    ("ised_*,total_equipos", admite comodines) y lat/lon si la precisión o el
+    zoom se pidieron explícitamente.
+    """
+    patterns = [c.strip() for c in (spec or "").split(",") if c.strip()]
+    if explicit:
+        patterns += [c for c in coordinates if c and c not in patterns]
+    return tuple(patterns)
+
+
+def matching_columns(columns: Sequence[str], patterns: Sequence[str]) -> List[str]:
+    return [c for c in columns if any(fnmatch.fnmatchcase(c, p) for p in patterns)]
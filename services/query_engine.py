@@ -1,7 +1,33 @@
+import logging
+import threading
+
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+
+from core.loader_csv import load_dataset
+from services.aggregations import aggregate, metric_name, parse_metrics
+from services.breaks import equal_interval_breaks, jenks_breaks, quantile_breaks, subset_sorted
+from services.cache import LRUCache
+from services.choropleth import get_admin_layer, normalize_code
+from services.cube import SummaryCube
+from services.fgb import encode_fgb, iter_fgb_batches
+from services.hilbert import spatial_order
+from services.filters import FilterError, Predicate, compile_plan, parse_filter
+from services.indexes import DatasetIndex
+from services.joins import JoinIndex
+from services.metrics import record_cache, record_rows, span
+from services.pagination import PageOrder
+from services.precision import DEFAULT_PRECISION, matching_columns, round_columns
+from services.scan import scan_batches, should_scan
+from services.search import SearchIndex
+from services.serialization import dumps
+from services.spatial import PointIndex
+from services.timeseries import (STATUSES, YearMatrix, change_status, connected_flags, flags_to_bool,
+                                 summarize_changes)
+
+logger = logging.getLogger(__name__)
 
 # ============================================================================
 # CONFIGURACIÓN (Esto podría venir de tu YAML, pero lo dejamos aquí por ahora)
@@ -11,62 +37,262 @@ DATASETS = {
         "file": "db/sedes_mock.csv", 
         "lat_col": "latitud",
         "lon_col": "longitud",
-        "filters": ["year_reporte", "zona", "DPTO_CNMBR", "MPIO_CNMBR"]
+        "filters": ["year_reporte", "zona", "DPTO_CNMBR", "MPIO_CNMBR"],
+        # Columna con el código DANE de cada nivel (join con polígonos MGN)
+        "admin_keys": {"departamento": "DPTO_CCDGO", "municipio": "MPIO_CDPMP"},
+        # Formato largo (sede, año): columnas para comparar años
+        "timeseries": {"key": "sede_codigo", "year": "year_reporte",
+                       "connected": "conect_conectividad_def", "bandwidth": "conect_anchodebandaconsolidadombps"},
+        # Columnas de texto para /search (en orden de prioridad)
+        "search": ["nombre_sede", "nombre_establecimiento", "sede_codigo", "MPIO_CNMBR"],
+        # Orden estable para paginar format=json por keyset
+        "order": ["sede_codigo", "year_reporte"],
+        # Orden físico en memoria: por año y departamento, luego curva de Hilbert
+        "partition": ["year_reporte", "DPTO_CCDGO"],
+        # Joins en tiempo de consulta: filtros "sena_ised.col" y columnas de ese dataset
+        "joins": {"sena_ised": {"on": ["sede_codigo", "year_reporte"]}},
+        # Cubo de resumen: conteos e indicadores por combinación de filtros (y códigos DANE)
+        "cube": {"dimensions": ["year_reporte", "zona", "DPTO_CNMBR", "MPIO_CNMBR", "DPTO_CCDGO", "MPIO_CDPMP"],
+                 "measures": ["ised_*", "conect_anchodebandaconsolidadombps"]}
     },
     # --- NUEVO DATASET ---
     "sena_ised": {
         "file": "db/sena_ised.parquet",
         "lat_col": "latitud",
         "lon_col": "longitud",
-        "filters": ["year_reporte","departamento","d_conectado","sector_atencion"]
+        "filters": ["year_reporte","departamento","d_conectado","sector_atencion"],
+        "admin_keys": {"departamento": "dpto_ccdgo"},
+        "timeseries": {"key": "sede_codigo", "year": "year_reporte",
+                       "connected": "conectividad_def", "bandwidth": "anchodebandaconsolidadombps"},
+        "search": ["nombre_sede", "sede_codigo", "mpio_cnmbr"],
+        "order": ["sede_codigo", "year_reporte"],
+        "partition": ["year_reporte", "dpto_ccdgo"],
+        "joins": {"sedes_mock": {"on": ["sede_codigo", "year_reporte"]}},
+        "cube": {"dimensions": ["year_reporte", "departamento", "d_conectado", "sector_atencion", "dpto_ccdgo"],
+                 "measures": ["ised_*", "anchodebandaconsolidadombps"]},
+        # True: /data lee el Parquet por lotes sin cargarlo (también si supera SCAN_THRESHOLD_MB)
+        "scan": False
     }
 }
 
 class QueryEngine:
     def __init__(self):
         self._cache = {}
+        self._indexes: Dict[str, DatasetIndex] = {}
+        # KD-tree de coordenadas (se construye con la primera búsqueda espacial)
+        self._points: Dict[str, PointIndex] = {}
+        # Matriz sede × año (series de tiempo), también bajo demanda
+        self._years: Dict[str, YearMatrix] = {}
+        # Índice de texto para /search
+        self._search: Dict[str, SearchIndex] = {}
+        # Orden de paginación (keyset)
+        self._orders: Dict[str, PageOrder] = {}
+        # Joins declarados (izquierdo, derecho) → fila del derecho por fila del izquierdo
+        self._joins: Dict[Tuple[str, str], JoinIndex] = {}
+        # Cubos de resumen: no se descartan al recargar, se actualizan por bloques
+        self._cubes: Dict[str, SummaryCube] = {}
+        # Resultados pequeños y repetidos (agregaciones)
+        self._results = LRUCache("results", maxsize=512)
+        # Un lock por dataset: una sola carga a la vez, las demás consultas la esperan
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _load_lock(self, dataset_name: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._load_locks.setdefault(dataset_name, threading.Lock())
 
-    def _load_df(self, dataset_name: str):
-        if dataset_name not in self._cache:
-            config = DATASETS.get(dataset_name)
-            if not config:
-                raise ValueError(f"Dataset '{dataset_name}' no configurado.")
+    def _load_df(self, dataset_name: str) -> None:
+        """
+        Lee el archivo y arma índice + cubo en variables locales; se publican
+        juntos al final. Se llama con el lock del dataset tomado.
+        """
+        config = DATASETS.get(dataset_name)
+        if not config:
+            raise ValueError(f"Dataset '{dataset_name}' no configurado.")
 
-            file_path = Path(config["file"])
+        file_path = Path(config["file"])
 
-            # log.info(f"📄 Cargando dataset {dataset_name} desde {file_path}")
+        # log.info(f"📄 Cargando dataset {dataset_name} desde {file_path}")
 
-            if dataset_name == "sena_ised":
+        with span("load"):
+            if file_path.suffix == ".parquet":
                 df = pd.read_parquet(file_path)  # 🚀 ahora súper rápido
             else:
-                df = pd.read_csv(file_path, low_memory=False)
+                df = load_dataset(str(file_path))  # lector CSV de pyarrow
+
+            # Filas cercanas en el mapa quedan contiguas: bbox/vecinos leen rangos compactos
+            with span("spatial_order"):
+                order = spatial_order(df, config["lat_col"], config["lon_col"], config.get("partition", []))
+                df = df.take(order).reset_index(drop=True)
 
-            self._cache[dataset_name] = df
+            # Índices de las columnas filtrables + coordenadas
+            index = DatasetIndex(df, config["filters"] + [config["lat_col"], config["lon_col"]], source_rows=order)
+            cube = None
+            spec = config.get("cube")
+            if spec:
+                # Copia actualizada: el cubo anterior sigue respondiendo mientras tanto
+                previous = self._cubes.get(dataset_name) or SummaryCube(spec["dimensions"], spec.get("measures", []))
+                with span("cube"):
+                    cube = previous.updated(index)
 
-        return self._cache[dataset_name].copy()
+        # Publicación: índice, DataFrame y cubo juntos; luego las estructuras derivadas del anterior
+        if cube is not None:
+            self._cubes[dataset_name] = cube
+        self._cache[dataset_name] = df
+        self._indexes[dataset_name] = index
+        self._points.pop(dataset_name, None)
+        self._years.pop(dataset_name, None)
+        self._search.pop(dataset_name, None)
+        self._orders.pop(dataset_name, None)
+        for pair in [p for p in self._joins if dataset_name in p]:
+            del self._joins[pair]
 
-    def _filter_spatial(self, df: pd.DataFrame, bbox: str, lat_col: str, lon_col: str) -> pd.DataFrame:
-        """Filtra por Bounding Box (min_lon, min_lat, max_lon, max_lat)"""
+    def reload(self, dataset_id: str) -> None:
+        """Vuelve a leer el archivo del dataset (el cubo solo recalcula los bloques que cambiaron)"""
+        if dataset_id not in DATASETS:
+            raise ValueError(f"Dataset '{dataset_id}' no configurado.")
+        # Las consultas en curso siguen con el índice anterior hasta que se publica el nuevo
+        with self._load_lock(dataset_id):
+            self._load_df(dataset_id)
+        self._results.invalidate(dataset_id)
+        # Resultados de los datasets con join a este (filtros "dataset.col") también quedan viejos
+        for other, config in DATASETS.items():
+            if dataset_id in config.get("joins", {}):
+                self._results.invalidate(other)
+
+    def _get_index(self, dataset_name: str) -> DatasetIndex:
+        """Índice del dataset (sin copiar el DataFrame, solo lectura)"""
+        index = self._indexes.get(dataset_name)
+        record_cache("datasets", index is not None)
+        if index is None:
+            # Una sola carga por dataset: las demás consultas esperan a que se publique
+            with self._load_lock(dataset_name):
+                if dataset_name not in self._indexes:
+                    self._load_df(dataset_name)
+                index = self._indexes[dataset_name]
+        return index
+
+    def _bbox_predicates(self, bbox: str, lat_col: str, lon_col: str) -> List[Predicate]:
+        """Bounding Box (min_lon, min_lat, max_lon, max_lat) como rangos sobre lon/lat"""
         try:
             min_lon, min_lat, max_lon, max_lat = map(float, bbox.split(','))
-            return df[
-                (df[lon_col] >= min_lon) & (df[lon_col] <= max_lon) &
-                (df[lat_col] >= min_lat) & (df[lat_col] <= max_lat)
-            ]
         except (ValueError, AttributeError):
-            return df
-    def _df_to_geojson_optimized(self, df: pd.DataFrame, lat_col: str, lon_col: str) -> dict:
-        # 1) Convertir NaN → None para evitar el error JSON
-        df = df.replace({float('nan'): None}).dropna(subset=[lat_col, lon_col])
+            return []
+        return [
+            Predicate(lon_col, "between", [min_lon, max_lon], stage="bbox"),
+            Predicate(lat_col, "between", [min_lat, max_lat], stage="bbox"),
+        ]
 
-        # 2) Asegurar que lat/lon sean numéricos
-        df[lat_col] = pd.to_numeric(df[lat_col], errors="coerce")
-        df[lon_col] = pd.to_numeric(df[lon_col], errors="coerce")
-        df = df.dropna(subset=[lat_col, lon_col])  # eliminar filas sin coordenadas reales
+    def _positions(self, dataset_id: str, filters: Dict[str, Any], bbox: Optional[str] = None,
+                   where: Optional[str] = None, latest: bool = False) -> np.ndarray:
+        """
+        Compila filtros simples + expresión `where` + bbox en un plan ordenado
+        por selectividad y devuelve las posiciones de las filas resultantes.
+        """
+        config = DATASETS.get(dataset_id)
+        if not config:
+            raise ValueError(f"Dataset desconocido: {dataset_id}")
 
-        # 3) Construcción del GeoJSON optimizado
-        coords = df[[lon_col, lat_col]].values
-        props = df.drop(columns=[lat_col, lon_col]).where(pd.notnull(df), None).to_dict(orient="records")
+        index = self._get_index(dataset_id)
+
+        # Filtros simples (Año, Zona, etc.): igualdad, columnas desconocidas se ignoran
+        predicates = [
+            Predicate(col, "eq", val) for col, val in filters.items()
+            if val is not None and index.has_column(col)
+        ]
+        predicates, joined = self._split_joined(dataset_id, predicates + parse_filter(where))
+        if bbox:
+            predicates += self._bbox_predicates(bbox, config["lat_col"], config["lon_col"])
+
+        positions = compile_plan(predicates, index).execute(index)
+        for other, other_predicates in joined.items():
+            # Filtros sobre el dataset unido: se resuelven en su índice y se traen por el join
+            other_index = self._get_index(other)
+            matches = compile_plan(other_predicates, other_index).execute(other_index)
+            with span("join"):
+                mask = self._get_join(dataset_id, other).left_mask(matches, other_index.size)
+                positions = positions[mask[positions]]
+        if latest:
+            # Vista deduplicada: solo el reporte más reciente de cada sede
+            positions = positions[self._get_years(dataset_id).latest[positions]]
+        record_rows(dataset_id, index.size, len(positions))
+        return positions
+
+    def _select(self, dataset_id: str, filters: Dict[str, Any], bbox: Optional[str] = None,
+                where: Optional[str] = None, latest: bool = False, join: Optional[str] = None,
+                join_columns: Optional[List[str]] = None) -> pd.DataFrame:
+        positions = self._positions(dataset_id, filters, bbox, where, latest)
+        return self._project(dataset_id, positions, join, join_columns)
+
+    def _project(self, dataset_id: str, positions: np.ndarray, join: Optional[str] = None,
+                 join_columns: Optional[List[str]] = None) -> pd.DataFrame:
+        with span("projection"):
+            df = self._get_index(dataset_id).df.take(positions)
+        if join:
+            with span("join"):
+                df = df.assign(**self._join_columns(dataset_id, join, positions, join_columns))
+        return df
+
+    # ------------------------------------------------------------------
+    # Joins declarados en DATASETS[...]["joins"]
+    # ------------------------------------------------------------------
+    def _get_join(self, dataset_id: str, other: str) -> JoinIndex:
+        spec = DATASETS[dataset_id].get("joins", {}).get(other)
+        if spec is None:
+            raise FilterError(f"No hay join declarado entre '{dataset_id}' y '{other}'")
+        pair = (dataset_id, other)
+        if pair not in self._joins:
+            left, right = self._get_index(dataset_id), self._get_index(other)
+            with span("join_index"):
+                join = JoinIndex(left, right, spec["on"])
+            if join.duplicates:
+                logger.warning("Join %s → %s: %d filas de '%s' repiten la clave %s (gana la última del archivo)",
+                               dataset_id, other, join.duplicates, other, spec["on"])
+            self._joins[pair] = join
+        return self._joins[pair]
+
+    def _split_joined(self, dataset_id: str, predicates: List[Predicate]):
+        """Separa los predicados "otro_dataset.columna" (por dataset unido) del resto"""
+        joins = DATASETS[dataset_id].get("joins", {})
+        local, joined = [], {}
+        for p in predicates:
+            other, _, column = p.column.partition(".")
+            if column and other in joins:
+                joined.setdefault(other, []).append(Predicate(column, p.op, p.value, stage="join"))
+            else:
+                local.append(p)
+        return local, joined
+
+    def _join_columns(self, dataset_id: str, other: str, positions: np.ndarray,
+                      columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        join = self._get_join(dataset_id, other)
+        other_config, other_df = DATASETS[other], self._get_index(other).df
+        if not columns:
+            skip = set(join.on) | {other_config["lat_col"], other_config["lon_col"]}
+            columns = [c for c in other_df.columns if c not in skip]
+        for col in columns:
+            if col not in other_df.columns:
+                raise FilterError(f"Columna '{col}' no existe en '{other}'")
+        return join.project(other_df, positions, columns, other)
+
+    @staticmethod
+    def query_key(filters: Dict[str, Any], bbox: Optional[str], where: Optional[str], latest: bool = False) -> tuple:
+        """Clave canónica de un conjunto de filtros (para caches de resultados)"""
+        simple = tuple(sorted((k, str(v)) for k, v in filters.items() if v is not None))
+        key = simple, bbox or None, (where or "").strip() or None
+        return key + ("latest",) if latest else key
+    def _df_to_geojson_optimized(self, df: pd.DataFrame, lat_col: str, lon_col: str,
+                                 precision: Optional[int] = None) -> dict:
+        # 1) Asegurar que lat/lon sean numéricos y eliminar filas sin coordenadas reales
+        lat = pd.to_numeric(df[lat_col], errors="coerce").to_numpy(dtype=np.float64)
+        lon = pd.to_numeric(df[lon_col], errors="coerce").to_numpy(dtype=np.float64)
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+        if precision is not None:
+            lat, lon = np.round(lat, precision), np.round(lon, precision)
+
+        # 2) Construcción del GeoJSON (NaN → null lo resuelve el serializador)
+        coords = np.column_stack([lon[valid], lat[valid]]).tolist()
+        props = df.drop(columns=[lat_col, lon_col])[valid].to_dict(orient="records")
 
         return {
             "type": "FeatureCollection",
@@ -80,64 +306,396 @@ class QueryEngine:
         }
 
 
-    def get_data(self, dataset_id: str, format: str, filters: Dict[str, Any], bbox: Optional[str] = None, elevation_col: Optional[str] = None):
+    def get_data(self, dataset_id: str, format: str, filters: Dict[str, Any], bbox: Optional[str] = None,
+                 elevation_col: Optional[str] = None, where: Optional[str] = None, latest: bool = False,
+                 precision: Optional[int] = DEFAULT_PRECISION):
         config = DATASETS.get(dataset_id)
         if not config:
             raise ValueError(f"Dataset desconocido: {dataset_id}")
 
-        df = self._load_df(dataset_id)
+        # 1. Filtros de atributos + expresión + BBOX en un solo plan
+        df = self.select(dataset_id, filters, bbox, where, latest)
+
+        # 2. Retornar formato
+        with span("encode"):
+            return self.format_data(df, dataset_id, format, elevation_col, precision)
 
-        # 1. Aplicar Filtros de Atributos (Año, Zona, etc.)
-        for col, val in filters.items():
-            if val is not None and col in df.columns:
-                # Filtro tolerante a tipos (str vs int)
-                df = df[df[col].astype(str) == str(val)]
+    def select(self, dataset_id: str, filters: Dict[str, Any], bbox: Optional[str] = None,
+               where: Optional[str] = None, latest: bool = False, join: Optional[str] = None,
+               join_columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Filas que cumplen los filtros (parte de la consulta que necesita los índices).
+        Con `latest=True` se queda con una fila por sede: la de su último año reportado.
+        Con `join` se agregan columnas "join.col" del dataset unido (declarado en DATASETS).
+        """
+        if dataset_id not in DATASETS:
+            raise ValueError(f"Dataset desconocido: {dataset_id}")
+        return self._select(dataset_id, filters, bbox, where, latest, join, join_columns)
+
+    # ------------------------------------------------------------------
+    # Modo out-of-core: el Parquet se lee por lotes, sin índices en memoria
+    # ------------------------------------------------------------------
+    def is_scanned(self, dataset_id: str) -> bool:
+        config = DATASETS.get(dataset_id)
+        if not config:
+            raise ValueError(f"Dataset desconocido: {dataset_id}")
+        return should_scan(config)
 
-        # 2. Aplicar Filtro Espacial (BBOX)
+    def scan(self, dataset_id: str, filters: Dict[str, Any], bbox: Optional[str] = None,
+             where: Optional[str] = None) -> Iterator[pd.DataFrame]:
+        """
+        Lotes de filas que cumplen filtros + expresión + bbox, leídos del Parquet
+        con poda de row groups por estadísticas. La memoria queda acotada por el
+        tamaño de lote, no por el del dataset.
+        """
+        config = DATASETS.get(dataset_id)
+        if not config:
+            raise ValueError(f"Dataset desconocido: {dataset_id}")
+        # Como en memoria: los filtros simples solo aplican a las columnas filtrables
+        predicates = [
+            Predicate(col, "eq", val) for col, val in filters.items()
+            if val is not None and col in config["filters"]
+        ]
+        local, joined = self._split_joined(dataset_id, predicates + parse_filter(where))
+        if joined:
+            raise FilterError("Los filtros sobre datasets unidos no están disponibles en modo por lotes")
         if bbox:
-            df = self._filter_spatial(df, bbox, config["lat_col"], config["lon_col"])
+            local += self._bbox_predicates(bbox, config["lat_col"], config["lon_col"])
+        return scan_batches(config["file"], local)
+
+    def _get_order(self, dataset_id: str) -> PageOrder:
+        if dataset_id not in self._orders:
+            index = self._get_index(dataset_id)
+            with span("page_order"):
+                self._orders[dataset_id] = PageOrder(index, DATASETS[dataset_id].get("order", []))
+        return self._orders[dataset_id]
+
+    def select_page(self, dataset_id: str, filters: Dict[str, Any], bbox: Optional[str] = None,
+                    where: Optional[str] = None, latest: bool = False, limit: int = 1000,
+                    cursor: Optional[str] = None, join: Optional[str] = None,
+                    join_columns: Optional[List[str]] = None) -> Tuple[pd.DataFrame, int, Optional[str]]:
+        """
+        Una página del resultado en el orden estable del dataset: (filas, total
+        de filas que cumplen los filtros, cursor de la página siguiente o None).
+        Solo se materializan las filas de la página.
+        """
+        if dataset_id not in DATASETS:
+            raise ValueError(f"Dataset desconocido: {dataset_id}")
+        positions = self._positions(dataset_id, filters, bbox, where, latest)
+        with span("paginate"):
+            page, next_cursor = self._get_order(dataset_id).page(positions, limit, cursor)
+        return self._project(dataset_id, page, join, join_columns), len(positions), next_cursor
+
+    def _get_points(self, dataset_id: str) -> PointIndex:
+        if dataset_id not in self._points:
+            config = DATASETS[dataset_id]
+            index = self._get_index(dataset_id)
+            with span("spatial_index"):
+                self._points[dataset_id] = PointIndex(
+                    index.column(config["lat_col"]).numeric, index.column(config["lon_col"]).numeric
+                )
+        return self._points[dataset_id]
+
+    def _allowed(self, dataset_id: str, filters: Dict[str, Any], bbox: Optional[str],
+                 where: Optional[str], latest: bool = False) -> Optional[np.ndarray]:
+        """Máscara de filas que cumplen los filtros (None si no hay filtros)"""
+        if not (filters or bbox or where or latest):
+            return None
+        index = self._get_index(dataset_id)
+        mask = np.zeros(index.size, dtype=bool)
+        mask[self._positions(dataset_id, filters, bbox, where, latest)] = True
+        return mask
+
+    def _with_distance(self, dataset_id: str, positions: np.ndarray, distances: np.ndarray) -> pd.DataFrame:
+        with span("projection"):
+            df = self._get_index(dataset_id).df.take(positions)
+            df["distance_km"] = np.round(distances, 4)
+        return df
+
+    def get_nearest(self, dataset_id: str, lat: float, lon: float, k: int, filters: Dict[str, Any],
+                    bbox: Optional[str] = None, where: Optional[str] = None, latest: bool = False) -> pd.DataFrame:
+        """
+        Las `k` sedes más cercanas al punto que cumplen los filtros (con `distance_km`).
+        Con `latest=True` cada sede cuenta una vez (su último reporte), no una por año.
+        """
+        if dataset_id not in DATASETS:
+            raise ValueError(f"Dataset desconocido: {dataset_id}")
+        allowed = self._allowed(dataset_id, filters, bbox, where, latest)
+        with span("spatial"):
+            positions, distances = self._get_points(dataset_id).nearest(lat, lon, k, allowed)
+        return self._with_distance(dataset_id, positions, distances)
+
+    def get_within(self, dataset_id: str, lat: float, lon: float, radius_km: float, filters: Dict[str, Any],
+                   bbox: Optional[str] = None, where: Optional[str] = None,
+                   limit: Optional[int] = None, latest: bool = False) -> pd.DataFrame:
+        """Sedes a menos de `radius_km` del punto, de la más cercana a la más lejana"""
+        if dataset_id not in DATASETS:
+            raise ValueError(f"Dataset desconocido: {dataset_id}")
+        allowed = self._allowed(dataset_id, filters, bbox, where, latest)
+        with span("spatial"):
+            positions, distances = self._get_points(dataset_id).within(lat, lon, radius_km, allowed)
+        return self._with_distance(dataset_id, positions[:limit], distances[:limit])
+
+    def _get_years(self, dataset_id: str) -> YearMatrix:
+        config = DATASETS[dataset_id].get("timeseries")
+        if not config:
+            raise ValueError(f"El dataset '{dataset_id}' no tiene serie de tiempo por sede")
+        if dataset_id not in self._years:
+            with span("year_matrix"):
+                self._years[dataset_id] = YearMatrix(self._get_index(dataset_id), config["key"], config["year"])
+        return self._years[dataset_id]
+
+    def get_changes(self, dataset_id: str, from_year: int, to_year: int, group_by: List[str],
+                    change: Optional[str], filters: Dict[str, Any], bbox: Optional[str] = None,
+                    where: Optional[str] = None) -> dict:
+        """
+        Cambios de conectividad entre dos años por sede (o agregados por área):
+        nuevas conectadas, pérdidas de conectividad y delta de ancho de banda.
+        Los filtros aplican a las filas de cualquiera de los dos años.
+        """
+        if dataset_id not in DATASETS:
+            raise ValueError(f"Dataset desconocido: {dataset_id}")
+        key = (dataset_id, "changes", from_year, to_year, tuple(group_by), change,
+               self.query_key(filters, bbox, where))
+        cached = self._results.get(key)
+        if cached is not None:
+            return cached
+
+        matrix = self._get_years(dataset_id)
+        config = DATASETS[dataset_id]["timeseries"]
+        index = self._get_index(dataset_id)
+        for col in (config["connected"], config["bandwidth"]):
+            if not index.has_column(col):
+                raise FilterError(f"Columna '{col}' no existe")
+        try:
+            before, after = matrix.year_rows(from_year), matrix.year_rows(to_year)
+        except ValueError as e:
+            raise FilterError(str(e))
+
+        # Sedes con reporte (que cumpla los filtros) en alguno de los dos años
+        allowed = self._allowed(dataset_id, filters, bbox, where)
+        if allowed is None:
+            present = (before >= 0) | (after >= 0)
+        else:
+            present = ((before >= 0) & allowed[np.maximum(before, 0)]) | ((after >= 0) & allowed[np.maximum(after, 0)])
+        sedes = np.flatnonzero(present)
+        before, after = before[sedes], after[sedes]
+
+        with span("timeseries"):
+            flags = connected_flags(index.column(config["connected"]))
+            connected_before, connected_after = YearMatrix.take(flags, before), YearMatrix.take(flags, after)
+            bandwidth = index.column(config["bandwidth"]).numeric
+            bandwidth_before, bandwidth_after = YearMatrix.take(bandwidth, before), YearMatrix.take(bandwidth, after)
+            delta = bandwidth_after - bandwidth_before
+            status = change_status(connected_before, connected_after)
+            counts = np.bincount(status, minlength=len(STATUSES))
+
+        result = {
+            "from_year": from_year,
+            "to_year": to_year,
+            "sedes": int(len(sedes)),
+            "summary": {name: int(counts[i]) for i, name in enumerate(STATUSES)},
+        }
+        if group_by:
+            # Atributos del área: los del año final (o del inicial si no reportó)
+            reference = np.where(after >= 0, after, before)
+            result["groups"] = summarize_changes(index, reference, status, delta, group_by)
+        else:
+            keep = status == STATUSES.index(change) if change else slice(None)
+            table = pd.DataFrame({
+                matrix.key_col: matrix.keys[sedes][keep],
+                "status": np.array(STATUSES)[status][keep],
+                f"connected_{from_year}": flags_to_bool(connected_before)[keep],
+                f"connected_{to_year}": flags_to_bool(connected_after)[keep],
+                f"bandwidth_{from_year}": bandwidth_before[keep],
+                f"bandwidth_{to_year}": bandwidth_after[keep],
+                "bandwidth_delta": delta[keep],
+            })
+            result["data"] = table.astype(object).where(table.notna(), None).to_dict(orient="records")
+
+        self._results.put(key, result)
+        return result
+
+    def _get_search(self, dataset_id: str) -> SearchIndex:
+        if dataset_id not in self._search:
+            config = DATASETS[dataset_id]
+            index = self._get_index(dataset_id)
+            # Un documento por sede (su último reporte) si el dataset está en formato largo
+            if config.get("timeseries"):
+                docs = np.flatnonzero(self._get_years(dataset_id).latest)
+            else:
+                docs = np.arange(index.size)
+            with span("search_index"):
+                self._search[dataset_id] = SearchIndex(index, config.get("search", []), docs)
+        return self._search[dataset_id]
+
+    def search(self, dataset_id: str, query: str, limit: int = 10) -> List[dict]:
+        """Búsqueda tipo typeahead por nombre/código (sin tildes), con coordenadas"""
+        if dataset_id not in DATASETS:
+            raise ValueError(f"Dataset desconocido: {dataset_id}")
+        search_index = self._get_search(dataset_id)
+        with span("search"):
+            hits = search_index.search(query, limit)
+        if not hits:
+            return []
+
+        config = DATASETS[dataset_id]
+        index = self._get_index(dataset_id)
+        columns = search_index.fields + [c for c in (config["lat_col"], config["lon_col"]) if c not in search_index.fields]
+        rows = index.df.take(search_index.doc_rows[[h["doc"] for h in hits]])[columns]
+        records = rows.to_dict(orient="records")
+        return [
+            {"match": hit["field"], "score": hit["score"], **record}
+            for hit, record in zip(hits, records)
+        ]
+
+    def format_data(self, df: pd.DataFrame, dataset_id: str, format: str, elevation_col: Optional[str] = None,
+                    precision: Optional[int] = DEFAULT_PRECISION, rounded: Tuple[str, ...] = ()):
+        """
+        Convierte las filas seleccionadas al formato de salida (parte CPU pura, sin estado).
+        La geometría se redondea a `precision` decimales (None = sin redondear); las
+        columnas de atributos solo si coinciden con `rounded` (nombres o comodines).
+        """
+        config = DATASETS[dataset_id]
+        lat_col, lon_col = config["lat_col"], config["lon_col"]
+        if precision is not None and rounded:
+            df = round_columns(df, matching_columns(df.columns, rounded), precision)
 
-        # 3. Retornar formato
         if format == "geojson":
-            return self._df_to_geojson_optimized(df, config["lat_col"], config["lon_col"])
+            return self._df_to_geojson_optimized(df, lat_col, lon_col, precision)
 
-        elif format == "columnar":
-            return self._df_to_columnar(df, config["lat_col"], config["lon_col"], elevation_col)
+        if format == "columnar":
+            # position = geometría
+            if precision is not None:
+                df = round_columns(df, [lat_col, lon_col], precision)
+            return self._df_to_columnar(df, lat_col, lon_col, elevation_col)
         
-        else: # JSON normal
-            return df.to_dict(orient="records") 
+        else: # JSON normal (NaN → null lo resuelve el serializador)
+            return df.to_dict(orient="records")
 
-    def get_classification_breaks(self, dataset_id: str, field: str, method: str, bins: int):
-        """Calcula cortes para leyendas dinámicas"""
-        df = self._load_df(dataset_id)
-        
-        if field not in df.columns:
+    def get_aggregate(self, dataset_id: str, group_by: List[str], metrics: str, filters: Dict[str, Any],
+                      bbox: Optional[str] = None, where: Optional[str] = None, latest: bool = False) -> dict:
+        """
+        Estadísticas por grupo (ej: sedes por departamento, promedio ISED por municipio).
+        Con `latest=True` sobre el último reporte de cada sede (no pasa por el cubo).
+        """
+        parsed = parse_metrics(metrics)
+        key = (dataset_id, "aggregate", tuple(group_by), tuple(parsed),
+               self.query_key(filters, bbox, where, latest))
+
+        cached = self._results.get(key)
+        if cached is None:
+            from_cube = None if latest else self._cube_for(dataset_id, filters, bbox, where, group_by, parsed)
+            if from_cube:
+                cube, predicates = from_cube
+                with span("cube"):
+                    total, rows = cube.aggregate(predicates, group_by, parsed)
+            else:
+                positions = self._positions(dataset_id, filters, bbox, where, latest)
+                rows = aggregate(self._get_index(dataset_id), positions, group_by, parsed)
+                total = len(positions)
+            cached = {
+                "group_by": group_by,
+                "metrics": [metric_name(f, c) for f, c in parsed],
+                "rows": int(total),
+                "groups": rows,
+            }
+            self._results.put(key, cached)
+        return cached
+
+    def _cube_for(self, dataset_id: str, filters: Dict[str, Any], bbox: Optional[str], where: Optional[str],
+                  group_by: List[str], metrics: List[Tuple[str, Optional[str]]]):
+        """(cubo, predicados) si la consulta se responde con el cubo de resumen; None si no"""
+        index = self._get_index(dataset_id)
+        cube = self._cubes.get(dataset_id)
+        if cube is None or bbox:
+            return None
+        predicates = [
+            Predicate(col, "eq", val) for col, val in filters.items()
+            if val is not None and index.has_column(col)
+        ] + parse_filter(where)
+        hit = cube.answers(predicates, group_by, metrics)
+        record_cache("cube", hit)
+        return (cube, predicates) if hit else None
+
+    def get_choropleth(self, dataset_id: str, level: str, zoom: float, metrics: str, filters: Dict[str, Any],
+                       bbox: Optional[str] = None, where: Optional[str] = None, latest: bool = False) -> bytes:
+        """
+        Polígonos de departamento/municipio (geometría simplificada y cacheada
+        por zoom) con los indicadores agregados de los puntos que caen en cada uno.
+        """
+        config = DATASETS.get(dataset_id)
+        if not config:
+            raise ValueError(f"Dataset desconocido: {dataset_id}")
+        key_col = config.get("admin_keys", {}).get(level)
+        if not key_col:
+            raise ValueError(f"El dataset '{dataset_id}' no tiene código para el nivel '{level}'")
+
+        layer = get_admin_layer(level)
+        result = self.get_aggregate(dataset_id, [key_col], metrics, filters, bbox, where, latest)
+
+        attributes = {}
+        for row in result["groups"]:
+            code = normalize_code(row[key_col], layer.width)
+            attributes[code] = {k: v for k, v in row.items() if k != key_col}
+        empty = {m: (0 if m.startswith("count") else None) for m in result["metrics"]}
+
+        return layer.to_geojson(zoom, attributes, empty)
+
+    def get_classification_breaks(self, dataset_id: str, field: str, method: str, bins: int,
+                                  filters: Optional[Dict[str, Any]] = None, bbox: Optional[str] = None,
+                                  where: Optional[str] = None, latest: bool = False):
+        """Calcula cortes para leyendas dinámicas (sobre los índices, memoizado por filtros)"""
+        filters = filters or {}
+        key = (dataset_id, "breaks", field, method, bins, self.query_key(filters, bbox, where, latest))
+        cached = self._results.get(key)
+        if cached is not None:
+            return cached
+
+        index = self._get_index(dataset_id)
+        if not index.has_column(field):
             raise ValueError(f"Columna '{field}' no existe")
-            
-        series = df[field].dropna()
-        
+
+        col = index.column(field)
+        filtered = bool(filters) or bool(bbox) or bool(where) or latest
+
         if method == "unique":
-            counts = series.value_counts().to_dict()
-            return {"type": "categorical", "stats": counts}
-            
-        # Lógica numérica con Numpy
-        values = pd.to_numeric(series, errors='coerce').dropna().values
-        
+            from_cube = None if latest else self._cube_for(dataset_id, filters, bbox, where, [field], [("count", None)])
+            if from_cube:
+                cube, predicates = from_cube
+                counts = cube.counts(predicates, field)
+            else:
+                positions = self._positions(dataset_id, filters, bbox, where, latest) if filtered else None
+                codes = col.codes if positions is None else col.codes[positions]
+                counts = np.bincount(codes[codes >= 0], minlength=len(col.categories))
+            top = np.flatnonzero(counts)[np.argsort(-counts[counts > 0], kind="stable")]
+            result = {"type": "categorical", "stats": {col.categories[i]: int(counts[i]) for i in top}}
+            self._results.put(key, result)
+            return result
+
+        # Lógica numérica sobre la vista presorteada
+        positions = self._positions(dataset_id, filters, bbox, where, latest) if filtered else None
+        values = subset_sorted(col, positions)
+
         if len(values) == 0:
             return {"error": "No hay datos numéricos válidos"}
 
         if method == "quantile":
-            breaks = np.quantile(values, np.linspace(0, 1, bins + 1)).tolist()
+            breaks = quantile_breaks(values, bins)
+        elif method == "jenks":
+            breaks = jenks_breaks(values, bins)
         else: # equal_interval
-            breaks = np.linspace(values.min(), values.max(), bins + 1).tolist()
+            breaks = equal_interval_breaks(values, bins)
 
-        return {
+        result = {
             "type": "numerical",
-            "min": float(values.min()),
-            "max": float(values.max()),
+            "min": float(values[0]),
+            "max": float(values[-1]),
             "breaks": breaks,
             "method": method
         }
+        self._results.put(key, result)
+        return result
     
     def _df_to_columnar(self, df: pd.DataFrame, lat_col: str, lon_col: str, elevation_col: str = None) -> List[dict]:
         """
@@ -185,4 +743,61 @@ class QueryEngine:
             
         return data
 # Singleton
-query_engine = QueryEngine()
\ No newline at end of file
+query_engine = QueryEngine()
+
+
+def data_key(dataset_id: str, format: str, elevation_col: Optional[str], precision: Optional[int],
+             rounded: Tuple[str, ...], key: tuple) -> tuple:
+    """Clave del executor para el cuerpo de /data (la usan también el agente y /sedes/connectividad)"""
+    return ("data", dataset_id, format, elevation_col, precision, tuple(rounded), key)
+
+
+def encode_data(df: pd.DataFrame, dataset_id: str, format: str, elevation_col: Optional[str] = None,
+                precision: Optional[int] = DEFAULT_PRECISION, rounded: Tuple[str, ...] = ()) -> bytes:
+    """
+    Serializa la respuesta de /data a bytes (JSON o FlatGeobuf). Es una función
+    de módulo (picklable) para poder correr en el pool de procesos del executor.
+    """
+    if format == "fgb":
+        config = DATASETS[dataset_id]
+        return encode_fgb(df, config["lat_col"], config["lon_col"], dataset_id, precision=precision)
+
+    data = query_engine.format_data(df, dataset_id, format, elevation_col, precision, rounded)
+    payload = data if format == "geojson" else {"dataset": dataset_id, "count": len(data), "data": data}
+    return dumps(payload)
+
+
+def iter_encoded(batches: Iterator[pd.DataFrame], dataset_id: str, format: str,
+                 elevation_col: Optional[str] = None, precision: Optional[int] = DEFAULT_PRECISION,
+                 rounded: Tuple[str, ...] = ()) -> Iterator[bytes]:
+    """
+    Respuesta de /data por partes a partir de lotes (modo out-of-core): mismos
+    formatos que encode_data, con `count` al final del objeto en json/columnar.
+    """
+    if format == "fgb":
+        config = DATASETS[dataset_id]
+        yield from iter_fgb_batches(batches, config["lat_col"], config["lon_col"], dataset_id, precision=precision)
+        return
+
+    if format == "geojson":
+        yield b'{"type":"FeatureCollection","features":['
+    else:
+        yield b'{"dataset":' + dumps(dataset_id) + b',"data":['
+    count = 0
+    for df in batches:
+        data = query_engine.format_data(df, dataset_id, format, elevation_col, precision, rounded)
+        records = data["features"] if format == "geojson" else data
+        if records:
+            # Cada lote es un arreglo JSON: se quitan los corchetes y se encadena
+            yield (b"," if count else b"") + dumps(records)[1:-1]
+            count += len(records)
+    yield b"]}" if format == "geojson" else b'],"count":' + dumps(count) + b"}"
+
+
+def encode_page(page: Tuple[pd.DataFrame, int, Optional[str]], dataset_id: str,
+                precision: Optional[int] = DEFAULT_PRECISION, rounded: Tuple[str, ...] = ()) -> bytes:
+    """Serializa una página de /data?format=json&limit=... (picklable, como encode_data)"""
+    df, total, next_cursor = page
+    data = query_engine.format_data(df, dataset_id, "json", precision=precision, rounded=rounded)
+    payload = {"dataset": dataset_id, "count": len(data), "total": total, "next_cursor": next_cursor, "data": data}
+    return dumps(payload)
@@ -0,0 +1,176 @@
+"""
+Modo out-of-core: consultas sobre Parquet por lotes con pyarrow.dataset.
+
+Los predicados (filtros simples, expresión `filter` y bbox) se traducen a una
+expresión de pyarrow: el scanner descarta row groups completos con sus
+estadísticas min/max y filtra el resto lote a lote. Nunca se carga el
+dataset entero; en memoria solo hay unos pocos lotes a la vez.
+"""
+import itertools
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as pads
+
+from core.settings import settings
+from services.filters import RANGE_OPS, FilterError, Predicate
+from services.indexes import _NUMBER_RE
+
+BATCH_ROWS = 65_536
+# Texto que pd.to_numeric convierte directo (lo demás → NaN)
+_FLOAT_RE = r"^\s*[-+]?(\d+(\.\d*)?|\.\d+)([eE][-+]?\d+)?\s*$"
+# (archivo, mtime, columna) → ¿se extrae el primer número del texto? (como numeric_values)
+_EXTRACT: Dict[Tuple[str, float, str], bool] = {}
+
+
+def should_scan(config: dict) -> bool:
+    """Se consulta por lotes si el dataset lo declara o si su Parquet supera el umbral"""
+    path = Path(config["file"])
+    if path.suffix != ".parquet":
+        return False
+    if config.get("scan"):
+        return True
+    limit = settings.SCAN_THRESHOLD_MB
+    return limit > 0 and path.exists() and path.stat().st_size > limit * 1e6
+
+
+def _as_type(values: List[float], field_type: pa.DataType) -> list:
+    # Los enteros se comparan como enteros para que sirvan las estadísticas del row group
+    if pa.types.is_integer(field_type):
+        return [int(v) for v in values if float(v).is_integer()]
+    return values
+
+
+def to_expression(predicate: Predicate, schema: pa.Schema) -> pc.Expression:
+    """Misma semántica que Predicate._mask, como expresión de pyarrow"""
+    if predicate.column not in schema.names:
+        raise FilterError(f"Columna '{predicate.column}' no existe")
+    field = pc.field(predicate.column)
+    field_type = schema.field(predicate.column).type
+    numeric = pa.types.is_integer(field_type) or pa.types.is_floating(field_type)
+
+    if predicate.op == "null":
+        return field.is_null() if predicate.value else field.is_valid()
+
+    if predicate.op == "contains":
+        return pc.match_substring(field.cast(pa.string()), str(predicate.value), ignore_case=True)
+
+    if predicate.op in ("eq", "in"):
+        if numeric:
+            return field.isin(_as_type(predicate._numbers().tolist(), field_type))
+        if pa.types.is_string(field_type) or pa.types.is_large_string(field_type):
+            return field.isin(predicate._texts())
+        return field.cast(pa.string()).isin(predicate._texts())
+
+    # Rangos sobre texto: se evalúan por lote (_text_range), no como expresión
+    if not numeric:
+        raise FilterError(f"Rango sobre columna de texto '{predicate.column}': usar _text_range")
+    return _range(field, predicate)
+
+
+def _range(value, predicate: Predicate):
+    low, high, low_inc, high_inc = predicate._limits()
+    expr = pc.is_valid(value)
+    if low is not None:
+        expr = pc.and_kleene(expr, pc.greater_equal(value, low) if low_inc else pc.greater(value, low))
+    if high is not None:
+        expr = pc.and_kleene(expr, pc.less_equal(value, high) if high_inc else pc.less(value, high))
+    return expr
+
+
+def _is_text_range(predicate: Predicate, schema: pa.Schema) -> bool:
+    if predicate.op not in RANGE_OPS | {"between"} or predicate.column not in schema.names:
+        return False
+    field_type = schema.field(predicate.column).type
+    return not (pa.types.is_integer(field_type) or pa.types.is_floating(field_type))
+
+
+def _extracts(path: str, dataset: pads.Dataset, column: str) -> bool:
+    """
+    Misma decisión que numeric_values sobre toda la columna: si menos de la mitad
+    de los valores presentes parsea directo, se extrae el primer número del texto.
+    Se lee solo esa columna (una vez por archivo y columna).
+    """
+    key = (path, Path(path).stat().st_mtime, column)
+    if key not in _EXTRACT:
+        present = parsed = 0
+        for batch in dataset.to_batches(columns=[column], batch_size=BATCH_ROWS):
+            text = pc.cast(batch.column(0), pa.string())
+            present += pc.count(text).as_py()
+            parsed += pc.sum(pc.match_substring_regex(text, _FLOAT_RE)).as_py() or 0
+        _EXTRACT[key] = bool(present) and parsed < present / 2
+    return _EXTRACT[key]
+
+
+def _text_numbers(column: pa.Array, extract: bool) -> pa.Array:
+    """Texto → float64 como numeric_values: lo que no es número queda nulo, sin error"""
+    text = pc.cast(column, pa.string())
+    if extract:
+        pattern = "(?P<n>" + _NUMBER_RE[1:]
+        text = pc.replace_substring(pc.struct_field(pc.extract_regex(text, pattern), [0]), ",", ".")
+    else:
+        text = pc.if_else(pc.match_substring_regex(text, _FLOAT_RE), pc.utf8_trim_whitespace(text), None)
+    return pc.cast(text, pa.float64())
+
+
+def scan_batches(path: str, predicates: List[Predicate], columns: Optional[List[str]] = None,
+                 batch_rows: int = BATCH_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Lotes (DataFrames) con las filas que cumplen todos los predicados. El filtro
+    se valida y el primer lote se lee aquí, antes de empezar a responder: un
+    error de Arrow llega como FilterError (400) y no como un 200 truncado.
+    Siempre hay al menos un lote (vacío si nada coincide) con las columnas del resultado.
+    """
+    dataset = pads.dataset(path, format="parquet")
+    expr = None
+    residual = []
+    for predicate in predicates:
+        if _is_text_range(predicate, dataset.schema):
+            # Rango sobre texto ("100 Mbps"): se convierte a número lote a lote
+            residual.append((predicate, _extracts(path, dataset, predicate.column)))
+            continue
+        part = to_expression(predicate, dataset.schema)
+        expr = part if expr is None else expr & part
+    read = columns
+    if columns is not None:
+        read = columns + [p.column for p, _ in residual if p.column not in columns]
+    try:
+        scanner = dataset.scanner(columns=read, filter=expr, batch_size=batch_rows,
+                                  batch_readahead=1, fragment_readahead=1)
+        batches = _batches(scanner, residual, columns)
+        first = next(batches)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        raise FilterError(f"Filtro no aplicable en modo por lotes: {e}")
+    return itertools.chain([first], batches)
+
+
+def _batches(scanner: pads.Scanner, residual: List[Tuple[Predicate, bool]],
+             columns: Optional[List[str]]) -> Iterator[pd.DataFrame]:
+    empty = True
+    for batch in scanner.to_batches():
+        for predicate, extract in residual:
+            if not batch.num_rows:
+                break
+            values = _text_numbers(batch.column(predicate.column), extract)
+            batch = batch.filter(pc.fill_null(_range(values, predicate), False))
+        if batch.num_rows:
+            empty = False
+            yield _to_pandas(batch.select(columns) if columns is not None else batch)
+    if empty:
+        schema = scanner.projected_schema
+        yield _to_pandas(schema.empty_table().select(columns) if columns is not None else schema.empty_table())
+
+
+def _to_pandas(data) -> pd.DataFrame:
+    # Enteros con nulos → Int64: el tipo de cada columna no cambia entre lotes
+    return data.to_pandas(types_mapper=_NULLABLE.get)
+
+
+_NULLABLE = {
+    pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(), pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(), pa.uint8(): pd.UInt8Dtype(), pa.uint16(): pd.UInt16Dtype(),
+    pa.uint32(): pd.UInt32Dtype(), pa.uint64(): pd.UInt64Dtype(), pa.bool_(): pd.BooleanDtype(),
+}
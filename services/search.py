@@ -0,0 +1,218 @@
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from services.indexes import DatasetIndex
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: Any) -> str:
+    """Minúsculas, sin tildes y sin puntuación: 'Bogotá, D.C.' → 'bogota d c'"""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def trigrams(text: str) -> set:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Largo de los prefijos de palabra indexados (búsqueda binaria)
+PREFIX = 8
+# Candidatos verificados por bloque cuando ya vienen en orden de resultado
+CHUNK = 2048
+
+
+class SearchIndex:
+    """
+    Índice de trigramas sobre los valores distintos (categorías) de las
+    columnas de texto, resuelto a "documentos" = una fila por sede.
+
+    Orden de resultados: coincidencia exacta, prefijo, inicio de palabra,
+    subcadena; luego por orden del campo, largo y texto. Las entradas se
+    numeran en ese orden de desempate, así que una lista de candidatos
+    ordenada por número ya está en orden de resultado y se verifica por
+    bloques hasta juntar `limit` documentos.
+
+    - Inicios de palabra (niveles 0-2): búsqueda binaria sobre los prefijos
+      de palabra ordenados; consultas de menos de PREFIX caracteres no
+      necesitan verificar texto, solo se ordenan los mejores (partición).
+    - Subcadenas (nivel 3): intersección de las listas de trigramas.
+    """
+
+    def __init__(self, index: DatasetIndex, fields: List[str], doc_rows: np.ndarray):
+        self.fields = [f for f in fields if index.has_column(f)]
+        self.doc_rows = doc_rows
+
+        texts, entry_field, entry_code = [], [], []
+        # Por campo: documentos ordenados por código, para pasar de categoría a sedes
+        self._doc_order, self._doc_bounds = [], []
+        for f, field in enumerate(self.fields):
+            col = index.column(field)
+            for code, value in enumerate(col.categories):
+                texts.append(normalize(value))
+                entry_field.append(f)
+                entry_code.append(code)
+            doc_codes = col.codes[doc_rows]
+            order = np.argsort(doc_codes, kind="stable")
+            self._doc_order.append(order)
+            self._doc_bounds.append(np.searchsorted(doc_codes[order], np.arange(len(col.categories) + 1)))
+
+        # Texto normalizado = ASCII: bytes ocupan la cuarta parte que str de numpy
+        texts_array = np.asarray(texts, dtype=bytes) if texts else np.zeros(0, dtype="S1")
+        lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+        # Entradas numeradas por (campo, largo, texto): el número es el desempate
+        order = np.lexsort((texts_array, lengths, np.asarray(entry_field)))
+        self.texts = [texts[i] for i in order.tolist()]
+        self.entry_field = np.asarray(entry_field, dtype=np.int32)[order]
+        self.entry_code = np.asarray(entry_code, dtype=np.int64)[order]
+        self.lengths = lengths[order]
+        self._texts_array = texts_array[order]
+
+        postings = defaultdict(list)
+        prefixes, prefix_entry, prefix_start = [], [], []
+        for i, text in enumerate(self.texts):
+            for gram in trigrams(text):
+                postings[gram].append(i)
+            start = 0
+            while True:
+                prefixes.append(text[start:start + PREFIX])
+                prefix_entry.append(i)
+                prefix_start.append(start == 0)
+                start = text.find(" ", start) + 1
+                if not start:
+                    break
+        self.postings = {g: np.asarray(ids, dtype=np.int32) for g, ids in postings.items()}
+
+        # Prefijos de palabra ordenados ("sede san jose" → "sede san", "san jose", "jose");
+        # a igual prefijo quedan por número de entrada (orden estable)
+        prefixes = np.asarray(prefixes, dtype=f"S{PREFIX}")
+        order = np.argsort(prefixes, kind="stable")
+        self._prefixes = prefixes[order]
+        self._prefix_entry = np.asarray(prefix_entry, dtype=np.int32)[order]
+        # Largo del texto si la palabra es la primera, -1 si no
+        self._prefix_length = np.where(np.asarray(prefix_start, dtype=bool)[order],
+                                       self.lengths[self._prefix_entry], -1)
+        # Consultas de 1-2 letras: pocas posibles y con rangos enormes, se guardan ya resueltas
+        self._short: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
+
+    def _prefix_range(self, needle: bytes) -> slice:
+        """Prefijos de palabra que empiezan por `needle` (recortado a PREFIX)"""
+        needle = needle[:PREFIX]
+        lo = np.searchsorted(self._prefixes, needle, side="left")
+        if len(needle) == PREFIX:
+            hi = np.searchsorted(self._prefixes, needle, side="right")
+        else:
+            # "~" va después de [a-z0-9 ]: cierra el rango de todo lo que empieza por needle
+            hi = np.searchsorted(self._prefixes, needle + b"~", side="left")
+        return slice(lo, hi)
+
+    def _candidates(self, query: str) -> np.ndarray:
+        """Entradas que contienen todos los trigramas internos de la consulta (ordenadas)"""
+        lists = []
+        for gram in trigrams(query):
+            # Los trigramas con espacio exigen inicio/fin de palabra: se omiten para buscar subcadenas
+            if gram[0] == " " or gram[-1] == " ":
+                continue
+            ids = self.postings.get(gram)
+            if ids is None:
+                return np.zeros(0, dtype=np.int32)
+            lists.append(ids)
+        if not lists:
+            return np.arange(len(self.texts))
+        lists.sort(key=len)
+        result = lists[0]
+        for ids in lists[1:]:
+            # Búsqueda binaria de la lista más corta en cada una de las otras
+            pos = np.minimum(np.searchsorted(ids, result), len(ids) - 1)
+            result = result[ids[pos] == result]
+            if not len(result):
+                break
+        return result
+
+    def _ranks(self, entries: np.ndarray, needle: bytes) -> np.ndarray:
+        """Nivel de coincidencia de cada candidato (4 = no contiene la consulta)"""
+        texts = self._texts_array[entries]
+        start = np.char.startswith(texts, needle)
+        exact = start & (self.lengths[entries] == len(needle))
+        word = np.char.find(np.char.add(b" ", texts), b" " + needle) >= 0
+        inside = np.char.find(texts, needle) >= 0
+        return np.select([exact, start, word, inside], [0, 1, 2, 3], 4)
+
+    def _emit(self, entries: List[int], rank: int, limit: int,
+              results: List[Dict[str, Any]], seen: set) -> bool:
+        """Agrega los documentos de `entries` (en orden) hasta completar `limit`"""
+        for i in entries:
+            field, code = int(self.entry_field[i]), int(self.entry_code[i])
+            lo, hi = self._doc_bounds[field][code], self._doc_bounds[field][code + 1]
+            for doc in self._doc_order[field][lo:hi].tolist():
+                if doc in seen:
+                    continue
+                seen.add(doc)
+                results.append({"doc": doc, "field": self.fields[field], "code": code, "score": rank})
+                if len(results) >= limit:
+                    return True
+        return False
+
+    def _best(self, entries: np.ndarray, ranks: np.ndarray, limit: int,
+              results: List[Dict[str, Any]], seen: set) -> bool:
+        """Candidatos en cualquier orden: solo se ordenan los mejores (partición) y se amplía si faltan"""
+        keys = ranks.astype(np.int64) * len(self.texts) + entries
+        done, k = 0, limit
+        while done < len(keys):
+            k = min(max(k, done + limit), len(keys))
+            if k < len(keys):
+                top = np.flatnonzero(keys <= np.partition(keys, k - 1)[k - 1])
+            else:
+                top = np.arange(len(keys))
+            top = top[np.argsort(keys[top], kind="stable")]
+            for j in top[done:].tolist():
+                if self._emit([int(entries[j])], int(ranks[j]), limit, results, seen):
+                    return True
+            done, k = len(top), len(top) * 4
+        return False
+
+    def _scan(self, entries: np.ndarray, needle: bytes, rank: int, limit: int,
+              results: List[Dict[str, Any]], seen: set) -> bool:
+        """Candidatos ya en orden: verifica por bloques los de nivel `rank` hasta completar `limit`"""
+        for lo in range(0, len(entries), CHUNK):
+            chunk = entries[lo:lo + CHUNK]
+            hits = chunk[self._ranks(chunk, needle) == rank]
+            if self._emit(hits.tolist(), rank, limit, results, seen):
+                return True
+        return False
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Lista de {doc, field, code, score} (mejor primero), máximo `limit` documentos"""
+        query = normalize(query)
+        if not query:
+            return []
+        if (query, limit) in self._short:
+            return list(self._short[(query, limit)])
+        needle = query.encode()
+        span = self._prefix_range(needle)
+        entries, length = self._prefix_entry[span], self._prefix_length[span]
+
+        results, seen = [], set()
+        if len(needle) < PREFIX:
+            # El prefijo indexado decide el nivel sin mirar el texto: 0 exacta, 1 prefijo, 2 palabra
+            ranks = np.where(length == len(needle), 0, np.where(length >= 0, 1, 2))
+            if len(needle) < 3:
+                # 1-2 letras: solo inicios de palabra (no hay trigramas)
+                self._best(entries, ranks, limit, results, seen)
+                self._short[(query, limit)] = results
+                return list(results)
+            if self._best(entries, ranks, limit, results, seen):
+                return results
+        else:
+            # Mismo prefijo de PREFIX caracteres: el rango ya está por número de entrada
+            for rank, tier in ((0, length == len(needle)), (1, length >= 0), (2, length < 0)):
+                if self._scan(entries[tier], needle, rank, limit, results, seen):
+                    return results
+        self._scan(self._candidates(query), needle, 3, limit, results, seen)
+        return results
@@ -0,0 +1,34 @@
+import math
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi import Response
+from typing import Any
+
+# NumPy (escalares y arrays) y NaN → null se resuelven dentro de orjson, en C
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    # Lo que orjson no conoce: pd.NA / NaT, Timestamps, arrays de tipo object
+    if value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        item = value.item()
+        return None if isinstance(item, float) and math.isnan(item) else item
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def dumps(payload: Any) -> bytes:
+    """JSON compacto en UTF-8 (mismo resultado que json.dumps con NaN → null)"""
+    return orjson.dumps(payload, default=_default, option=OPTIONS)
+
+
+def json_response(payload: Any, media_type: str = "application/json") -> Response:
+    """Respuesta ya serializada: FastAPI no pasa el payload por jsonable_encoder"""
+    return Response(content=dumps(payload), media_type=media_type)
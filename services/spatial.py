@@ -0,0 +1,80 @@
+import numpy as np
+from typing import Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+# Con pocos candidatos (filtros muy selectivos) es más rápido medir todas las distancias
+BRUTE_FORCE_MAX = 20_000
+
+
+def _to_xyz(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Coordenadas sobre la esfera unitaria: la distancia euclidiana crece con la geodésica"""
+    lat, lon = np.radians(lat), np.radians(lon)
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def _chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def _km_to_chord(km: float) -> float:
+    return 2 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+class PointIndex:
+    """
+    KD-tree sobre las coordenadas del dataset (filas sin lat/lon se excluyen).
+    Las búsquedas reciben una máscara opcional de filas permitidas (filtros).
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray):
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+        self.size = len(lat)
+        self.positions = np.flatnonzero(valid)
+        self.xyz = _to_xyz(lat[valid], lon[valid])
+        # scipy solo se importa con la primera búsqueda espacial (no al arrancar la API)
+        from scipy.spatial import cKDTree
+        self.tree = cKDTree(self.xyz)
+
+    def nearest(self, lat: float, lon: float, k: int,
+                allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Posiciones de las `k` filas más cercanas y su distancia en km (ascendente)"""
+        if len(self.positions) == 0:
+            # Sin coordenadas válidas: tree.query(k=0) fallaría
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        point = _to_xyz(np.array([lat]), np.array([lon]))[0]
+        if allowed is not None and allowed.sum() <= BRUTE_FORCE_MAX:
+            return self._brute_force(point, allowed, k)
+
+        # Se piden más vecinos hasta juntar `k` que pasen los filtros
+        want = k
+        while True:
+            want = min(want, len(self.positions))
+            chord, idx = self.tree.query(point, k=want)
+            chord, idx = np.atleast_1d(chord), np.atleast_1d(idx)
+            positions = self.positions[idx]
+            if allowed is not None:
+                keep = allowed[positions]
+                chord, positions = chord[keep], positions[keep]
+            if len(positions) >= k or want == len(self.positions):
+                return positions[:k], _chord_to_km(chord[:k])
+            want *= 4
+
+    def within(self, lat: float, lon: float, radius_km: float,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Filas a menos de `radius_km`, ordenadas por distancia"""
+        point = _to_xyz(np.array([lat]), np.array([lon]))[0]
+        idx = np.asarray(self.tree.query_ball_point(point, _km_to_chord(radius_km)), dtype=np.int64)
+        positions = self.positions[idx]
+        if allowed is not None:
+            keep = allowed[positions]
+            idx, positions = idx[keep], positions[keep]
+        distances = _chord_to_km(np.linalg.norm(self.xyz[idx] - point, axis=1))
+        order = np.argsort(distances, kind="stable")
+        return positions[order], distances[order]
+
+    def _brute_force(self, point: np.ndarray, allowed: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        idx = np.flatnonzero(allowed[self.positions])
+        chord = np.linalg.norm(self.xyz[idx] - point, axis=1)
+        top = np.argsort(chord, kind="stable")[:k]
+        return self.positions[idx[top]], _chord_to_km(chord[top])
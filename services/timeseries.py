@@ -0,0 +1,115 @@
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+from services.aggregations import group_codes, reduce_groups
+from services.filters import FilterError
+from services.indexes import ColumnIndex, DatasetIndex
+
+# Valores que cuentan como "conectada" en las columnas de conectividad
+CONNECTED_VALUES = {"SI", "SÍ", "S", "1", "1.0", "TRUE", "CONECTADO", "CONECTADA"}
+DISCONNECTED_VALUES = {"NO", "N", "0", "0.0", "FALSE", "DESCONECTADO", "DESCONECTADA", "SIN CONEXION", "SIN CONEXIÓN"}
+
+STATUSES = ["newly_connected", "lost_connectivity", "still_connected", "still_disconnected", "unknown"]
+
+
+class YearMatrix:
+    """
+    Matriz sede × año con la posición de la fila de cada combinación (-1 si
+    no hay reporte). Permite leer cualquier columna "pivotada" por año con un
+    solo fancy-index, sin volver a filtrar el DataFrame.
+    """
+
+    def __init__(self, index: DatasetIndex, key_col: str, year_col: str):
+        for col in (key_col, year_col):
+            if not index.has_column(col):
+                raise FilterError(f"Columna '{col}' no existe")
+        key = index.column(key_col)
+        years = index.column(year_col).numeric
+
+        valid = (key.codes >= 0) & ~np.isnan(years)
+        positions = np.flatnonzero(valid)
+        self.key_col = key_col
+        self.keys = key.labels
+        self.years = np.unique(years[valid]).astype(np.int64)
+
+        # Si una sede repite año, gana la última fila del archivo (no del orden espacial en memoria)
+        self.rows = np.full((len(key.categories), len(self.years)), -1, dtype=np.int64)
+        cell = key.codes[positions] * len(self.years) + np.searchsorted(self.years, years[positions])
+        order = np.lexsort((index.source_rows[positions], cell))
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = cell[order][1:] != cell[order][:-1]
+        self.rows.flat[cell[order[last]]] = positions[order[last]]
+
+        # Último reporte de cada sede (misma regla que homogenizar_est_sed en el ETL)
+        reported = self.rows >= 0
+        last = reported.shape[1] - 1 - np.argmax(reported[:, ::-1], axis=1)
+        latest_rows = self.rows[np.arange(len(self.rows)), last]
+        self.latest = np.zeros(index.size, dtype=bool)
+        self.latest[latest_rows[latest_rows >= 0]] = True
+
+    def year_rows(self, year: int) -> np.ndarray:
+        """Posición de la fila de cada sede en `year` (-1 si no reportó)"""
+        j = np.searchsorted(self.years, year)
+        if j >= len(self.years) or self.years[j] != year:
+            raise ValueError(f"Año {year} no disponible (hay {self.years.tolist()})")
+        return self.rows[:, j]
+
+    @staticmethod
+    def take(values: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """values[rows] con NaN donde no hay fila"""
+        out = values[np.maximum(rows, 0)].astype(np.float64)
+        out[rows < 0] = np.nan
+        return out
+
+
+def connected_flags(col: ColumnIndex) -> np.ndarray:
+    """1.0 / 0.0 / NaN por fila, clasificando cada categoría una sola vez"""
+    labels = np.array([str(c).strip().upper() for c in col.categories], dtype=object)
+    per_category = np.full(len(labels) + 1, np.nan)
+    per_category[:-1][np.isin(labels, list(CONNECTED_VALUES))] = 1.0
+    per_category[:-1][np.isin(labels, list(DISCONNECTED_VALUES))] = 0.0
+    # codes == -1 (nulo) apunta a la última posición (NaN)
+    return per_category[col.codes]
+
+
+def flags_to_bool(flags: np.ndarray) -> np.ndarray:
+    """1.0 / 0.0 / NaN → True / False / None (para la respuesta JSON)"""
+    return np.where(np.isnan(flags), None, flags == 1)
+
+
+def change_status(before: np.ndarray, after: np.ndarray) -> np.ndarray:
+    """Índice en STATUSES de cada sede según su conectividad en ambos años"""
+    known = ~(np.isnan(before) | np.isnan(after))
+    return np.select(
+        [known & (before == 0) & (after == 1), known & (before == 1) & (after == 0),
+         known & (before == 1) & (after == 1), known & (before == 0) & (after == 0)],
+        [0, 1, 2, 3], default=4,
+    )
+
+
+def summarize_changes(index: DatasetIndex, ref_rows: np.ndarray, status: np.ndarray,
+                      delta: np.ndarray, group_by: List[str]) -> List[Dict[str, Any]]:
+    """Conteo de sedes por tipo de cambio y delta de ancho de banda, por grupo"""
+    for col in group_by:
+        if not index.has_column(col):
+            raise FilterError(f"Columna '{col}' no existe")
+    ids, codes = group_codes(index, group_by, ref_rows)
+    n_groups = len(codes)
+    counts = np.zeros((n_groups, len(STATUSES)), dtype=np.int64)
+    np.add.at(counts, (ids, status), 1)
+    mean_delta = reduce_groups(delta, ids, n_groups, "mean")
+    sum_delta = reduce_groups(delta, ids, n_groups, "sum")
+
+    labels = [index.column(col).labels for col in group_by]
+    rows = []
+    for g in range(n_groups):
+        row: Dict[str, Optional[Any]] = {
+            col: (labels[j][codes[g, j]] if codes[g, j] >= 0 else None)
+            for j, col in enumerate(group_by)
+        }
+        row["sedes"] = int(counts[g].sum())
+        row.update({name: int(counts[g, i]) for i, name in enumerate(STATUSES)})
+        row["bandwidth_delta_mean"] = None if np.isnan(mean_delta[g]) else float(mean_delta[g])
+        row["bandwidth_delta_sum"] = float(sum_delta[g])
+        rows.append(row)
+    return rows
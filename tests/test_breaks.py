@@ -0,0 +1,31 @@
+"""
+Cortes de clasificación (services/breaks.py).
+
+    python -m unittest discover tests
+"""
+import unittest
+
+import numpy as np
+
+from services.breaks import jenks_breaks
+
+
+class JenksBreaksTest(unittest.TestCase):
+    def test_few_distinct_values(self):
+        values = np.array([1.0, 1.0, 2.0, 3.0, 3.0])
+        self.assertEqual(jenks_breaks(values, 5), [1.0, 2.0, 3.0])
+
+    def test_single_value(self):
+        self.assertEqual(jenks_breaks(np.array([4.0, 4.0, 4.0]), 3), [4.0])
+
+    def test_breaks_start_at_minimum(self):
+        values = np.sort(np.concatenate([np.full(10, 1.0), np.full(10, 5.0), np.full(10, 9.0), [2.0, 6.0]]))
+        breaks = jenks_breaks(values, 3)
+        self.assertEqual(breaks[0], 1.0)
+        self.assertEqual(breaks[-1], 9.0)
+        self.assertEqual(len(breaks), 4)
+        self.assertEqual(breaks, sorted(set(breaks)))
+
+
+if __name__ == "__main__":
+    unittest.main()
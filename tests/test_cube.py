@@ -0,0 +1,115 @@
+"""
+Cubo de resumen (services/cube.py): get_aggregate con el cubo da lo mismo
+que recorriendo las filas sin él, y las leyendas categóricas también.
+
+    python -m unittest discover tests
+"""
+import math
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from services.aggregations import parse_metrics
+from services.query_engine import DATASETS, QueryEngine
+
+CASES = [
+    # (group_by, métricas, filtros, where)
+    (["zona"], "count", {}, None),
+    (["year_reporte", "zona"], "count,mean(ised_x),min(ised_x),max(ised_x)", {}, None),
+    (["departamento"], "count,sum(ised_x),mean(ised_y)", {"zona": "RURAL"}, None),
+    (["departamento", "municipio"], "count,mean(ised_x)", {}, "year_reporte=2023|2024"),
+    (["municipio"], "sum(ised_y),max(ised_y)", {"year_reporte": "2022"}, "departamento~ANT"),
+    (["year_reporte"], "count,mean(ised_x)", {}, "zona=null"),
+    (["zona"], "count,mean(ised_x)", {}, "year_reporte>=2023;departamento=NARIÑO|CHOCÓ"),
+    ([], "count,mean(ised_x),min(ised_y)", {"zona": "URBANA"}, None),
+]
+
+
+def _frame(rows: int = 4000) -> pd.DataFrame:
+    rng = np.random.default_rng(3)
+    depto = rng.choice(["ANTIOQUIA", "NARIÑO", "CHOCÓ", "BOYACÁ"], rows)
+    zona = rng.choice(["URBANA", "RURAL", None], rows, p=[0.6, 0.35, 0.05])
+    ised = rng.uniform(0, 1, rows)
+    ised[::7] = np.nan
+    return pd.DataFrame({
+        "sede_codigo": [f"{i:012d}" for i in range(rows)],
+        "year_reporte": rng.choice([2022, 2023, 2024], rows),
+        "departamento": depto,
+        "municipio": [f"{d[:3]}-{m}" for d, m in zip(depto, rng.integers(0, 12, rows))],
+        "zona": zona,
+        "ised_x": ised,
+        "ised_y": rng.integers(0, 100, rows).astype(float),
+        "latitud": rng.uniform(-4, 12, rows),
+        "longitud": rng.uniform(-79, -67, rows),
+    })
+
+
+class SummaryCubeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.tmp.name, "cube.parquet")
+        _frame().to_parquet(path, index=False)
+        DATASETS["test_cube"] = {"file": path, "lat_col": "latitud", "lon_col": "longitud",
+                                 "filters": ["year_reporte", "zona", "departamento"],
+                                 "cube": {"dimensions": ["year_reporte", "zona", "departamento", "municipio"],
+                                          "measures": ["ised_*"]}}
+
+    @classmethod
+    def tearDownClass(cls):
+        DATASETS.pop("test_cube", None)
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        self.engine = QueryEngine()
+
+    def _without_cube(self):
+        self.engine._cubes.pop("test_cube")
+        self.engine._results.invalidate("test_cube")
+
+    def _assert_groups(self, got: list, expected: list):
+        self.assertEqual(len(got), len(expected))
+        for a, b in zip(got, expected):
+            self.assertEqual(a.keys(), b.keys())
+            for k in a:
+                if isinstance(a[k], float) or isinstance(b[k], float):
+                    if a[k] is None or b[k] is None:
+                        self.assertEqual(a[k], b[k], k)
+                    else:
+                        self.assertTrue(math.isclose(a[k], b[k], rel_tol=1e-9, abs_tol=1e-9), (k, a[k], b[k]))
+                else:
+                    self.assertEqual(a[k], b[k], k)
+
+    def test_aggregate_matches_rows(self):
+        with_cube = []
+        for group_by, metrics, filters, where in CASES:
+            self.assertIsNotNone(self.engine._cube_for("test_cube", filters, None, where, group_by,
+                                                       parse_metrics(metrics)))
+            with_cube.append(self.engine.get_aggregate("test_cube", group_by, metrics, filters, where=where))
+        self._without_cube()
+        for (group_by, metrics, filters, where), cube in zip(CASES, with_cube):
+            with self.subTest(group_by=group_by, metrics=metrics, filters=filters, where=where):
+                rows = self.engine.get_aggregate("test_cube", group_by, metrics, filters, where=where)
+                self.assertEqual(cube["rows"], rows["rows"])
+                self.assertEqual(cube["metrics"], rows["metrics"])
+                self._assert_groups(cube["groups"], rows["groups"])
+
+    def test_outside_cube_uses_rows(self):
+        # Columna fuera de las dimensiones o bbox: no lo responde el cubo
+        self.assertIsNone(self.engine._cube_for("test_cube", {}, None, "sede_codigo=000000000001", ["zona"],
+                                                [("count", None)]))
+        self.assertIsNone(self.engine._cube_for("test_cube", {}, "-80,-5,-66,13", None, ["zona"], [("count", None)]))
+
+    def test_categorical_breaks(self):
+        with_cube = self.engine.get_classification_breaks("test_cube", "departamento", "unique", 5,
+                                                          {"zona": "RURAL"})
+        self._without_cube()
+        rows = self.engine.get_classification_breaks("test_cube", "departamento", "unique", 5, {"zona": "RURAL"})
+        self.assertEqual(with_cube, rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
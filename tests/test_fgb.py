@@ -0,0 +1,108 @@
+"""
+Escritor de FlatGeobuf (services/fgb.py) leído de vuelta con pyogrio/GDAL:
+propiedades, geometría, nulos y lectura por bbox con el R-tree.
+
+    python -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import pyogrio
+
+from services.fgb import encode_fgb, iter_fgb_batches
+
+
+def _frame(rows: int = 300) -> pd.DataFrame:
+    rng = np.random.default_rng(11)
+    lat = rng.uniform(-4, 12, rows)
+    lon = rng.uniform(-79, -67, rows)
+    lat[::17] = np.nan
+    ised = rng.random(rows)
+    ised[::5] = np.nan
+    name = np.array([f"SEDE SAN JOSÉ {i}" for i in range(rows)], dtype=object)
+    name[3::11] = None
+    return pd.DataFrame({
+        "sede_codigo": [f"{i:012d}" for i in range(rows)],
+        "year_reporte": rng.choice([2022, 2023], rows),
+        "ised_x": ised,
+        "conectada": rng.random(rows) < 0.5,
+        "nombre_sede": name,
+        "latitud": lat,
+        "longitud": lon,
+    })
+
+
+def _texts(series: pd.Series) -> list:
+    return [None if pd.isna(v) else v for v in series]
+
+
+class FlatGeobufRoundTripTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.df = _frame()
+        cls.expected = cls.df.dropna(subset=["latitud", "longitud"]).set_index("sede_codigo")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def _write(self, body: bytes, name: str) -> str:
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(body)
+        return path
+
+    def _check(self, read: pd.DataFrame, expected: pd.DataFrame):
+        read = read.set_index("sede_codigo").loc[expected.index]
+        np.testing.assert_array_equal(read.geometry.x.to_numpy(), expected["longitud"].to_numpy())
+        np.testing.assert_array_equal(read.geometry.y.to_numpy(), expected["latitud"].to_numpy())
+        np.testing.assert_array_equal(read["year_reporte"].to_numpy(), expected["year_reporte"].to_numpy())
+        np.testing.assert_array_equal(read["ised_x"].to_numpy(), expected["ised_x"].to_numpy())
+        self.assertEqual(read["conectada"].astype(bool).tolist(), expected["conectada"].tolist())
+        self.assertEqual(_texts(read["nombre_sede"]), _texts(expected["nombre_sede"]))
+
+    def test_round_trip_with_index(self):
+        path = self._write(encode_fgb(self.df, "latitud", "longitud", "sedes"), "indexed.fgb")
+        info = pyogrio.read_info(path)
+        self.assertEqual(info["features"], len(self.expected))
+        self.assertEqual(info["crs"], "EPSG:4326")
+        read = pyogrio.read_dataframe(path)
+        self.assertEqual(len(read), len(self.expected))
+        self._check(read, self.expected)
+
+    def test_bbox_read_uses_index(self):
+        path = self._write(encode_fgb(self.df, "latitud", "longitud", "sedes"), "bbox.fgb")
+        for bbox in [(-76.0, 2.0, -72.0, 6.0), (-79.0, -4.0, -78.0, -3.0), (-70.5, 9.0, -67.0, 12.0), (-80, -5, -66, 13)]:
+            with self.subTest(bbox=bbox):
+                read = pyogrio.read_dataframe(path, bbox=bbox)
+                inside = self.expected[self.expected["longitud"].between(bbox[0], bbox[2])
+                                       & self.expected["latitud"].between(bbox[1], bbox[3])]
+                self.assertGreater(len(inside), 0)
+                self.assertEqual(sorted(read["sede_codigo"]), sorted(inside.index))
+                self._check(read, inside)
+
+    def test_round_trip_without_index(self):
+        path = self._write(encode_fgb(self.df, "latitud", "longitud", "sedes", spatial_index=False), "flat.fgb")
+        read = pyogrio.read_dataframe(path)
+        self.assertEqual(read["sede_codigo"].tolist(), self.expected.index.tolist())
+        self._check(read, self.expected)
+
+    def test_batches(self):
+        batches = [self.df.iloc[i:i + 64] for i in range(0, len(self.df), 64)]
+        path = self._write(b"".join(iter_fgb_batches(iter(batches), "latitud", "longitud", "sedes")), "batches.fgb")
+        read = pyogrio.read_dataframe(path)
+        self.assertEqual(read["sede_codigo"].tolist(), self.expected.index.tolist())
+        self._check(read, self.expected)
+
+    def test_no_coordinates(self):
+        empty = self.df.assign(latitud=np.nan)
+        path = self._write(encode_fgb(empty, "latitud", "longitud", "sedes"), "empty.fgb")
+        self.assertEqual(len(pyogrio.read_dataframe(path)), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
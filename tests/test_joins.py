@@ -0,0 +1,110 @@
+"""
+Joins declarados (services/joins.py): claves sin pareja, filtros "otro.col",
+claves repetidas en el dataset derecho e invalidación al recargarlo.
+
+    python -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from services.query_engine import DATASETS, QueryEngine
+
+
+def _left() -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    codes = np.array([f"S{i:03d}" for i in range(40)], dtype=object)
+    codes[[5, 17]] = None
+    return pd.DataFrame({
+        "sede_codigo": codes,
+        "year_reporte": np.repeat([2022, 2023], 20),
+        "zona": rng.choice(["URBANA", "RURAL"], 40),
+        "latitud": rng.uniform(-4, 12, 40),
+        "longitud": rng.uniform(-79, -67, 40),
+    })
+
+
+def _right() -> pd.DataFrame:
+    # Solo las sedes pares tienen pareja; el año viene como float (2022.0 ↔ 2022)
+    left = _left().dropna(subset=["sede_codigo"])
+    right = left[left["sede_codigo"].str[-1].astype(int) % 2 == 0]
+    right = right.assign(year_reporte=right["year_reporte"].astype(float),
+                         conectada=np.where(right.index % 4 == 0, "SI", "NO"),
+                         ancho=right.index.to_numpy(dtype=float) * 10)
+    # S000/2022 repetida: la última fila del archivo gana
+    extra = right.iloc[[0]].assign(conectada="NO", ancho=-1.0)
+    first = right.iloc[[0]].assign(conectada="SI", ancho=999.0)
+    return pd.concat([first, right.iloc[1:], extra]).drop(columns="zona")
+
+
+class DeclaredJoinTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.left_path = os.path.join(cls.tmp.name, "left.parquet")
+        cls.right_path = os.path.join(cls.tmp.name, "right.parquet")
+        _left().to_parquet(cls.left_path, index=False)
+        DATASETS["test_left"] = {"file": cls.left_path, "lat_col": "latitud", "lon_col": "longitud",
+                                 "filters": ["zona"], "joins": {"test_right": {"on": ["sede_codigo", "year_reporte"]}}}
+        DATASETS["test_right"] = {"file": cls.right_path, "lat_col": "latitud", "lon_col": "longitud",
+                                  "filters": ["conectada"]}
+
+    @classmethod
+    def tearDownClass(cls):
+        DATASETS.pop("test_left", None)
+        DATASETS.pop("test_right", None)
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        _right().to_parquet(self.right_path, index=False)
+        self.engine = QueryEngine()
+
+    def _joined(self, **kwargs) -> pd.DataFrame:
+        return self.engine.select("test_left", {}, join="test_right", **kwargs)
+
+    def test_unmatched_keys_project_nulls(self):
+        with self.assertLogs("services.query_engine", "WARNING"):
+            df = self._joined()
+        self.assertEqual(len(df), 40)
+        self.assertEqual(set(df.columns) - set(_left().columns), {"test_right.conectada", "test_right.ancho"})
+        matched = df["sede_codigo"].isin(_right()["sede_codigo"]).to_numpy()
+        self.assertEqual(matched.sum(), 20)
+        self.assertTrue(df.loc[~matched, "test_right.conectada"].isna().all())
+        self.assertTrue(df.loc[~matched, "test_right.ancho"].isna().all())
+        self.assertTrue(df.loc[matched, "test_right.conectada"].notna().all())
+        self.assertEqual(df["test_right.ancho"].dtype.kind, "f")
+
+    def test_filter_on_joined_excludes_unmatched(self):
+        expected = _right().iloc[1:]
+        expected = set(expected.loc[expected["conectada"] == "SI", "sede_codigo"])
+        for where in ("test_right.conectada=SI", '{"test_right.conectada": "SI"}'):
+            with self.subTest(where=where):
+                df = self.engine.select("test_left", {}, where=where)
+                self.assertEqual(set(df["sede_codigo"]), expected)
+        # S000/2022 quedó con la fila repetida (ancho -1): solo entran las otras sedes pares
+        rows = self.engine.get_aggregate("test_left", [], "count", {}, where="test_right.ancho>=0")["rows"]
+        self.assertEqual(rows, len(_right()) - 2)
+
+    def test_duplicate_key_keeps_last_file_row(self):
+        df = self._joined(join_columns=["conectada", "ancho"])
+        first = df[df["sede_codigo"] == "S000"]
+        self.assertEqual(first["test_right.ancho"].tolist(), [-1.0])
+        self.assertEqual(first["test_right.conectada"].tolist(), ["NO"])
+        self.assertEqual(self.engine._get_join("test_left", "test_right").duplicates, 1)
+
+    def test_reload_right_invalidates_join(self):
+        where = "test_right.conectada=SI"
+        before = self.engine.get_aggregate("test_left", [], "count", {}, where=where)["rows"]
+        _right().assign(conectada="SI").to_parquet(self.right_path, index=False)
+        self.engine.reload("test_right")
+        after = self.engine.get_aggregate("test_left", [], "count", {}, where=where)["rows"]
+        self.assertLess(before, after)
+        self.assertEqual(after, len(_right()) - 1)
+        self.assertEqual(self._joined()["test_right.conectada"].dropna().unique().tolist(), ["SI"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Paginación por keyset (services/pagination.py + QueryEngine.select_page):
+recorrer todas las páginas entrega cada fila una vez, en el orden estable,
+también con claves repetidas, nulos y recargas entre páginas.
+
+    python -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from services.filters import FilterError
+from services.query_engine import DATASETS, QueryEngine
+
+
+def _frame(rows: int = 700) -> pd.DataFrame:
+    rng = np.random.default_rng(5)
+    codes = np.array([f"{i:05d}" for i in rng.integers(0, 150, rows)], dtype=object)
+    codes[::29] = None
+    return pd.DataFrame({
+        "row_id": np.arange(rows),
+        # (sede, año) se repite a propósito: el cursor debe desempatar
+        "sede_codigo": codes,
+        "year_reporte": rng.choice([2022, 2023, 2024], rows),
+        "zona": rng.choice(["URBANA", "RURAL"], rows),
+        "latitud": rng.uniform(-4, 12, rows),
+        "longitud": rng.uniform(-79, -67, rows),
+    })
+
+
+class KeysetPaginationTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, "pages.parquet")
+        _frame().to_parquet(cls.path, index=False)
+        DATASETS["test_pages"] = {"file": cls.path, "lat_col": "latitud", "lon_col": "longitud",
+                                  "filters": ["zona", "year_reporte"], "order": ["sede_codigo", "year_reporte"],
+                                  "partition": ["year_reporte"]}
+
+    @classmethod
+    def tearDownClass(cls):
+        DATASETS.pop("test_pages", None)
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        self.engine = QueryEngine()
+
+    def _pages(self, limit: int, filters: dict = None, **kwargs) -> list:
+        pages, cursor = [], None
+        while True:
+            page, total, cursor = self.engine.select_page("test_pages", filters or {},
+                                                          limit=limit, cursor=cursor, **kwargs)
+            pages.append(page)
+            self.assertLessEqual(len(page), limit)
+            if cursor is None:
+                return pages
+
+    def _ordered(self, df: pd.DataFrame) -> list:
+        # Orden esperado: nulos primero, luego sede y año; empates en el orden de las filas en memoria
+        ordered = df.assign(_null=df["sede_codigo"].notna())
+        return ordered.sort_values(["_null", "sede_codigo", "year_reporte"], kind="stable")["row_id"].tolist()
+
+    def test_no_repeats_or_gaps(self):
+        everything = self.engine.select("test_pages", {})
+        for limit in (1, 37, 100, 699, 700, 5000):
+            with self.subTest(limit=limit):
+                rows = pd.concat(self._pages(limit))["row_id"].tolist()
+                self.assertEqual(len(rows), len(set(rows)))
+                self.assertEqual(rows, self._ordered(everything))
+
+    def test_with_filters(self):
+        where = "year_reporte=2022|2024"
+        expected = self._ordered(self.engine.select("test_pages", {"zona": "RURAL"}, where=where))
+        rows = pd.concat(self._pages(50, filters={"zona": "RURAL"}, where=where))["row_id"].tolist()
+        self.assertEqual(rows, expected)
+
+    def test_total_and_last_cursor(self):
+        page, total, cursor = self.engine.select_page("test_pages", {}, limit=10)
+        self.assertEqual(total, 700)
+        self.assertIsNotNone(cursor)
+        page, total, cursor = self.engine.select_page("test_pages", {}, limit=700)
+        self.assertIsNone(cursor)
+
+    def test_cursor_survives_reload(self):
+        first, _, cursor = self.engine.select_page("test_pages", {}, limit=300)
+        seen = first["row_id"].tolist()
+        # Una fila nueva después del cursor (clave mayor) y otra antes: solo aparece la primera
+        df = pd.read_parquet(self.path)
+        extra = df.iloc[[0, 0]].assign(row_id=[10_000, 10_001], sede_codigo=["99999", "00000"])
+        pd.concat([df, extra]).to_parquet(self.path, index=False)
+        try:
+            self.engine.reload("test_pages")
+            rest, cursor = [], cursor
+            while cursor:
+                page, _, cursor = self.engine.select_page("test_pages", {}, limit=300, cursor=cursor)
+                rest += page["row_id"].tolist()
+            self.assertFalse(set(seen) & set(rest))
+            self.assertIn(10_000, rest)
+            self.assertNotIn(10_001, rest)
+            self.assertEqual(set(seen) | set(rest), set(range(700)) | {10_000})
+        finally:
+            df.to_parquet(self.path, index=False)
+
+    def test_invalid_cursor(self):
+        for cursor in ("%%%", "bm90LWpzb24", "WzFd"):
+            with self.subTest(cursor=cursor), self.assertRaises(FilterError):
+                self.engine.select_page("test_pages", {}, limit=10, cursor=cursor)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+Modo por lotes (services/scan.py) frente al modo en memoria sobre columnas
+de texto con números mezclados ("100 Mbps", "n/a", " 0.75 ").
+
+    python -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from services.filters import FilterError
+from services.query_engine import DATASETS, QueryEngine
+
+
+def _frame(rows: int = 600) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    mbps = rng.choice(["10 Mbps", "20 Mbps", "100 Mbps", "1,5 Mbps", "sin dato", None], rows)
+    ised = rng.random(rows).round(3).astype(str).astype(object)
+    ised[::7] = "n/a"
+    ised[1::11] = " 0.75 "
+    return pd.DataFrame({
+        "sede_codigo": [f"{i:012d}" for i in range(rows)],
+        "year_reporte": rng.choice(["2022", "2023"], rows),
+        "latitud": (rng.uniform(-4, 12, rows)).round(5).astype(str),
+        "longitud": rng.uniform(-79, -67, rows).round(5),
+        "ised_x": ised,
+        "anchodebandaconsolidadombps": mbps,
+    })
+
+
+class ScanMatchesMemoryTest(unittest.TestCase):
+    FILTERS = [
+        "anchodebandaconsolidadombps>=20",
+        "anchodebandaconsolidadombps<15",
+        "ised_x>0.5",
+        "ised_x=0.2..0.8;anchodebandaconsolidadombps>=20",
+        "latitud>4;longitud<-74",
+        "ised_x>5",
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.tmp.name, "mixed.parquet")
+        _frame().to_parquet(path, index=False, row_group_size=100)
+        DATASETS["test_scan"] = {"file": path, "lat_col": "latitud", "lon_col": "longitud",
+                                 "filters": ["year_reporte"], "scan": True}
+        cls.engine = QueryEngine()
+
+    @classmethod
+    def tearDownClass(cls):
+        DATASETS.pop("test_scan", None)
+        cls.tmp.cleanup()
+
+    def _codes(self, frames) -> list:
+        return sorted(pd.concat(list(frames))["sede_codigo"].tolist())
+
+    def test_filters_match_memory(self):
+        for where in self.FILTERS:
+            with self.subTest(where=where):
+                memory = self.engine.select("test_scan", {}, where=where)
+                scanned = self.engine.scan("test_scan", {}, where=where)
+                self.assertEqual(self._codes([memory]), self._codes(scanned))
+
+    def test_bbox_on_text_coordinates(self):
+        memory = self.engine.select("test_scan", {}, bbox="-76,3,-70,8")
+        scanned = self.engine.scan("test_scan", {}, bbox="-76,3,-70,8")
+        self.assertEqual(self._codes([memory]), self._codes(scanned))
+
+    def test_errors_before_streaming(self):
+        with self.assertRaises(FilterError):
+            self.engine.scan("test_scan", {}, where="nope>1")
+
+
+if __name__ == "__main__":
+    unittest.main()